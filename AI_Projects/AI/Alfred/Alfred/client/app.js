@@ -14,6 +14,8 @@ const waveform = document.getElementById("waveform");
 const stopSpeakBtn = document.getElementById("stopSpeakBtn");
 
 let history = [];
+let chatBusy = false;  // send() owns the status pill while a reply streams
+const sessionId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
 let speechInitialized = false;
 
 // Initialize speech synthesis on first interaction (required by browsers)
@@ -103,6 +105,30 @@ function setStatus(text, active = true) {
   statusPill.classList.toggle('active', active);
 }
 
+// === MODEL WARM-UP ===
+// The server loads the models in the background at startup; show that instead of a hanging first reply.
+// "degraded" = chat model up, an optional one (KB embeddings) is not; "error" = chat model failed to load.
+async function waitForModels() {
+  try {
+    const res = await fetch("/health");
+    const health = await res.json();
+    if (health.status === "ready" || health.status === "degraded") {
+      if (!chatBusy) setStatus('Ready', false);
+      return;
+    }
+    if (health.status === "error") {
+      console.error("Chat model failed to load:", health.models);
+      if (!chatBusy) setStatus('Model unavailable', false);
+      return;
+    }
+    if (!chatBusy) setStatus('Warming up...');
+  } catch (e) {
+    if (!chatBusy) setStatus('Connecting...');
+  }
+  setTimeout(waitForModels, 2000);
+}
+waitForModels();
+
 // === THEME TOGGLE ===
 themeToggle.addEventListener('click', () => {
   document.body.classList.toggle('dark-mode');
@@ -321,6 +347,7 @@ async function send(fromVoice = false) {
   addMsg("user", text);
   history.push({ role: "user", content: text });
 
+  chatBusy = true;
   setStatus("Thinking...");
 
   // Create placeholder for streaming response
@@ -341,6 +368,7 @@ async function send(fromVoice = false) {
         allow_internet: !!allowInternet.checked,
         speak: false,
         mode: currentMode,
+        session_id: sessionId,
         history
       })
     });
@@ -426,6 +454,8 @@ async function send(fromVoice = false) {
     setStatus('Ready', false);
     div.innerText = "Sorry - request failed.";
     console.error(err);
+  } finally {
+    chatBusy = false;
   }
 }
 
@@ -7,7 +7,11 @@ load_dotenv()
 class Settings:
     OLLAMA_URL: str = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "llama3.2")
+    # several Ollama instances to spread chats over (comma-separated); defaults to OLLAMA_URL
+    OLLAMA_URLS: list = [u.strip() for u in (os.getenv("OLLAMA_URLS") or OLLAMA_URL).split(",") if u.strip()]
     CACHE_TTL: int = int(os.getenv("CACHE_TTL", "300"))
     PORT: int = int(os.getenv("PORT", "8790"))
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+    RESPONSE_CACHE: bool = os.getenv("RESPONSE_CACHE", "0").lower() in ("1", "true", "yes")
 
 settings = Settings()
\ No newline at end of file
@@ -3,15 +3,26 @@ from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-import os, json, datetime, requests, re, time
-from typing import List
+import os, json, datetime, re, time, asyncio, inspect, threading, uuid
+from contextlib import asynccontextmanager, aclosing
+from typing import AsyncGenerator, List
 from pathlib import Path
 import sys
 
 # Import from services directory
-from app.services.search_service import web_search, fetch_url, rag_search
+from app.services.search_service import (
+    fetch_url_async, rag_search_stream_async,
+    search_cache_stats, search_variant_stats,
+)
 from app.services.memory_service import remember_item, recall_item, ensure_files, recall_all
-from app.services import api_service
+from app.services import memory_service
+from app.services import (
+    api_service, browser_pool, history_service, host_health, http_pool, llm_router, memory_db, memory_vectors,
+    model_warmup, page_cache, prompt_service, response_cache, tracing,
+)
+from app.config import settings
+from app.utils import log_writer
+from app.services.passage_ranker import select_passages
 
 # Optional voice helpers
 try:
@@ -36,27 +47,39 @@ except ImportError:
 
 APP_DIR = Path(__file__).parent.parent.parent
 CLIENT_DIR = APP_DIR / "client"
-LOG_DIR = APP_DIR / "logs"
 KB_INDEX_DIR = APP_DIR / "index"  # Where FAISS stores the index
+KB_MANIFEST = KB_INDEX_DIR / "manifest.json"  # rewritten by indexer.py after every index update
+
+MODEL = settings.OLLAMA_MODEL
+EMBED_MODEL = "nomic-embed-text"
+LLM = llm_router.LLMRouter(settings.OLLAMA_URLS)  # one or more Ollama backends
 
-MODEL = "llama3.2"
-OLLAMA_URL = "http://127.0.0.1:11434"
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # load both models in the background and keep them resident; /health reports progress
+    for url in LLM.urls:
+        model_warmup.start(url, {MODEL: False, EMBED_MODEL: True})
+    await asyncio.to_thread(memory_db.sync_from_json, recall_all())  # import memory.json into the fact store
+    _background(memory_vectors.refresh(LLM.least_loaded()))  # embed new/changed facts before the first chat
+    yield
+    await model_warmup.stop()
+    await http_pool.close_session()
+    await asyncio.to_thread(browser_pool.shutdown)
+    await asyncio.to_thread(memory_service.flush)
+    await asyncio.to_thread(log_writer.close)
 
-app = FastAPI(title="Alfred (local)")
+app = FastAPI(title="Alfred (local)", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory=str(CLIENT_DIR)), name="static")
 
 def log_line(s: str):
-    LOG_DIR.mkdir(exist_ok=True)
-    fn = LOG_DIR / f"{datetime.date.today().isoformat()}.log"
-    with open(fn, "a", encoding="utf-8") as f:
-        f.write(s + "\n")
+    log_writer.write("chat", s)  # queued; the writer thread appends to logs/{date}.log
 
 def load_faiss_index():
     """Load FAISS index if available"""
     if not FAISS_AVAILABLE or not KB_INDEX_DIR.exists():
         return None
     try:
-        embeddings = OllamaEmbeddings(model="nomic-embed-text")
+        embeddings = OllamaEmbeddings(model=EMBED_MODEL)
         vs = FAISS.load_local(str(KB_INDEX_DIR), embeddings, allow_dangerous_deserialization=True)
         return vs
     except Exception as e:
@@ -83,8 +106,29 @@ def search_knowledge_base(query: str, vector_store) -> List[dict]:
         print(f"[WARN]  KB search error: {e}")
         return []
 
-# Load FAISS index at startup
+def _kb_stamp():
+    try:
+        st = KB_MANIFEST.stat()
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+# Load FAISS index at startup; reloaded when indexer.py rewrites the manifest
+_kb_loaded = _kb_stamp()
 VECTOR_STORE = load_faiss_index()
+_kb_lock = threading.Lock()
+
+def current_vector_store():
+    """The loaded index, swapped for a fresh load after an indexer run (or indexer.py --watch) updates it."""
+    global VECTOR_STORE, _kb_loaded
+    stamp = _kb_stamp()
+    if stamp != _kb_loaded:
+        with _kb_lock:
+            if stamp != _kb_loaded:
+                VECTOR_STORE = load_faiss_index()
+                _kb_loaded = stamp
+                print("[INFO] Knowledge base index reloaded")
+    return VECTOR_STORE
 
 class ChatRequest(BaseModel):
     text: str
@@ -92,6 +136,7 @@ class ChatRequest(BaseModel):
     speak: bool = False
     history: List[dict] = []
     mode: str = "friendly"  # "friendly" or "study"
+    session_id: str = ""    # lets the server keep a rolling summary of older turns
 
 _REQUIRES_WEB = re.compile(
     r"\b(today|tonight|now|currently|right now|this (?:morning|afternoon|evening|week)|"
@@ -108,16 +153,210 @@ def classify_query(txt: str) -> str:
 
 _URL_RE = re.compile(r"https?://[^\s)>\]]+", re.I)
 
+_CONTEXT_DEADLINE = 8.0  # seconds: the first token never waits longer than this for context
+_KB_WORDS = ["ebook", "book", "document", "knowledge", "file", "stored", "have you"]
+_GARBAGE_DOMAINS = {'fanfiction', 'wattpad', 'ao3', 'archiveofourown', 'biblegateway',
+                    'biblehub', 'quora', 'pinterest', 'facebook', 'twitter', 'tiktok'}
+
+async def _link_source(url: str) -> dict:
+    fetched = await fetch_url_async(url, max_chars=3000)
+    return {"title": fetched.get("title") or "(link)", "url": url, "text": fetched.get("text", "")}
+
+async def _web_sources(query: str, user_loc: str) -> AsyncGenerator[dict, None]:
+    """Web pages in the order they land; the context deadline decides how long to wait for the rest."""
+    pages = rag_search_stream_async(query, user_loc=user_loc, max_chars=3000, deadline=_CONTEXT_DEADLINE)
+    async with aclosing(pages):
+        async for r in pages:
+            # Filter out low-quality/irrelevant sources
+            if (r.get("text") or r.get("snippet")) and not any(d in (r.get("url") or "").lower() for d in _GARBAGE_DOMAINS):
+                yield r
+
+async def _memory_facts(user_text: str, mem: dict):
+    """(facts, query vector): FTS + embedding top-k over the flattened memory.json."""
+    t = time.perf_counter()
+    _, vector = await asyncio.gather(
+        asyncio.to_thread(memory_db.sync_from_json, mem),  # hashing + SQLite writes stay off the event loop
+        memory_vectors.embed_query(user_text, LLM.least_loaded()),
+    )
+    facts = await memory_vectors.relevant_facts(user_text, LLM.least_loaded(), query_vector=vector)
+    tracing.mark("facts", t, count=len(facts))
+    return facts, vector
+
+async def _traced(name: str, coro):
+    with tracing.span(name):
+        return await coro
+
+_STREAM_END = object()
+
+async def _pull(stream):
+    return await anext(stream, _STREAM_END)
+
+async def _gather_context(jobs: List[tuple], deadline: float):
+    """
+    Run (kind, n, job) jobs concurrently and yield (kind, n, result) as each lands.
+    A job is a coroutine (one result) or an async generator (one arrival per item).
+    An API answer makes the web job moot, so it is cancelled right away;
+    anything still running at `deadline` seconds is cancelled and left out,
+    while items a stream already produced are kept.
+    """
+    tasks, streams, dropped = {}, {}, []
+    t0 = time.perf_counter()
+
+    def start(kind, n, job):
+        if inspect.isasyncgen(job):
+            streams[(kind, n)] = job
+            task = asyncio.create_task(_pull(job))
+        else:
+            task = asyncio.create_task(_traced(f"context.{kind}", job))
+        tasks[task] = (kind, n)
+        return task
+
+    def drop(task):
+        task.cancel()
+        dropped.append(task)
+
+    pending = {start(*job) for job in jobs}
+    stop_at = time.monotonic() + deadline
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, stop_at - time.monotonic()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                log_line(f"Context deadline: dropped {', '.join(tasks[t][0] for t in pending)}")
+                break
+            for task in done:
+                kind, n = tasks[task]
+                try:
+                    result = task.result()
+                except Exception as e:
+                    print(f"[WARN] {kind} context failed: {e}")
+                    continue
+                if (kind, n) in streams:
+                    if result is _STREAM_END:
+                        tracing.mark(f"context.{kind}", t0)
+                        del streams[(kind, n)]
+                        continue
+                    pending.add(start(kind, n, streams[(kind, n)]))
+                if kind == "api" and result:
+                    for t in [t for t in pending if tasks[t][0] == "web"]:
+                        drop(t)
+                        pending.discard(t)
+                yield kind, n, result
+    finally:
+        for task in pending:
+            drop(task)
+        await asyncio.gather(*dropped, return_exceptions=True)
+        for (kind, _), stream in streams.items():
+            tracing.mark(f"context.{kind}", t0, dropped=True)
+            await stream.aclose()  # stops the stream's own in-flight work (page fetches)
+
+def _merge_sources(found: dict) -> List[tuple]:
+    """
+    (label, source) pairs by priority: direct URL > web > KB (the API answer has no source entry).
+    An API answer replaces web results; KB is used only when nothing else came back.
+    """
+    ranked = [("", found["url"][n]) for n in sorted(found["url"])]
+    if not found["api"]:
+        ranked += [("", r) for r in found["web"]]
+    if not ranked:
+        ranked += [("KB", r) for r in found["kb"]]
+    return ranked
+
+def _ui_sources(ranked: List[tuple]) -> List[dict]:
+    return [
+        {
+            "i": i + 1,
+            "title": s.get("title", "") or "(link)",
+            "host": re.sub(r"^https?://([^/]+)/?.*", r"\1", s.get("url","")) if s.get("url") else "knowledge-base",
+            "url": s.get("url",""),
+        }
+        for i, (_, s) in enumerate(ranked)
+    ]
+
+_BACKGROUND = set()  # strong refs to fire-and-forget tasks until they finish
+
+def _background(coro):
+    task = asyncio.create_task(coro)
+    _BACKGROUND.add(task)
+    task.add_done_callback(_BACKGROUND.discard)
+
+_DISCONNECT_POLL = 0.5  # seconds between client-disconnect checks while a chat is running
+
+async def _until_disconnect(request: Request, events: AsyncGenerator[str, None], user_text: str):
+    """
+    Run the chat pipeline in its own task and forward its SSE events.
+    When the browser goes away, cancel that task: in-flight page fetches, KB search
+    and the Ollama request stop with it, and the partial answer is logged.
+    Once the done event is out the turn is complete: a disconnect then cancels nothing.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=16)  # bounded: keeps Ollama backpressure
+    done = object()
+    complete = asyncio.Event()  # set before the done event goes out; a disconnect after it cancels nothing
+    gone = asyncio.Event()  # the consumer stopped reading: nothing more is queued
+
+    async def forward(item):
+        if not gone.is_set():
+            await queue.put(item)
+
+    async def pump():
+        partial = []
+        try:
+            async for event in events:
+                if event.startswith('data: {"type": "token"'):
+                    partial.append(json.loads(event[6:])["text"])
+                elif event.startswith('data: {"type": "done"'):
+                    complete.set()
+                await forward(event)
+        except asyncio.CancelledError:
+            if not complete.is_set():
+                log_line("DISCONNECT client closed the stream; pipeline cancelled")
+                log_line(f"USER: {user_text}")
+                log_line(f"ALFRED (partial): {''.join(partial)}")
+                if trace := tracing.current():
+                    tracing.finish(trace, disconnected=True)
+            raise
+        finally:
+            await events.aclose()
+            await forward(done)
+
+    async def watch(task: asyncio.Task):
+        while not await request.is_disconnected():
+            await asyncio.sleep(_DISCONNECT_POLL)
+        if not complete.is_set():
+            task.cancel()
+
+    producer = asyncio.create_task(pump())
+    watcher = asyncio.create_task(watch(producer))
+    try:
+        while (event := await queue.get()) is not done:
+            yield event
+    finally:
+        gone.set()
+        while not queue.empty():
+            queue.get_nowait()  # wakes a put() blocked on the full queue
+        watcher.cancel()
+        if not complete.is_set():
+            producer.cancel()
+        elif not producer.done():
+            _BACKGROUND.add(producer)  # answer already sent: post-turn work (compaction) runs to the end
+            producer.add_done_callback(_BACKGROUND.discard)
+
 @app.get("/", response_class=HTMLResponse)
 def index():
     return FileResponse(CLIENT_DIR / "index.html")
 
 @app.post("/chat/stream")
-async def chat_stream(req: ChatRequest):
+async def chat_stream(req: ChatRequest, request: Request):
+    request_id = uuid.uuid4().hex[:12]
+
     async def generate():
+        trace = tracing.start(request_id)
         yield f"data: {json.dumps({'type': 'status', 'text': 'Thinking...'})}\n\n"
         
         start_time = time.time()
+        t = time.perf_counter()
         ensure_files()
         user_text = (req.text or "").strip()
         query_lower = user_text.lower()  # Define early so it's available throughout
@@ -131,26 +370,10 @@ async def chat_stream(req: ChatRequest):
         
         user_loc = mem.get("location", "")
         current_dt = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-        
-        sources = []
-        context_parts = []
-        
-        # Direct URLs
-        direct_urls = _URL_RE.findall(user_text)
-        if direct_urls:
-            yield f"data: {json.dumps({'type': 'status', 'text': 'Reading links...'})}\n\n"
-            for u in direct_urls:
-                fetched = fetch_url(u, max_chars=3000)
-                sources.append({
-                    "title": fetched.get("title") or "(link)",
-                    "url": u,
-                    "text": fetched.get("text", "")
-                })
-                i = len(sources)
-                excerpt = (fetched.get("text", "")[:200]).strip()
-                context_parts.append(f"[{i}] {sources[-1]['title']} - {u}\n{excerpt}")
+        tracing.mark("memory", t)
         
         # Quiz mode detection - respects the UI toggle
+        t = time.perf_counter()
         # Only enter/stay in quiz if: (1) user says "quiz me" etc, OR (2) in study mode with quiz history
         is_quiz = any(w in query_lower for w in ["quiz me", "test me", "ask me", "quiz on"])
 
@@ -178,214 +401,203 @@ async def chat_stream(req: ChatRequest):
         elif mode == "study" and req.allow_internet:
             do_web = True
             query_type = 'requires_web'
+        tracing.mark("intent", t, query_type=query_type, quiz=is_quiz)
         
-        # Try API first (fast, 2s timeout)
-        api_result = await api_service.try_api_first(user_text, user_loc)
-        if api_result:
-            # Use API data instead of web search
-            context_parts.append(f"[API] {api_result['formatted']}")
-        elif do_web and query_type in ('requires_web', 'suggests_web'):
-            yield f"data: {json.dumps({'type': 'status', 'text': 'Checking latest info...'})}\n\n"
-            fetch_start = time.time()
-            results = rag_search(user_text, user_loc=user_loc, max_pages=1, max_chars=3000)
-            # Filter out low-quality/irrelevant sources
-            garbage_domains = {'fanfiction', 'wattpad', 'ao3', 'archiveofourown', 'biblegateway',
-                               'biblehub', 'quora', 'pinterest', 'facebook', 'twitter', 'tiktok'}
-            for r in results:
-                if not (r.get("text") or r.get("snippet")):
-                    continue
-                url_lower = (r.get("url") or "").lower()
-                if any(d in url_lower for d in garbage_domains):
-                    continue
-                sources.append(r)
-                i = len(sources)
-                excerpt = (r.get("text") or r.get("snippet") or "")[:200].strip()
-                context_parts.append(f"[{i}] {r['title']} - {r['url']}\n{excerpt}")
-            fetch_time = time.time() - fetch_start
-            log_line(f"Web fetch: {fetch_time:.2f}s for {len(sources)} sources")
-        
-        # Try knowledge base search if no web results and user asks about knowledge/ebooks
-        if not sources and any(word in query_lower for word in ["ebook", "book", "document", "knowledge", "file", "stored", "have you"]):
-            yield f"data: {json.dumps({'type': 'status', 'text': 'Searching knowledge base...'})}\n\n"
-            kb_results = search_knowledge_base(user_text, VECTOR_STORE)
-            if kb_results:
-                for r in kb_results:
-                    sources.append(r)
-                    i = len(sources)
-                    excerpt = (r.get("text") or r.get("snippet") or "")[:200].strip()
-                    context_parts.append(f"[KB-{i}] {r['title']}\n{excerpt}")
-                log_line(f"KB search: {len(kb_results)} documents found")
-        
-        context = "\n\n".join(context_parts)
-        
-        # Build messages
-        conversation_depth = len(history)
-        
-        # Core identity rules that ALWAYS apply
-        identity_rules = (
-            "CRITICAL RULES - NEVER BREAK THESE:\n"
-            "1. You are Alfred, an AI chatbot. NOT a butler. NEVER say 'sir', 'madam', 'master', 'household', or 'mansion'.\n"
-            "2. NEVER invent fictional people or scenarios. If you don't know someone, say 'I don't know who that is.'\n"
-            "3. NEVER mention 'knowledge cutoff', 'training data', 'limitations', or 'as of my last update'. If asked what you can do, just list features.\n"
-            "4. NEVER say 'you repeated yourself' or accuse user of repeating. Each message is fresh.\n"
-            "5. Stay calm. No exclamation marks. Minimal apologies.\n"
-        )
-
-        # Mode-specific citation rules
-        if mode == "study":
-            identity_rules += "6. Cite sources as [1], [2] ONLY if directly relevant. Never invent citations.\n"
-        else:
-            identity_rules += "6. NEVER use citations like [1], [2]. Just answer naturally.\n"
+        # Memory facts run alongside context gathering; only the response cache waits for them
+        facts_job = asyncio.create_task(_memory_facts(user_text, mem))
+        try:
+            direct_urls = _URL_RE.findall(user_text)
 
-        if is_quiz:
-            system = identity_rules + "\nQUIZ MODE: Ask ONE short question, end with '?' and STOP. When user answers: say 'Correct.' or 'Not quite, it's [answer].' then ask the next question. NEVER say 'you repeated yourself' or 'stuck in a loop' - each answer is unique. No citations."
-        elif mode == "study":
-            # Study mode: concise explanations, cite only when relevant
-            system = identity_rules + "\nYou are Alfred in Study Mode. HARD LIMIT: 3-5 sentences. Stop after 5 sentences even if incomplete. Cite [1], [2] only if source directly answers - otherwise no citations."
-        else:
-            # Friendly mode: short, no citations ever
-            system = identity_rules + "\nYou are Alfred. 2-3 sentences max. NEVER use [1], [2] or any citations. No formatting. Just answer like a friend."
-        
-        messages = [{"role": "system", "content": system}]
-        messages.append({"role": "system", "content": f"Current date/time: {current_dt}"})
-        
-        # SMART lazy-load: only inject memory sections relevant to this query (cuts lag)
-        facts = []
-        
-        # Check what the user is asking about, inject ONLY that data
-        if any(word in query_lower for word in ["dog", "pet", "animal", "married", "single", "family", "husband", "wife", "children", "name", "breed"]):
-            if mem.get("family", {}).get("status"):
-                facts.append(f"Status: {mem['family']['status']}")
-            if mem.get("family", {}).get("children"):
-                kids = ", ".join(mem['family']['children'])
-                facts.append(f"Children: {kids}")
-            if mem.get("dogs"):
-                dogs_str = "; ".join([f"{d.get('name', '?')} ({d.get('type', 'unknown')}, {d.get('color', '?')}, age {d.get('age', '?')})" for d in mem['dogs']])
-                facts.append(f"Dogs: {dogs_str}")
-        
-        if any(word in query_lower for word in ["tv", "show", "watch", "netflix", "hulu"]):
-            if mem.get("interests", {}).get("favorite_tv"):
-                tv_str = ", ".join(mem['interests']['favorite_tv'][:6])
-                facts.append(f"Favorite TV: {tv_str}")
-        
-        if any(word in query_lower for word in ["music", "song", "artist", "listen", "spotify"]):
-            if mem.get("interests", {}).get("favorite_music"):
-                music_str = ", ".join(mem['interests']['favorite_music'][:8])
-                facts.append(f"Favorite music: {music_str}")
-        
-        if any(word in query_lower for word in ["food", "eat", "like", "cook", "dish"]):
-            if mem.get("interests", {}).get("food_likes"):
-                food_str = ", ".join(mem['interests']['food_likes'][:5])
-                facts.append(f"Food likes: {food_str}")
-        
-        if any(word in query_lower for word in ["project", "build", "code", "python", "react", "framework", "app", "chatbot", "past"]):
-            if mem.get("tech_stack", {}).get("projects"):
-                current = [p.get("name") for p in mem['tech_stack']['projects']]
-                facts.append("Current projects: " + " | ".join(current))
-            if mem.get("tech_stack", {}).get("past_projects"):
-                past = [p.get("name") for p in mem['tech_stack']['past_projects']]
-                facts.append("Past projects: " + " | ".join(past))
-        
-        if any(word in query_lower for word in ["morning", "routine", "wake", "day", "daily"]):
-            if mem.get("daily_routine", {}).get("morning"):
-                morning = mem['daily_routine']['morning'].get("actions", [])
-                if morning:
-                    facts.append("Morning: " + ", ".join(morning))
-        
-        if any(word in query_lower for word in ["hobby", "interest", "enjoy", "like to", "love", "sticker", "craft"]):
-            if mem.get("interests", {}).get("hobbies"):
-                hobbies = ", ".join(mem['interests']['hobbies'])
-                facts.append(f"Hobbies: {hobbies}")
+            # Opt-in response cache: a repeated standalone prompt replays the stored answer
+            cache_key = None
+            if settings.RESPONSE_CACHE and response_cache.cacheable(user_text, history, is_quiz, bool(direct_urls)):
+                facts, query_vector = await facts_job
+                cache_key = response_cache.CacheKey(user_text, mode, facts, query_type, req.allow_internet, user_loc)
+                cache_key.vector = query_vector  # one query embedding serves facts and cache
+                with tracing.span("response_cache") as attrs:
+                    hit = await response_cache.lookup(cache_key, None)
+                    attrs["hit"] = hit.kind if hit else None
+                if hit:
+                    if hit.sources:
+                        yield f"data: {json.dumps({'type': 'sources', 'sources': hit.sources})}\n\n"
+                    for piece in re.findall(r"\S+\s*", hit.answer):
+                        yield f"data: {json.dumps({'type': 'token', 'text': piece})}\n\n"
+                        await asyncio.sleep(0)
+                    log_line(
+                        f"TIMING req={request_id} total={time.time() - start_time:.2f}s "
+                        f"cached={hit.kind} similarity={hit.similarity:.3f} query_type={query_type}"
+                    )
+                    log_line(f"USER: {req.text}")
+                    log_line(f"ALFRED: {hit.answer}")
+                    tracing.finish(trace, mode=mode, query_type=query_type, cached=hit.kind)
+                    yield f"data: {json.dumps({'type': 'done', 'request_id': request_id})}\n\n"
+                    return
+
+            # Gather context: API, direct links, web and KB run concurrently under one deadline
+            jobs = [("api", 0, api_service.try_api_first(user_text, user_loc))]
+            jobs += [("url", n, _link_source(u)) for n, u in enumerate(direct_urls)]
+            if do_web and query_type in ('requires_web', 'suggests_web'):
+                jobs.append(("web", 0, _web_sources(user_text, user_loc)))
+            if any(word in query_lower for word in _KB_WORDS):
+                jobs.append(("kb", 0, asyncio.to_thread(lambda: search_knowledge_base(user_text, current_vector_store()))))
+
+            kinds = {kind for kind, _, _ in jobs}
+            for kind, status in (("url", 'Reading links...'), ("web", 'Checking latest info...'), ("kb", 'Searching knowledge base...')):
+                if kind in kinds:
+                    yield f"data: {json.dumps({'type': 'status', 'text': status})}\n\n"
+                    break
+
+            found = {"api": None, "url": {}, "web": [], "kb": []}
+            gather_start = time.time()
+            async with aclosing(_gather_context(jobs, _CONTEXT_DEADLINE)) as arrivals:
+                async for kind, n, result in arrivals:
+                    if kind == "url":
+                        found["url"][n] = result
+                    elif kind == "web":
+                        found["web"].append(result)  # one page per arrival
+                    else:
+                        found[kind] = result or found[kind]
+                    log_line(f"Context {kind}: ready after {time.time() - gather_start:.2f}s")
+                    if kind != "api" or result:
+                        yield f"data: {json.dumps({'type': 'sources', 'sources': _ui_sources(_merge_sources(found))})}\n\n"
+
+            facts, _ = await facts_job
+            api_result = found["api"]
+            ranked = _merge_sources(found)
+            sources = [s for _, s in ranked]
+            context_parts = [f"[API] {api_result['formatted']}"] if api_result else []
+            for i, (label, r) in enumerate(ranked, 1):
+                excerpt = select_passages(user_text, r.get("text") or r.get("snippet") or "")
+                if label == "KB":
+                    context_parts.append(f"[KB-{i}] {r['title']}\n{excerpt}")
+                else:
+                    context_parts.append(f"[{i}] {r['title']} - {r['url']}\n{excerpt}")
         
-        # Always include name/location as baseline
-        # Removed: don't force name/location on every response
-        # if mem.get("name"):
-        #     facts.insert(0, f"Name: {mem['name']}")
-        # if user_loc:
-        #     facts.insert(1, f"Location: {user_loc}")
+            context = "\n\n".join(context_parts)
         
-        if facts:
-            fact_msg = "FACTS (reference, do NOT hallucinate): " + " | ".join(facts)
-            messages.append({"role": "system", "content": fact_msg})
+            # Build messages
+            conversation_depth = len(history)
         
-        if context and mode == "study":
-            user_text_with_context = (
-                f"Web sources:\n{context}\n\n"
-                f"User: {user_text}\n\n"
-                f"Cite with [1], [2] only if directly relevant."
+            # Stable prefix (system + history) first; time, facts and context ride on the last message
+            system = prompt_service.system_prompt(mode, is_quiz)
+            turn = prompt_service.turn_message(user_text, current_dt, facts=facts, context=context if mode == "study" else "")
+            prior = history_service.prior_turns(history, user_text)
+            history_budget = (
+                settings.PROMPT_TOKEN_BUDGET
+                - history_service.message_tokens({"content": system})
+                - history_service.message_tokens(turn)
             )
-        else:
-            user_text_with_context = user_text
-        
-        messages += history[-20:]
-        messages.append({"role": "user", "content": user_text_with_context})
+            summary, recent = history_service.fit(prior, req.session_id, history_budget)
+            messages = prompt_service.build_messages(system, recent, turn, summary)
         
-        # Prepare sources for UI
-        ui_sources = [
-            {
-                "i": i + 1,
-                "title": s.get("title", "") or "(link)",
-                "host": re.sub(r"^https?://([^/]+)/?.*", r"\1", s.get("url","")) if s.get("url") else "knowledge-base",
-                "url": s.get("url",""),
-            }
-            for i, s in enumerate(sources)
-        ]
-        
-        if ui_sources:
-            yield f"data: {json.dumps({'type': 'sources', 'sources': ui_sources})}\n\n"
-        
-        # Stream LLM
-        url = f"{OLLAMA_URL}/api/chat"
-        payload = {
-            "model": MODEL,
-            "messages": messages,
-            "stream": True,
-            "keep_alive": "24h",
-            "options": {
+            # Stream LLM (async client: other chats keep streaming while this one waits on tokens)
+            options = {
                 "temperature": 0.4,
                 "top_k": 20,
                 "top_p": 0.7,
                 "num_threads": 6,          
                 "repeat_penalty": 1.15,
             }
-        }
 
-        full_text = ""
-        llm_start = time.time()
-        try:
-            with requests.post(url, json=payload, stream=True, timeout=120) as r:
-                r.raise_for_status()
-                for line in r.iter_lines():
-                    if line:
-                        data = json.loads(line)
-                        if chunk := data.get("message", {}).get("content"):
-                            full_text += chunk
-                            yield f"data: {json.dumps({'type': 'token', 'text': chunk})}\n\n"
-        except Exception as e:
-            yield f"data: {json.dumps({'type': 'token', 'text': f'Error: {e}'})}\n\n"
+            full_text = ""
+            llm_failed = False
+            llm_stats = {}
+            llm_start = time.time()
+            t = time.perf_counter()
+            try:
+                async with aclosing(LLM.stream_chat(MODEL, messages, options=options, stats=llm_stats)) as stream:
+                    async for chunk in stream:
+                        if not full_text:
+                            tracing.mark("llm.ttft", t)
+                        full_text += chunk
+                        yield f"data: {json.dumps({'type': 'token', 'text': chunk})}\n\n"
+            except Exception as e:
+                llm_failed = True
+                yield f"data: {json.dumps({'type': 'token', 'text': f'Error: {e or type(e).__name__}'})}\n\n"
         
-        llm_time = time.time() - llm_start
-        total_time = time.time() - start_time
+            llm_time = time.time() - llm_start
+            total_time = time.time() - start_time
+            tracing.mark(
+                "llm", t, backend=llm_stats.get("backend"),
+                eval_count=llm_stats.get("eval_count"), prompt_eval_count=llm_stats.get("prompt_eval_count"),
+            )
+            if llm_stats.get("eval_duration"):
+                tracing.observe("llm.tokens_per_sec", llm_stats["eval_count"] / (llm_stats["eval_duration"] / 1e9))
         
-        response_length = len(full_text)
-
-        log_line(
-            f"TIMING total={total_time:.2f}s llm={llm_time:.2f}s "
-            f"ctx_chars={len(context)} query_type={query_type} sources={len(sources)} "
-            f"response_chars={response_length} conversation_depth={conversation_depth}"
-        )
-        log_line(f"USER: {req.text}")
-        log_line(f"ALFRED: {full_text}")
+            response_length = len(full_text)
+
+            log_line(
+                f"TIMING req={request_id} total={total_time:.2f}s llm={llm_time:.2f}s "
+                f"ctx_chars={len(context)} query_type={query_type} sources={len(sources)} "
+                f"response_chars={response_length} conversation_depth={conversation_depth}"
+            )
+            # prompt_eval_count = prompt tokens Ollama actually evaluated; low vs prompt size means KV-cache reuse
+            log_line(
+                f"PROMPT messages={len(messages)} history={len(recent)}/{len(prior)} summary={bool(summary)} "
+                f"prompt_tokens_est={sum(history_service.message_tokens(m) for m in messages)} "
+                f"prompt_eval_count={llm_stats.get('prompt_eval_count')} "
+                f"prompt_eval_ms={llm_stats.get('prompt_eval_duration', 0) // 1_000_000} "
+                f"eval_count={llm_stats.get('eval_count')}"
+            )
+            log_line(f"USER: {req.text}")
+            log_line(f"ALFRED: {full_text}")
+            if cache_key and full_text and not llm_failed:
+                response_cache.store(cache_key, full_text, _ui_sources(ranked))
+            tracing.finish(trace, mode=mode, query_type=query_type, sources=len(sources), response_chars=response_length)
         
-        yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield f"data: {json.dumps({'type': 'done', 'request_id': request_id})}\n\n"
+
+            # Fold turns that will no longer fit into the session summary, off the response path
+            if full_text:
+                turns = prior + [{"role": "user", "content": user_text}, {"role": "assistant", "content": full_text}]
+                _background(history_service.compact(req.session_id, turns, history_budget, LLM, MODEL))
+        finally:
+            facts_job.cancel()  # client gone mid-pipeline: don't leave the lookup running
     
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(
+        _until_disconnect(request, generate(), req.text),
+        media_type="text/event-stream",
+        headers={"X-Request-ID": request_id},
+    )
 
 @app.get("/memory")
-def memory_dump():
-    mem_file = APP_DIR / "data" / "memory.json"
-    with open(mem_file, "r", encoding="utf-8") as f:
-        return JSONResponse(json.load(f))
+def memory_dump(offset: int = 0, limit: int = 50, q: str = ""):
+    """Stored facts, a page at a time; q= filters with the same full-text index chat uses."""
+    return JSONResponse(memory_db.page(max(0, offset), min(max(1, limit), 200), q))
+
+@app.get("/health")
+def health():
+    """
+    {"status": "ready" | "degraded" | "warming" | "error", "models": {...}}: the UI shows
+    "Warming up..." until the chat model is up; degraded = an optional model (embeddings) is not.
+    """
+    return JSONResponse(model_warmup.status())
+
+@app.get("/llm/stats")
+def llm_stats():
+    return JSONResponse(LLM.stats())
+
+@app.get("/metrics")
+def metrics():
+    """Latency percentiles (ms) per span over recent chats; llm.tokens_per_sec in tokens/s."""
+    return JSONResponse(tracing.metrics())
+
+@app.get("/cache/stats")
+def cache_stats():
+    return JSONResponse({
+        "pages": page_cache.stats(),
+        "search": search_cache_stats(),
+        "search_variants": search_variant_stats(),
+        "responses": response_cache.stats(),
+    })
+
+@app.get("/hosts/stats")
+def hosts_stats():
+    return JSONResponse(host_health.stats())
+
+@app.get("/browser/stats")
+def browser_stats():
+    return JSONResponse(browser_pool.stats())
 
 @app.post("/stt")
 async def stt(request: Request):
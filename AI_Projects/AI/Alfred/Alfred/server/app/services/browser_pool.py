@@ -0,0 +1,222 @@
+# app/services/browser_pool.py
+"""
+Warm, process-wide Playwright browser for the JS-render fallback
+- One headless Chromium, driven from a dedicated event-loop thread (started on first use)
+- A fixed number of browser contexts handed out through a queue; extra callers wait
+  instead of launching more Chromium processes
+- Each context keeps one page that is reused, then recycled after _MAX_NAVIGATIONS
+- Images/fonts/media are aborted during render
+- stats() reports pool wait time so undersized pools show up
+
+One-time setup on your machine:
+  python -m playwright install chromium
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+_POOL_SIZE = 2                 # warm browser contexts (= max concurrent renders)
+_MAX_NAVIGATIONS = 25          # recycle a context after this many page loads
+_NAV_TIMEOUT_MS = 20000        # per-navigation timeout
+_SETTLE_MS = 800               # small settle window for SPA content
+_BLOCKED_RESOURCES = {"image", "font", "media"}
+_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/122.0 Safari/537.36"
+)
+
+
+class _Slot:
+    """One warm browser context with its reusable page."""
+
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.navigations = 0
+
+
+class BrowserPool:
+    """Fixed-size pool of warm Playwright contexts shared by every thread and event loop."""
+
+    def __init__(self, size: int = _POOL_SIZE, max_navigations: int = _MAX_NAVIGATIONS):
+        self.size = size
+        self.max_navigations = max_navigations
+        self._start_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pw = None
+        self._browser = None
+        self._slots: Optional[asyncio.Queue] = None
+        self._waits: deque = deque(maxlen=500)
+        self._waits_lock = threading.Lock()  # appended on the pool thread, read by stats()
+        self._renders = 0
+        self._recycled = 0
+
+    # ----- lifecycle (runs on the pool thread) -----
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="browser-pool", daemon=True)
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._start(), loop).result()
+            except Exception:
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join(timeout=5)
+                loop.close()
+                raise
+            self._loop, self._thread = loop, thread
+
+    async def _start(self) -> None:
+        from playwright.async_api import async_playwright
+        self._pw = await async_playwright().start()
+        try:
+            self._browser = await self._pw.chromium.launch(headless=True)
+            self._slots = asyncio.Queue()
+            for _ in range(self.size):
+                self._slots.put_nowait(await self._new_slot())
+        except Exception:
+            await self._stop()
+            self._browser = self._pw = self._slots = None
+            raise
+
+    async def _new_slot(self) -> _Slot:
+        if not self._browser.is_connected():
+            # browser crashed: relaunch once for the whole pool
+            self._browser = await self._pw.chromium.launch(headless=True)
+        context = await self._browser.new_context(user_agent=_USER_AGENT)
+        await context.route("**/*", _block_heavy_resources)
+        page = await context.new_page()
+        page.set_default_timeout(_NAV_TIMEOUT_MS)
+        return _Slot(context, page)
+
+    async def _recycle(self, slot: _Slot) -> _Slot:
+        self._recycled += 1
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+        return await self._new_slot()
+
+    async def _stop(self) -> None:
+        try:
+            if self._browser is not None:
+                await self._browser.close()
+        finally:
+            if self._pw is not None:
+                await self._pw.stop()
+
+    # ----- rendering -----
+
+    async def _render(self, url: str) -> str:
+        t0 = time.monotonic()
+        slot = await self._slots.get()
+        with self._waits_lock:
+            self._waits.append(time.monotonic() - t0)
+        try:
+            await slot.page.goto(url, wait_until="domcontentloaded")
+            await slot.page.wait_for_timeout(_SETTLE_MS)
+            html = await slot.page.content()
+            slot.navigations += 1
+            self._renders += 1
+            return html
+        except Exception:
+            slot.navigations = self.max_navigations  # page may be wedged; start fresh
+            raise
+        finally:
+            if slot.navigations >= self.max_navigations:
+                try:
+                    slot = await self._recycle(slot)
+                except Exception as e:
+                    print(f"[WARN] Browser pool could not recycle a context: {e}")
+                    slot.navigations = 0
+            self._slots.put_nowait(slot)
+
+    def render(self, url: str, timeout: Optional[float] = None) -> str:
+        """Render url and return its HTML. Blocking; safe to call from any thread."""
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(self._render(url), self._loop)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    async def render_async(self, url: str) -> str:
+        """Awaitable render from any other event loop (the pool keeps its own loop)."""
+        if self._loop is None:
+            await asyncio.to_thread(self._ensure_started)
+        future = asyncio.run_coroutine_threadsafe(self._render(url), self._loop)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def stats(self) -> Dict:
+        """Pool wait time (ms) over recent renders plus render/recycle counters."""
+        with self._waits_lock:
+            waits = sorted(list(self._waits))
+        n = len(waits)
+        return {
+            "started": self._loop is not None,
+            "size": self.size,
+            "renders": self._renders,
+            "recycled": self._recycled,
+            "idle": self._slots.qsize() if self._slots is not None else 0,
+            "wait_avg_ms": round(1000 * sum(waits) / n, 1) if n else 0.0,
+            "wait_p95_ms": round(1000 * waits[min(n - 1, int(n * 0.95))], 1) if n else 0.0,
+            "wait_max_ms": round(1000 * waits[-1], 1) if n else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        """Close Chromium and stop the pool thread."""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._stop(), loop).result(timeout=10)
+            except Exception as e:
+                print(f"[WARN] Browser pool shutdown: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            if not loop.is_running():
+                loop.close()
+            self._browser = self._pw = self._slots = self._thread = None
+
+
+async def _block_heavy_resources(route) -> None:
+    if route.request.resource_type in _BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+_POOL = BrowserPool()
+
+
+def render(url: str, timeout: Optional[float] = None) -> str:
+    return _POOL.render(url, timeout)
+
+
+async def render_async(url: str) -> str:
+    return await _POOL.render_async(url)
+
+
+def stats() -> Dict:
+    return _POOL.stats()
+
+
+def shutdown() -> None:
+    _POOL.shutdown()
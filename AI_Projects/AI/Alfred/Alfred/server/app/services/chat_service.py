@@ -11,6 +11,8 @@ import time
 from typing import List, Dict, Any, Optional, Generator
 from datetime import datetime
 
+from app.services.passage_ranker import select_passages
+
 class ChatService:
     """Handles chat operations, web search, and LLM interactions"""
     
@@ -70,14 +72,14 @@ class ChatService:
         
         return messages
     
-    def build_context_parts(self, sources: List[Dict[str, str]]) -> List[str]:
-        """Build context parts from sources for LLM prompt"""
+    def build_context_parts(self, sources: List[Dict[str, str]], query: str = "") -> List[str]:
+        """Build context parts from sources for LLM prompt (query-ranked excerpts when query is given)"""
         context_parts = []
         for i, source in enumerate(sources, 1):
             title = source.get("title", "(link)")
             url = source.get("url", "")
             text = source.get("text", "") or source.get("snippet", "")
-            excerpt = text[:200].strip()
+            excerpt = select_passages(query, text) if query else text[:200].strip()
             
             if url:
                 piece = f"[{i}] {title} - {url}\n{excerpt}"
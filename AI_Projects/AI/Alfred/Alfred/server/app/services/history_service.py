@@ -0,0 +1,160 @@
+# app/services/history_service.py
+"""
+Token-budgeted conversation history
+- count_tokens(): cached estimate of llama-style BPE tokens (same strings are recounted every turn)
+- fit(): recent turns verbatim within the budget, older ones represented by a rolling summary
+- compact(): after a response, folds turns that fell out of the window into the summary (background)
+- The window start moves in steps, so the prompt prefix stays stable for Ollama's KV cache
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from app.services import llm_router
+
+_MESSAGE_OVERHEAD = 4      # chat-template tokens around each message (role header, end marker)
+_CHARS_PER_PIECE = 8       # words longer than this count as several tokens
+_STEP = 4                  # window start moves in multiples of this (even: keeps user/assistant pairs)
+_SUMMARY_TOKENS = 200      # length cap for the rolling summary
+_MAX_SESSIONS = 200        # summaries kept in memory (least recently used dropped)
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+_SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and Alfred in under 120 words. "
+    "Keep names, facts the user shared, decisions and open questions. No preamble."
+)
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Approximate token count: one per word or symbol, long words split every few chars."""
+    return sum(1 + len(p) // _CHARS_PER_PIECE for p in _PIECE.findall(text or ""))
+
+
+def message_tokens(msg: Dict) -> int:
+    return count_tokens(msg.get("content") or "") + _MESSAGE_OVERHEAD
+
+
+def prior_turns(history: List[Dict], user_text: str) -> List[Dict]:
+    """History without the current message (the client appends it before sending)."""
+    if history and history[-1].get("role") == "user" and history[-1].get("content") == user_text:
+        return history[:-1]
+    return history
+
+
+def window_start(history: List[Dict], budget: int, step: int = _STEP) -> int:
+    """Smallest multiple of `step` from which the rest of `history` fits in `budget` tokens."""
+    total = sum(message_tokens(m) for m in history)
+    start = 0
+    while start < len(history) and total > budget:
+        for m in history[start:start + step]:
+            total -= message_tokens(m)
+        start += step
+    return min(start, len(history))
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Cut `text` at a word boundary so it stays within max_tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    while words and count_tokens(" ".join(words)) > max_tokens:
+        words = words[:max(1, len(words) * 3 // 4)] if len(words) > 1 else []
+    return " ".join(words)
+
+
+class _Summaries:
+    """Rolling summary per session: (text, number of leading messages it covers)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._busy: set = set()
+
+    def get(self, session_id: str) -> Tuple[str, int]:
+        with self._lock:
+            if session_id not in self._data:
+                return "", 0
+            self._data.move_to_end(session_id)
+            return self._data[session_id]
+
+    def put(self, session_id: str, text: str, covered: int) -> None:
+        with self._lock:
+            self._data[session_id] = (text, covered)
+            self._data.move_to_end(session_id)
+            while len(self._data) > _MAX_SESSIONS:
+                self._data.popitem(last=False)
+
+    def claim(self, session_id: str) -> bool:
+        """One compaction per session at a time."""
+        with self._lock:
+            if session_id in self._busy:
+                return False
+            self._busy.add(session_id)
+            return True
+
+    def release(self, session_id: str) -> None:
+        with self._lock:
+            self._busy.discard(session_id)
+
+
+_SUMMARIES = _Summaries()
+
+
+def summary_message(text: str) -> Dict[str, str]:
+    return {"role": "system", "content": f"Earlier in this conversation: {text}"}
+
+
+def fit(history: List[Dict], session_id: str, budget: int) -> Tuple[str, List[Dict]]:
+    """
+    (summary, recent) for this turn: recent messages verbatim within `budget` tokens,
+    minus what the session's summary takes. Summary is "" until compact() has run.
+    The verbatim window starts where the summary ends, so turns waiting for the next
+    compaction are still sent and summarized turns are not sent twice.
+    """
+    summary, covered = _SUMMARIES.get(session_id) if session_id else ("", 0)
+    if covered > len(history):
+        summary, covered = "", 0  # history was cut or restarted client-side: summary no longer lines up
+    if summary:
+        budget -= message_tokens(summary_message(summary))
+    if budget <= 0:
+        return summary, []
+    rest = history[covered:]
+    return summary, rest[window_start(rest, budget):]
+
+
+async def compact(session_id: str, history: List[Dict], budget: int, llm: llm_router.LLMRouter, model: str) -> None:
+    """
+    Fold messages that no longer fit in `budget` into the session summary.
+    Run after the response is sent, through the router (failover, least-loaded backend);
+    failures keep the previous summary.
+    """
+    if not session_id or not _SUMMARIES.claim(session_id):
+        return
+    try:
+        summary, covered = _SUMMARIES.get(session_id)
+        start = window_start(history, budget - _SUMMARY_TOKENS - _MESSAGE_OVERHEAD)
+        if start <= covered:
+            return
+        transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in history[covered:start])
+        if summary:
+            transcript = f"Summary so far: {summary}\n\n{transcript}"
+        messages = [{"role": "system", "content": _SUMMARY_PROMPT}, {"role": "user", "content": transcript}]
+        options = {"temperature": 0.2, "num_predict": _SUMMARY_TOKENS}
+        chunks = [c async for c in llm.stream_chat(model, messages, options=options)]
+        text = _clip("".join(chunks).strip(), _SUMMARY_TOKENS)
+        if text:
+            _SUMMARIES.put(session_id, text, start)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"[WARN] History summary failed: {e}")
+    finally:
+        _SUMMARIES.release(session_id)
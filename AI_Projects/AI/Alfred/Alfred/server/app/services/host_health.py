@@ -0,0 +1,153 @@
+# app/services/host_health.py
+"""
+Per-host health for search_service fetches
+- Circuit breaker: hosts that keep timing out / refusing connections are skipped for a while,
+  then half-open: a single probe fetch decides whether the host is back
+- Adaptive timeouts: read timeout follows the host's observed p95 latency
+- "Needs JS" hosts go straight to the Playwright render path (seeded + learned); a learned
+  flag expires after _JS_TTL so the plain fetch gets re-checked
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Tuple
+from urllib.parse import urlparse
+
+_DEFAULT_TIMEOUT = (7.0, 20.0)  # (connect, read) before a host has history
+_MIN_TIMEOUT = (2.0, 3.0)       # floor for adapted timeouts
+_TIMEOUT_FACTOR = 2.0           # adapted timeout = p95 latency * factor
+_MIN_SAMPLES = 5                # latency samples needed before timeouts adapt
+_WINDOW = 50                    # latency samples kept per host
+_FAILURES_TO_OPEN = 2           # consecutive timeouts/connection errors that open the breaker
+_OPEN_SECONDS = 300             # how long an open breaker skips the host
+_PROBE_SECONDS = 60             # a half-open probe that never reports back frees the slot after this
+_JS_STRIKES = 2                 # plain fetches in a row that needed a render -> host needs JS
+_JS_TTL = 3600                  # seconds a learned "needs JS" flag lasts before the plain fetch is retried
+_MAX_HOSTS = 1000               # forget least recently seen hosts beyond this
+
+# hosts known to serve empty shells without JS (extend with JS_HOSTS=a.com,b.com)
+_SEED_JS_HOSTS = {"fandango.com"} | {
+    h.strip().lower() for h in os.getenv("JS_HOSTS", "").split(",") if h.strip()
+}
+
+
+class _HostState:
+    def __init__(self):
+        self.latencies: deque = deque(maxlen=_WINDOW)
+        self.failures = 0
+        self.open_until = 0.0
+        self.probe_until = 0.0      # half-open: a probe is in flight until this time
+        self.js_strikes = 0
+        self.js_until = 0.0         # learned "needs JS" holds until this time
+        self.seen = time.monotonic()
+
+
+_lock = threading.Lock()
+_hosts: Dict[str, _HostState] = {}
+
+
+def host_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _state(host: str) -> _HostState:
+    st = _hosts.get(host)
+    if st is None:
+        if len(_hosts) >= _MAX_HOSTS:
+            oldest = min(_hosts, key=lambda h: _hosts[h].seen)
+            del _hosts[oldest]
+        st = _hosts[host] = _HostState()
+    st.seen = time.monotonic()
+    return st
+
+
+def _p95(samples) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def allow(url: str) -> bool:
+    """
+    False while the host's breaker is open. After _OPEN_SECONDS the breaker is half-open:
+    one probe is let through, other callers are refused until it records success/failure.
+    """
+    now = time.monotonic()
+    with _lock:
+        st = _hosts.get(host_of(url))
+        if st is None or not st.open_until:
+            return True
+        if st.open_until > now or st.probe_until > now:
+            return False
+        st.probe_until = now + _PROBE_SECONDS
+        return True
+
+
+def needs_js(url: str) -> bool:
+    host = host_of(url)
+    if any(host == h or host.endswith("." + h) for h in _SEED_JS_HOSTS):
+        return True
+    with _lock:
+        st = _hosts.get(host)
+        return bool(st and st.js_until > time.monotonic())
+
+
+def timeout_for(url: str, ceiling: Tuple[float, float] = _DEFAULT_TIMEOUT) -> Tuple[float, float]:
+    """(connect, read) timeout for this host: p95 * factor, clamped to [_MIN_TIMEOUT, ceiling]."""
+    with _lock:
+        st = _hosts.get(host_of(url))
+        if st is None or len(st.latencies) < _MIN_SAMPLES:
+            return ceiling
+        budget = _p95(st.latencies) * _TIMEOUT_FACTOR
+    return (
+        min(ceiling[0], max(_MIN_TIMEOUT[0], budget)),
+        min(ceiling[1], max(_MIN_TIMEOUT[1], budget)),
+    )
+
+
+def record_success(url: str, seconds: float) -> None:
+    with _lock:
+        st = _state(host_of(url))
+        st.latencies.append(seconds)
+        st.failures = 0
+        st.open_until = st.probe_until = 0.0
+
+
+def record_failure(url: str) -> None:
+    """A timeout or connection error (not an HTTP status): counts toward opening the breaker."""
+    with _lock:
+        st = _state(host_of(url))
+        st.failures += 1
+        st.probe_until = 0.0
+        if st.failures >= _FAILURES_TO_OPEN:  # includes a failed half-open probe
+            st.open_until = time.monotonic() + _OPEN_SECONDS
+            print(f"[WARN] Skipping {host_of(url)} for {_OPEN_SECONDS}s after {st.failures} failed fetches")
+
+
+def record_render(url: str, needed: bool) -> None:
+    """Track whether the plain fetch had to be replaced by a JS render."""
+    with _lock:
+        st = _state(host_of(url))
+        st.js_strikes = st.js_strikes + 1 if needed else 0
+        if st.js_strikes >= _JS_STRIKES:
+            st.js_strikes = 0
+            st.js_until = time.monotonic() + _JS_TTL
+
+
+def stats() -> Dict[str, Dict]:
+    now = time.monotonic()
+    with _lock:
+        return {
+            host: {
+                "samples": len(st.latencies),
+                "p95_ms": round(_p95(st.latencies) * 1000) if st.latencies else None,
+                "failures": st.failures,
+                "open_for_s": max(0, round(st.open_until - now)),
+                "needs_js_for_s": max(0, round(st.js_until - now)),
+            }
+            for host, st in _hosts.items()
+        }
@@ -0,0 +1,60 @@
+# app/services/http_pool.py
+"""
+Process-wide pooled HTTP clients
+- One long-lived aiohttp.ClientSession (keep-alive + DNS cache) for the async paths
+- Total and per-host concurrency bounded by the connector
+- One requests.Session for the sync paths (thread pool workers)
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+_TOTAL_CONNECTIONS = 32        # max open sockets across all hosts
+_PER_HOST_CONNECTIONS = 4      # max concurrent requests to one host
+_DNS_TTL = 300                 # seconds to cache DNS lookups
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_session: Optional[requests.Session] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Shared aiohttp session for the running event loop (created lazily)."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=_TOTAL_CONNECTIONS,
+            limit_per_host=_PER_HOST_CONNECTIONS,
+            ttl_dns_cache=_DNS_TTL,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+    return _session
+
+
+async def close_session() -> None:
+    """Close the shared aiohttp session (call on app shutdown)."""
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+def get_sync_session() -> requests.Session:
+    """Shared requests.Session with a connection pool sized like the async one."""
+    global _sync_session
+    if _sync_session is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=_TOTAL_CONNECTIONS, pool_maxsize=_PER_HOST_CONNECTIONS)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        _sync_session = s
+    return _sync_session
@@ -0,0 +1,125 @@
+# app/services/llm_router.py
+"""
+Spreads chats over several Ollama backends (OLLAMA_URLS=http://a:11434,http://b:11434)
+- Tracks in-flight streams and recent tokens/sec per backend
+- Dispatches to the backend with the lowest expected wait: (in_flight + 1) / tokens_per_sec
+- Fails over to the next backend when one errors before producing a token; a failed backend
+  is skipped for _DOWN_SECONDS (unless every backend is down)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import AsyncGenerator, Dict, List, Optional
+
+from app.services import ollama_service
+
+_DOWN_SECONDS = 30      # skip a backend this long after it failed
+_TPS_ALPHA = 0.3        # weight of the newest tokens/sec sample in the moving average
+_DEFAULT_TPS = 20.0     # assumed speed until a backend has served a chat
+
+
+class _Backend:
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.tps: Optional[float] = None
+        self.served = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_error = ""
+
+    def expected_wait(self, default_tps: float) -> float:
+        return (self.in_flight + 1) / (self.tps or default_tps)
+
+    def observe_tps(self, tps: float) -> None:
+        self.tps = tps if self.tps is None else (1 - _TPS_ALPHA) * self.tps + _TPS_ALPHA * tps
+
+
+class LLMRouter:
+    def __init__(self, urls: List[str]):
+        if not urls:
+            raise ValueError("LLMRouter needs at least one backend URL")
+        self.backends = [_Backend(u.rstrip("/")) for u in urls]
+
+    @property
+    def urls(self) -> List[str]:
+        return [b.url for b in self.backends]
+
+    def _pick(self, exclude: set) -> Optional[_Backend]:
+        candidates = [b for b in self.backends if b.url not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        healthy = [b for b in candidates if b.down_until <= now] or candidates
+        known = [b.tps for b in self.backends if b.tps]
+        default_tps = sum(known) / len(known) if known else _DEFAULT_TPS
+        return min(healthy, key=lambda b: (b.expected_wait(default_tps), b.served))
+
+    def least_loaded(self) -> str:
+        """URL of the backend a new request would go to (for one-off calls: embeddings, summaries)."""
+        return self._pick(set()).url
+
+    async def stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        options: Optional[Dict] = None,
+        stats: Optional[Dict] = None,
+    ) -> AsyncGenerator[str, None]:
+        """ollama_service.stream_chat on the least-loaded backend, with fail-over. stats gets "backend"."""
+        tried: set = set()
+        while True:
+            backend = self._pick(tried)
+            if backend is None:
+                last = max(self.backends, key=lambda b: b.down_until)  # most recent failure
+                cause = f": {last.last_error}" if last.last_error else ""
+                raise RuntimeError(f"All LLM backends failed ({len(tried)} tried){cause}")
+            tried.add(backend.url)
+            run_stats: Dict = {}
+            produced = 0
+            backend.in_flight += 1
+            t0 = time.monotonic()
+            try:
+                async for chunk in ollama_service.stream_chat(backend.url, model, messages, options=options, stats=run_stats):
+                    produced += 1
+                    yield chunk
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                backend.failures += 1
+                backend.down_until = time.monotonic() + _DOWN_SECONDS
+                backend.last_error = str(e) or type(e).__name__
+                print(f"[WARN] LLM backend {backend.url} failed: {backend.last_error}")
+                if produced:
+                    raise  # half an answer is already on screen; don't start over elsewhere
+                continue
+            finally:
+                backend.in_flight -= 1
+
+            backend.served += 1
+            backend.failures = 0
+            backend.down_until = 0.0
+            if run_stats.get("eval_duration"):
+                backend.observe_tps(run_stats["eval_count"] / (run_stats["eval_duration"] / 1e9))
+            elif produced and time.monotonic() > t0:
+                backend.observe_tps(produced / (time.monotonic() - t0))
+            if stats is not None:
+                stats.update(run_stats, backend=backend.url)
+            return
+
+    def stats(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": b.url,
+                "in_flight": b.in_flight,
+                "tokens_per_sec": round(b.tps, 1) if b.tps else None,
+                "served": b.served,
+                "failures": b.failures,
+                "down_for_s": max(0, round(b.down_until - now)),
+                **({"last_error": b.last_error} if b.last_error else {}),
+            }
+            for b in self.backends
+        ]
@@ -0,0 +1,231 @@
+# app/services/memory_db.py
+"""
+SQLite fact store behind the FACTS prompt section
+- memory.json is flattened into one row per fact: (path, value, tags, updated_at), WAL mode
+- An FTS5 index (porter stemming) over label, value and tags finds the facts relevant to a
+  query in one lookup, replacing the per-topic keyword if-chains in chat_stream
+- Tags carry the synonyms those keyword lists used ("netflix" -> favorite TV, ...)
+- sync_from_json() is incremental: only changed facts are rewritten, removed ones deleted
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+APP_DIR = Path(__file__).parent.parent.parent  # Go to server/
+DB_FILE = APP_DIR / "data" / "memory.sqlite3"
+MEM_FILE = APP_DIR / "data" / "memory.json"
+
+_SKIP_KEYS = {"memory_rules"}     # instructions for the assistant, not facts about the user
+_MAX_VALUE_CHARS = 300
+_MAX_LIST_ITEMS = 8               # scalar lists (favorite shows...) are cut to this many
+_TOP_K = 8
+
+# synonyms from the old keyword chains, by path prefix
+_TAGS = {
+    "family": "dog pet animal married single family husband wife children name breed",
+    "dogs": "dog pet animal family name breed",
+    "interests.favorite_tv": "tv show watch netflix hulu",
+    "interests.favorite_music": "music song artist listen spotify",
+    "interests.food_likes": "food eat like cook dish",
+    "interests.hobbies": "hobby interest enjoy like to love sticker craft",
+    "tech_stack": "project build code python react framework app chatbot past",
+    "daily_routine": "morning routine wake day daily",
+}
+
+_TERM = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it me my of on or the to "
+    "was what when where which who why with you your about can do does tell".split()
+)
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_synced_hash: Optional[str] = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        DB_FILE.parent.mkdir(exist_ok=True)
+        _conn = sqlite3.connect(str(DB_FILE), check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS facts (
+                path TEXT PRIMARY KEY, label TEXT, value TEXT, tags TEXT, updated_at REAL);
+            CREATE VIRTUAL TABLE IF NOT EXISTS facts_fts USING fts5(
+                label, value, tags, content='facts', content_rowid='rowid',
+                tokenize='porter unicode61');
+            CREATE TRIGGER IF NOT EXISTS facts_ai AFTER INSERT ON facts BEGIN
+                INSERT INTO facts_fts(rowid, label, value, tags) VALUES (new.rowid, new.label, new.value, new.tags);
+            END;
+            CREATE TRIGGER IF NOT EXISTS facts_ad AFTER DELETE ON facts BEGIN
+                INSERT INTO facts_fts(facts_fts, rowid, label, value, tags)
+                VALUES ('delete', old.rowid, old.label, old.value, old.tags);
+            END;
+            CREATE TRIGGER IF NOT EXISTS facts_au AFTER UPDATE ON facts BEGIN
+                INSERT INTO facts_fts(facts_fts, rowid, label, value, tags)
+                VALUES ('delete', old.rowid, old.label, old.value, old.tags);
+                INSERT INTO facts_fts(rowid, label, value, tags) VALUES (new.rowid, new.label, new.value, new.tags);
+            END;
+            """
+        )
+        _conn.commit()
+    return _conn
+
+
+# ---------- JSON -> facts ----------
+
+def _label(path: str) -> str:
+    """'interests.favorite_tv' -> 'Favorite tv', 'dogs.0' -> 'Dogs'."""
+    words = [p for p in path.split(".") if not p.isdigit()]
+    return (words[-1] if words else path).replace("_", " ").capitalize()
+
+
+def _render(value) -> str:
+    if isinstance(value, dict):
+        name = value.get("name")
+        rest = ", ".join(
+            (_render(v) if k in ("type", "color") else f"{k.replace('_', ' ')} {_render(v)}")
+            for k, v in value.items() if k != "name" and v not in ("", None, [], {})
+        )
+        text = f"{name} ({rest})" if name and rest else str(name or rest)
+    elif isinstance(value, list):
+        text = ", ".join(str(v) for v in value[:_MAX_LIST_ITEMS])
+    else:
+        text = str(value)
+    return text[:_MAX_VALUE_CHARS]
+
+
+def _tags(path: str) -> str:
+    tags = [t for prefix, t in _TAGS.items() if path == prefix or path.startswith(prefix + ".")]
+    tags.append(" ".join(p.replace("_", " ") for p in path.split(".") if not p.isdigit()))
+    return " ".join(tags)
+
+
+def flatten(mem: Dict) -> Dict[str, Tuple[str, str, str]]:
+    """{path: (label, value, tags)} for every non-empty fact in the memory document."""
+    out: Dict[str, Tuple[str, str, str]] = {}
+
+    def walk(path: str, value) -> None:
+        if value in ("", None, [], {}):
+            return
+        if isinstance(value, dict) and "name" not in value:
+            for k, v in value.items():
+                walk(f"{path}.{k}" if path else k, v)
+        elif isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+            for i, v in enumerate(value):
+                walk(f"{path}.{i}", v)
+        else:
+            out[path] = (_label(path), _render(value), _tags(path))
+
+    for key, value in (mem or {}).items():
+        if key not in _SKIP_KEYS:
+            walk(key, value)
+    return out
+
+
+def sync_from_json(mem: Dict) -> int:
+    """Bring the facts table in line with the memory document. Returns rows changed (0 if unchanged)."""
+    global _synced_hash
+    digest = hashlib.sha1(json.dumps(mem, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    if digest == _synced_hash:
+        return 0
+    facts = flatten(mem)
+    now = time.time()
+    changed = 0
+    try:
+        with _lock:
+            db = _db()
+            existing = {p: (l, v, t) for p, l, v, t in db.execute("SELECT path, label, value, tags FROM facts")}
+            for path in existing.keys() - facts.keys():
+                db.execute("DELETE FROM facts WHERE path = ?", (path,))
+                changed += 1
+            for path, row in facts.items():
+                if existing.get(path) != row:
+                    db.execute(
+                        "INSERT INTO facts(path, label, value, tags, updated_at) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT(path) DO UPDATE SET label=excluded.label, value=excluded.value, "
+                        "tags=excluded.tags, updated_at=excluded.updated_at",
+                        (path, *row, now),
+                    )
+                    changed += 1
+            db.commit()
+            _synced_hash = digest
+    except sqlite3.Error as e:
+        print(f"[WARN] Memory DB sync failed: {e}")
+    return changed
+
+
+def import_json(path: Path = MEM_FILE) -> int:
+    """One-shot importer for an existing memory.json."""
+    with open(path, "r", encoding="utf-8") as f:
+        return sync_from_json(json.load(f))
+
+
+# ---------- lookup ----------
+
+def _match_expr(query: str) -> str:
+    terms = [t for t in _TERM.findall((query or "").lower()) if len(t) > 1 and t not in _STOPWORDS]
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+def relevant_facts(query: str, limit: int = _TOP_K) -> List[str]:
+    """'Label: value' lines for the facts matching the query, best first."""
+    expr = _match_expr(query)
+    if not expr:
+        return []
+    try:
+        with _lock:
+            rows = _db().execute(
+                "SELECT f.label, f.value FROM facts_fts JOIN facts f ON f.rowid = facts_fts.rowid "
+                "WHERE facts_fts MATCH ? ORDER BY bm25(facts_fts) LIMIT ?",
+                (expr, limit),
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"[WARN] Memory DB lookup failed: {e}")
+        return []
+    return [f"{label}: {value}" for label, value in rows]
+
+
+def all_facts() -> List[Tuple[str, str]]:
+    """(path, 'Label: value') for every stored fact, in path order."""
+    with _lock:
+        rows = _db().execute("SELECT path, label, value FROM facts ORDER BY path").fetchall()
+    return [(path, f"{label}: {value}") for path, label, value in rows]
+
+
+def version() -> Optional[str]:
+    """Hash of the memory document last synced; changes whenever the facts do."""
+    return _synced_hash
+
+
+def page(offset: int = 0, limit: int = 50, q: str = "") -> Dict:
+    """One page of facts (optionally FTS-filtered) for GET /memory."""
+    with _lock:
+        db = _db()
+        if q and _match_expr(q):
+            where = "WHERE f.rowid IN (SELECT rowid FROM facts_fts WHERE facts_fts MATCH ?)"
+            args: tuple = (_match_expr(q),)
+        else:
+            where, args = "", ()
+        total = db.execute(f"SELECT COUNT(*) FROM facts f {where}", args).fetchone()[0]
+        rows = db.execute(
+            f"SELECT f.path, f.value, f.tags, f.updated_at FROM facts f {where} ORDER BY f.path LIMIT ? OFFSET ?",
+            (*args, limit, offset),
+        ).fetchall()
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "items": [{"path": p, "value": v, "tags": t, "updated_at": u} for p, v, t, u in rows],
+    }
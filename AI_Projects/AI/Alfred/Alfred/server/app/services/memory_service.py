@@ -1,32 +1,128 @@
 # app/services/memory_service.py
-import os, json
+"""
+memory.json behind an in-process cache
+- Loaded once; reloaded only when the file's mtime/size changes (hand edits are picked up)
+- remember_item() updates memory and schedules a flush; writes within _FLUSH_DELAY coalesce
+- Flushes are atomic (temp file + os.replace), so a crash never leaves half a JSON file
+- One RLock guards load/update/flush: concurrent requests can't lose each other's updates
+"""
+import atexit
+import copy
+import json
+import os
+import tempfile
+import threading
 from pathlib import Path
 
 APP_DIR = Path(__file__).parent.parent.parent  # Go to server/
 MEM_FILE = APP_DIR / "data" / "memory.json"
 
+_FLUSH_DELAY = 1.0  # seconds to wait for more updates before writing
+
+
+class _MemoryStore:
+    def __init__(self, path: Path, flush_delay: float = _FLUSH_DELAY):
+        self.path = Path(path)
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._data = None
+        self._stamp = None  # (mtime_ns, size) of the file we last read or wrote
+        self._dirty = False
+        self._timer = None
+        self._ready = False
+
+    def ensure_file(self):
+        with self._lock:
+            if self._ready:
+                return
+            self.path.parent.mkdir(exist_ok=True)
+            if not self.path.exists():
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump({}, f, indent=2)
+            self._ready = True
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _current(self) -> dict:
+        """Cached data, reloaded if the file changed on disk (unless we have unsaved updates)."""
+        self.ensure_file()
+        if self._dirty and self._data is not None:
+            return self._data
+        stamp = self._stat()
+        if self._data is None or stamp != self._stamp:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Could not read {self.path.name}: {e}")
+                if self._data is None:
+                    self._data = {}
+            self._stamp = stamp
+        return self._data
+
+    def get_all(self) -> dict:
+        with self._lock:
+            return copy.deepcopy(self._current())
+
+    def get(self, key: str):
+        with self._lock:
+            return copy.deepcopy(self._current().get(key, ""))
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._current()[key] = copy.deepcopy(value)
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".memory-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(self._data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+            self._stamp = self._stat()
+            self._dirty = False
+
+
+_STORE = _MemoryStore(MEM_FILE)
+atexit.register(_STORE.flush)  # don't lose updates still waiting for the timer
+
+
 def ensure_files():
-    MEM_FILE.parent.mkdir(exist_ok=True)
-    if not MEM_FILE.exists():
-        with open(MEM_FILE, "w", encoding="utf-8") as f:
-            json.dump({}, f, indent=2)
+    _STORE.ensure_file()
+
 
 def remember_item(key: str, value):
-    ensure_files()
-    with open(MEM_FILE, "r") as f:
-        data = json.load(f)
-    data[key] = value
-    with open(MEM_FILE, "w") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    _STORE.set(key, value)
     return True
 
+
 def recall_item(key: str):
-    ensure_files()
-    with open(MEM_FILE, "r") as f:
-        data = json.load(f)
-    return data.get(key, "")
+    return _STORE.get(key)
+
 
 def recall_all():
-    ensure_files()
-    with open(MEM_FILE, "r") as f:
-        return json.load(f)
\ No newline at end of file
+    return _STORE.get_all()
+
+
+def flush():
+    """Write pending updates now (app shutdown, tests)."""
+    _STORE.flush()
@@ -0,0 +1,196 @@
+# app/services/memory_vectors.py
+"""
+Embedding lookup for memory facts, so paraphrases ("any shows you'd suggest?") find them too
+- Each fact ("Label: value" from memory_db) is embedded once; vectors are cached on disk in
+  data/memory_vectors.npz keyed by a hash of the text, so only new or edited facts are re-embedded
+- The current facts live in one normalized float32 matrix: a query is a single matrix-vector
+  product + argpartition (well under a millisecond for thousands of facts)
+- relevant_facts() merges the embedding hits with memory_db's FTS hits and falls back to
+  FTS alone when the embedding model is unavailable
+- Re-embedding after a memory change runs in the background; a request searches the
+  vectors it has and never waits for a refresh
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services import memory_db, ollama_service
+
+APP_DIR = Path(__file__).parent.parent.parent  # Go to server/
+VECTORS_FILE = APP_DIR / "data" / "memory_vectors.npz"
+
+_EMBED_MODEL = "nomic-embed-text"
+_DOC_PREFIX = "search_document: "   # nomic-embed-text task prefixes
+_QUERY_PREFIX = "search_query: "
+_TOP_K = 6
+_MIN_SIMILARITY = 0.5       # below this a fact is unrelated to the query
+_QUERY_TIMEOUT = 2.0        # seconds to wait for the query embedding before using FTS only
+_EMBED_BATCH = 64
+_REFRESH_RETRY = 60.0       # seconds before a failed refresh of the same facts is tried again
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(f"{_EMBED_MODEL}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _normalize(vectors) -> np.ndarray:
+    mat = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+class _FactIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._cache: Optional[Dict[str, np.ndarray]] = None  # text hash -> unit vector
+        self._lock = asyncio.Lock()
+        self._version: Optional[str] = None
+        self._failed: tuple = (None, 0.0)  # (memory_db version whose refresh failed, retry after)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.lines: List[str] = []
+
+    def _load(self) -> Dict[str, np.ndarray]:
+        if self._cache is None:
+            self._cache = {}
+            try:
+                with np.load(self.path) as data:
+                    self._cache = dict(zip(data["hashes"].tolist(), data["vectors"]))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[WARN] Could not read {self.path.name}, re-embedding facts: {e}")
+        return self._cache
+
+    def _save(self, keep: List[str]) -> None:
+        """Write the vectors of the current facts (atomically; stale hashes are dropped)."""
+        self.path.parent.mkdir(exist_ok=True)
+        hashes = np.array(keep, dtype=str)
+        vectors = np.stack([self._cache[h] for h in keep]) if keep else np.zeros((0, 0), dtype=np.float32)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".memory_vectors-", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, hashes=hashes, vectors=vectors)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def stale(self) -> bool:
+        """True when memory_db changed since the last refresh (and it isn't backing off after a failure)."""
+        version = memory_db.version()
+        if self._version is not None and self._version == version:
+            return False
+        failed_version, retry_at = self._failed
+        return not (failed_version == version and time.monotonic() < retry_at)
+
+    async def refresh(self, base_url: str) -> int:
+        """Bring the matrix in line with memory_db. Returns how many facts were embedded."""
+        if self._version is not None and self._version == memory_db.version():
+            return 0
+        async with self._lock:
+            version = memory_db.version()
+            if self._version is not None and self._version == version:
+                return 0
+            try:
+                return await self._rebuild(base_url, version)
+            except Exception:
+                self._failed = (version, time.monotonic() + _REFRESH_RETRY)
+                raise
+
+    async def _rebuild(self, base_url: str, version: Optional[str]) -> int:
+        facts = await asyncio.to_thread(memory_db.all_facts)
+        cache = await asyncio.to_thread(self._load)
+        lines = [line for _, line in facts]
+        hashes = [_digest(line) for line in lines]
+        missing = list(dict.fromkeys(h for h in hashes if h not in cache))
+        if missing:
+            text_of = dict(zip(hashes, lines))
+            for i in range(0, len(missing), _EMBED_BATCH):
+                batch = missing[i:i + _EMBED_BATCH]
+                vectors = await ollama_service.embed(
+                    base_url, _EMBED_MODEL, [_DOC_PREFIX + text_of[h] for h in batch]
+                )
+                cache.update(zip(batch, _normalize(vectors)))
+        if missing or len(cache) != len(set(hashes)):
+            await asyncio.to_thread(self._save, list(dict.fromkeys(hashes)))
+            self._cache = {h: cache[h] for h in hashes}
+        self.lines = lines
+        self.matrix = np.stack([cache[h] for h in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+        self._version = version
+        return len(missing)
+
+    def search(self, query_vector: np.ndarray, k: int = _TOP_K, min_similarity: float = _MIN_SIMILARITY) -> List[str]:
+        """Facts with cosine >= min_similarity to the (unit) query vector, best first."""
+        if not self.lines:
+            return []
+        scores = self.matrix @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.lines[i] for i in top if scores[i] >= min_similarity]
+
+
+_INDEX = _FactIndex(VECTORS_FILE)
+
+
+async def refresh(base_url: str) -> int:
+    try:
+        return await _INDEX.refresh(base_url)
+    except Exception as e:
+        print(f"[WARN] Memory fact embedding failed (keyword lookup only): {e or type(e).__name__}")
+        return 0
+
+
+_REFRESHING: set = set()  # strong refs to background refresh tasks
+
+
+def refresh_in_background(base_url: str) -> None:
+    """Re-embed changed facts off the request path (overlapping calls queue on the index lock)."""
+    task = asyncio.create_task(refresh(base_url))
+    _REFRESHING.add(task)
+    task.add_done_callback(_REFRESHING.discard)
+
+
+async def embed_query(query: str, base_url: str) -> Optional[np.ndarray]:
+    """Unit query vector, or None when the embedding model is slow or down (FTS only then)."""
+    if not query.strip():
+        return None
+    try:
+        vector = await asyncio.wait_for(
+            ollama_service.embed(base_url, _EMBED_MODEL, [_QUERY_PREFIX + query]), _QUERY_TIMEOUT
+        )
+        return _normalize(vector)[0]
+    except Exception as e:
+        print(f"[WARN] Memory fact embedding failed (keyword lookup only): {e or type(e).__name__}")
+        return None
+
+
+async def relevant_facts(
+    query: str, base_url: str, limit: int = _TOP_K, query_vector: Optional[np.ndarray] = None
+) -> List[str]:
+    """
+    Embedding matches first, then FTS matches, up to `limit` facts.
+    Pass query_vector (from embed_query) to reuse an embedding the caller already has.
+    """
+    if _INDEX.stale():
+        refresh_in_background(base_url)  # this turn uses the vectors we have
+    keyword = await asyncio.to_thread(memory_db.relevant_facts, query, limit)
+    if not query.strip() or not _INDEX.lines:
+        return keyword
+    if query_vector is None:
+        query_vector = await embed_query(query, base_url)
+    if query_vector is None:
+        return keyword
+    semantic = _INDEX.search(query_vector, limit)
+    return list(dict.fromkeys(semantic + keyword))[:limit]
@@ -0,0 +1,108 @@
+# app/services/model_warmup.py
+"""
+Keeps Alfred's Ollama models loaded
+- start() (from the app lifespan) warms the chat and embedding models in the background
+- Every _PING_SECONDS each model is pinged again, which resets its keep-alive and reloads it
+  if Ollama restarted or evicted it (the embedding model is otherwise idle between KB searches)
+- status() backs GET /health so the UI can say "warming up" instead of hanging; readiness
+  follows the chat model, an embedding model that won't load (KB is optional) only degrades it
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from app.services import ollama_service
+
+_PING_SECONDS = 240     # keep-alive refresh interval once a model is ready
+_RETRY_SECONDS = 10     # retry interval while a model fails to load (Ollama not up yet, ...)
+
+
+class _ModelState:
+    def __init__(self, embedding: bool):
+        self.embedding = embedding
+        self.state = "pending"      # pending -> loading -> ready | error
+        self.error = ""
+        self.load_seconds: Optional[float] = None
+        self.last_ok: Optional[float] = None
+
+
+class ModelKeeper:
+    def __init__(self):
+        self._models: Dict[str, _ModelState] = {}
+        self._tasks: list = []
+
+    def start(self, base_url: str, models: Dict[str, bool], ping_seconds: float = _PING_SECONDS) -> None:
+        """
+        models: {name: is_embedding_model}. One background task per model.
+        Called once per backend; models on later backends are listed as "name@url".
+        """
+        for name, embedding in models.items():
+            key = f"{name}@{base_url}" if name in self._models else name
+            st = self._models[key] = _ModelState(embedding)
+            self._tasks.append(asyncio.create_task(self._keep(base_url, name, st, ping_seconds)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._models.clear()
+
+    async def _keep(self, base_url: str, name: str, st: _ModelState, ping_seconds: float) -> None:
+        while True:
+            if st.state != "ready":
+                st.state = "loading"
+            t0 = time.monotonic()
+            try:
+                await ollama_service.load(base_url, name, embedding=st.embedding)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if st.state != "error":
+                    print(f"[WARN] Could not load {name}: {e or type(e).__name__} (retrying every {_RETRY_SECONDS}s)")
+                st.state, st.error = "error", str(e) or type(e).__name__
+                await asyncio.sleep(_RETRY_SECONDS)
+                continue
+            if st.state != "ready":
+                st.load_seconds = round(time.monotonic() - t0, 2)
+                print(f"[INFO] {name} ready in {st.load_seconds}s")
+            st.state, st.error, st.last_ok = "ready", "", time.time()
+            await asyncio.sleep(ping_seconds)
+
+    def status(self) -> Dict:
+        models = {
+            name: {
+                "state": st.state,
+                "embedding": st.embedding,
+                "load_seconds": st.load_seconds,
+                "last_ok_s_ago": round(time.time() - st.last_ok) if st.last_ok else None,
+                **({"error": st.error} if st.error else {}),
+            }
+            for name, st in self._models.items()
+        }
+        chat = [m for m in models.values() if not m["embedding"]]
+        if any(m["state"] == "ready" for m in chat):
+            status = "ready" if all(m["state"] == "ready" for m in models.values()) else "degraded"
+        elif any(m["state"] == "error" for m in chat):
+            status = "error"
+        else:
+            status = "warming"
+        return {"status": status, "models": models}
+
+
+_KEEPER = ModelKeeper()
+
+
+def start(base_url: str, models: Dict[str, bool], ping_seconds: float = _PING_SECONDS) -> None:
+    _KEEPER.start(base_url, models, ping_seconds)
+
+
+async def stop() -> None:
+    await _KEEPER.stop()
+
+
+def status() -> Dict:
+    return _KEEPER.status()
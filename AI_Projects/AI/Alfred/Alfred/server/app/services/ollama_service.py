@@ -0,0 +1,93 @@
+# app/services/ollama_service.py
+"""
+Async Ollama client on the shared aiohttp pool (never blocks the event loop)
+- stream_chat(...) yields content chunks as Ollama produces them
+- Backpressure: the next line is read only after the consumer took the previous chunk
+- Leaving the generator early (client disconnect, task cancellation) closes the HTTP
+  connection, so Ollama stops generating and frees the model slot
+- Pass a dict as `stats` to receive the final timing/token counts (prompt_eval_count, ...)
+- embed(...) returns embedding vectors from /api/embed on the same session
+- load(...) loads a chat or embedding model (or refreshes its keep-alive) without a real request
+"""
+
+from __future__ import annotations
+
+import json
+from typing import AsyncGenerator, Dict, List, Optional
+
+import aiohttp
+
+from app.services import http_pool
+
+_STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=120)
+_EMBED_TIMEOUT = aiohttp.ClientTimeout(total=10)
+_LOAD_TIMEOUT = aiohttp.ClientTimeout(total=300, sock_connect=10)  # cold loads from disk can be slow
+_KEEP_ALIVE = "24h"
+_STATS_FIELDS = (
+    "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration",
+    "load_duration", "total_duration",
+)
+
+
+async def stream_chat(
+    base_url: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    options: Optional[Dict] = None,
+    keep_alive: str = _KEEP_ALIVE,
+    stats: Optional[Dict] = None,
+) -> AsyncGenerator[str, None]:
+    """Stream assistant tokens from Ollama's /api/chat."""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+        "keep_alive": keep_alive,
+        "options": options or {},
+    }
+    resp = await http_pool.get_session().post(f"{base_url}/api/chat", json=payload, timeout=_STREAM_TIMEOUT)
+    finished = False
+    try:
+        resp.raise_for_status()
+        async for line in resp.content:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise RuntimeError(data["error"])
+            if chunk := data.get("message", {}).get("content"):
+                yield chunk
+            if data.get("done"):
+                if stats is not None:
+                    stats.update({k: data[k] for k in _STATS_FIELDS if k in data})
+                finished = True
+                break
+    finally:
+        if finished:
+            resp.release()
+        else:
+            resp.close()  # abort: drop the connection so Ollama stops generating
+
+
+async def embed(base_url: str, model: str, texts: List[str], keep_alive: str = _KEEP_ALIVE) -> List[List[float]]:
+    """One embedding vector per input text from Ollama's /api/embed."""
+    payload = {"model": model, "input": texts, "keep_alive": keep_alive}
+    async with http_pool.get_session().post(f"{base_url}/api/embed", json=payload, timeout=_EMBED_TIMEOUT) as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+    return data["embeddings"]
+
+
+async def load(base_url: str, model: str, keep_alive: str = _KEEP_ALIVE, embedding: bool = False) -> None:
+    """
+    Load `model` into memory, or just reset its keep-alive if it is already loaded.
+    Chat models get an empty prompt (nothing is generated); embedding models embed a word.
+    """
+    if embedding:
+        url, payload = f"{base_url}/api/embed", {"model": model, "input": ["warm up"], "keep_alive": keep_alive}
+    else:
+        url, payload = f"{base_url}/api/generate", {"model": model, "keep_alive": keep_alive}
+    async with http_pool.get_session().post(url, json=payload, timeout=_LOAD_TIMEOUT) as resp:
+        resp.raise_for_status()
+        await resp.read()
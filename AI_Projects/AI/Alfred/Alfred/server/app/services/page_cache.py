@@ -0,0 +1,187 @@
+# app/services/page_cache.py
+"""
+Persistent page cache for search_service.fetch_url
+- SQLite file keyed by sha1(normalized URL) (content-addressed, survives restarts)
+- Stores cleaned text + title + HTTP validators (ETag / Last-Modified)
+- Repeat fetches send conditional requests; a 304 reuses the stored text (no re-parse)
+- Entries are fresh (served without any request) for Cache-Control max-age; pages without
+  validators are kept for a short _NO_VALIDATOR_MAX_AGE since they can't be revalidated
+- Hits are fresh returns and 304s; a row that came back with a new body is a miss
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+APP_DIR = Path(__file__).parent.parent.parent  # Go to server/
+CACHE_FILE = APP_DIR / "data" / "page_cache.sqlite3"
+
+_MAX_ENTRIES = 2000            # oldest entries are pruned beyond this
+_NO_VALIDATOR_MAX_AGE = 600    # seconds to reuse a page that has no ETag / Last-Modified
+_MAX_FRESH = 86400             # cap on a server-supplied max-age
+_MAX_AGE = re.compile(r"(?:^|,)\s*(?:s-)?max-age\s*=\s*(\d+)", re.I)
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref_src")
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0}
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme/host, drop fragment, default ports and tracking params, sort query."""
+    p = urlparse((url or "").strip())
+    scheme = (p.scheme or "http").lower()
+    host = (p.hostname or "").lower()
+    port = p.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = [
+        (k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
+        if not k.lower().startswith(_TRACKING_PARAMS)
+    ]
+    query.sort()
+    return urlunparse((scheme, host, p.path or "/", "", urlencode(query), ""))
+
+
+def _key(url: str) -> str:
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        CACHE_FILE.parent.mkdir(exist_ok=True)
+        _conn = sqlite3.connect(str(CACHE_FILE), check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " key TEXT PRIMARY KEY, url TEXT, title TEXT, text TEXT,"
+            " etag TEXT, last_modified TEXT, fetched_at REAL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched ON pages(fetched_at)")
+        columns = {row[1] for row in _conn.execute("PRAGMA table_info(pages)")}
+        if "fresh_until" not in columns:  # caches created before max-age support
+            _conn.execute("ALTER TABLE pages ADD COLUMN fresh_until REAL DEFAULT 0")
+        _conn.commit()
+    return _conn
+
+
+def max_age(cache_control: str) -> Optional[int]:
+    """Seconds a response may be reused per its Cache-Control header; 0 for no-store/no-cache, None if unset."""
+    cc = (cache_control or "").lower()
+    if "no-store" in cc or "no-cache" in cc:
+        return 0
+    m = _MAX_AGE.search(cc)
+    return min(int(m.group(1)), _MAX_FRESH) if m else None
+
+
+def get(url: str) -> Optional[Dict]:
+    """
+    Return the cached entry for url (or None). entry["fresh"] means it can be used as is
+    (counted as a hit); otherwise it must be revalidated and touch()/put() record the outcome.
+    Expired entries without validators are treated as misses.
+    """
+    now = time.time()
+    try:
+        with _lock:
+            row = _db().execute(
+                "SELECT url, title, text, etag, last_modified, fetched_at, fresh_until FROM pages WHERE key = ?",
+                (_key(url),),
+            ).fetchone()
+            fresh = bool(row) and (row[6] or 0) > now
+            if row and not fresh and not (row[3] or row[4]):
+                row = None
+            if fresh:
+                _stats["hits"] += 1
+            elif not row:
+                _stats["misses"] += 1
+    except sqlite3.Error as e:
+        print(f"[WARN] Page cache read failed: {e}")
+        return None
+    if not row:
+        return None
+    return {
+        "url": row[0], "title": row[1], "text": row[2],
+        "etag": row[3], "last_modified": row[4], "fetched_at": row[5], "fresh": fresh,
+    }
+
+
+def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+    """If-None-Match / If-Modified-Since headers for a cached entry."""
+    headers: Dict[str, str] = {}
+    if not entry:
+        return headers
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def put(url: str, title: str, text: str, etag: str = "", last_modified: str = "",
+        fresh_for: Optional[int] = None, conditional: bool = False) -> None:
+    """
+    Store (or replace) a cleaned page. fresh_for is the response's max-age (see max_age());
+    pages without validators get _NO_VALIDATOR_MAX_AGE when the server didn't say.
+    conditional=True means a revalidation came back with a new body (counted as a miss).
+    """
+    if conditional:
+        with _lock:
+            _stats["misses"] += 1
+    if fresh_for is None:
+        fresh_for = 0 if (etag or last_modified) else _NO_VALIDATOR_MAX_AGE
+    if not text or not (etag or last_modified or fresh_for):
+        return
+    now = time.time()
+    try:
+        with _lock:
+            db = _db()
+            db.execute(
+                "INSERT OR REPLACE INTO pages (key, url, title, text, etag, last_modified, fetched_at, fresh_until)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (_key(url), normalize_url(url), title, text, etag or "", last_modified or "", now, now + fresh_for),
+            )
+            _stats["stores"] += 1
+            if _stats["stores"] % 100 == 0:
+                db.execute(
+                    "DELETE FROM pages WHERE key NOT IN"
+                    " (SELECT key FROM pages ORDER BY fetched_at DESC LIMIT ?)",
+                    (_MAX_ENTRIES,),
+                )
+            db.commit()
+    except sqlite3.Error as e:
+        print(f"[WARN] Page cache write failed: {e}")
+
+
+def touch(url: str, fresh_for: Optional[int] = None) -> None:
+    """Mark a cached entry as revalidated (server answered 304). Counts a hit."""
+    now = time.time()
+    try:
+        with _lock:
+            db = _db()
+            db.execute("UPDATE pages SET fetched_at = ?, fresh_until = ? WHERE key = ?",
+                       (now, now + (fresh_for or 0), _key(url)))
+            db.commit()
+            _stats["revalidated"] += 1
+            _stats["hits"] += 1
+    except sqlite3.Error as e:
+        print(f"[WARN] Page cache update failed: {e}")
+
+
+def stats() -> Dict[str, int]:
+    """Hit/miss/revalidation counters since process start, plus current entry count."""
+    out = dict(_stats)
+    try:
+        with _lock:
+            out["entries"] = _db().execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+    except sqlite3.Error:
+        out["entries"] = 0
+    return out
@@ -0,0 +1,129 @@
+# app/services/passage_ranker.py
+"""
+Query-aware excerpts for LLM context (replaces "first 200 characters of the page")
+- Splits page text into sentence windows
+- Scores windows with BM25 against the query, vectorized with NumPy
+- Greedily keeps the best non-overlapping windows within a token budget, in page order
+"""
+
+from __future__ import annotations
+
+import re
+from typing import List
+
+import numpy as np
+
+_WINDOW = 2                    # sentences per passage
+_MAX_SENTENCE_CHARS = 300      # longer "sentences" (menus, tables) are cut into pieces
+_PAGE_TOKEN_BUDGET = 80        # default excerpt size per source (~320 chars)
+_CHARS_PER_TOKEN = 4           # rough chars/token for budget math
+_MIN_RELATIVE_SCORE = 0.4      # skip windows scoring below this fraction of the best one
+_K1 = 1.2
+_B = 0.75
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it me my of on or the to "
+    "was what when where which who why with you your about can do does tell".split()
+)
+
+
+def approx_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def _sentences(text: str) -> List[str]:
+    out: List[str] = []
+    for s in _SENTENCE_SPLIT.split(text or ""):
+        s = s.strip()
+        while len(s) > _MAX_SENTENCE_CHARS:
+            cut = s.rfind(" ", 0, _MAX_SENTENCE_CHARS)
+            cut = cut if cut > 0 else _MAX_SENTENCE_CHARS
+            out.append(s[:cut])
+            s = s[cut:].strip()
+        if s:
+            out.append(s)
+    return out
+
+
+def _query_terms(query: str) -> List[str]:
+    seen = []
+    for t in _TOKEN.findall((query or "").lower()):
+        if t not in _STOPWORDS and t not in seen:
+            seen.append(t)
+    return seen
+
+
+def _prefix(sentences: List[str], budget_chars: int) -> str:
+    out, size = [], 0
+    for s in sentences:
+        if size + len(s) > budget_chars and out:
+            break
+        out.append(s[:budget_chars])
+        size += len(s) + 1
+    return " ".join(out)
+
+
+def select_passages(query: str, text: str, budget_tokens: int = _PAGE_TOKEN_BUDGET) -> str:
+    """
+    Best-matching passages of `text` for `query`, joined with " ... ", at most ~budget_tokens.
+    Falls back to the start of the text when nothing in it matches the query.
+    """
+    sentences = _sentences(text)
+    if not sentences:
+        return ""
+    budget_chars = budget_tokens * _CHARS_PER_TOKEN
+    terms = _query_terms(query)
+    if not terms:
+        return _prefix(sentences, budget_chars)
+
+    # term counts per sentence -> per window via cumulative sums (one pass over the text)
+    col = {t: j for j, t in enumerate(terms)}
+    tf_sent = np.zeros((len(sentences), len(terms)), dtype=np.float32)
+    len_sent = np.zeros(len(sentences), dtype=np.float32)
+    for i, s in enumerate(sentences):
+        toks = _TOKEN.findall(s.lower())
+        len_sent[i] = len(toks)
+        for t in toks:
+            j = col.get(t)
+            if j is not None:
+                tf_sent[i, j] += 1
+
+    w = min(_WINDOW, len(sentences))
+    cs_tf = np.vstack([np.zeros((1, len(terms)), dtype=np.float32), np.cumsum(tf_sent, axis=0)])
+    cs_len = np.concatenate([[0.0], np.cumsum(len_sent)])
+    tf = cs_tf[w:] - cs_tf[:-w]                   # [windows, terms]
+    doc_len = cs_len[w:] - cs_len[:-w]            # [windows]
+
+    n = tf.shape[0]
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5))
+    norm = _K1 * (1 - _B + _B * doc_len / max(float(doc_len.mean()), 1.0))
+    scores = (idf * tf * (_K1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+    if not scores.any():
+        return _prefix(sentences, budget_chars)
+
+    # greedy pick of non-overlapping windows within budget
+    floor = float(scores.max()) * _MIN_RELATIVE_SCORE
+    taken = np.zeros(len(sentences), dtype=bool)
+    picked: List[int] = []
+    used = 0
+    for i in np.argsort(-scores, kind="stable"):
+        if scores[i] <= 0 or scores[i] < floor:
+            break
+        if taken[i:i + w].any():
+            continue
+        size = sum(len(s) + 1 for s in sentences[i:i + w])
+        if used + size > budget_chars:
+            if picked:
+                continue
+            picked.append(int(i))  # always return something: the best window, trimmed below
+            break
+        taken[i:i + w] = True
+        picked.append(int(i))
+        used += size
+
+    passages = [" ".join(sentences[i:i + w]) for i in sorted(picked)]
+    return " ... ".join(passages)[:budget_chars]
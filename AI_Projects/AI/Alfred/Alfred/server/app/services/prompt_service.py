@@ -0,0 +1,76 @@
+# app/services/prompt_service.py
+"""
+Prompt assembly that keeps the front of the prompt byte-identical across turns,
+so Ollama can reuse its KV cache instead of re-evaluating the whole conversation
+- Stable prefix: system prompt (depends only on mode/quiz), history summary, recent turns
+- Which turns fit is decided by history_service (token budget, window moves in steps)
+- Volatile content (date/time, memory facts, web/API context) goes into the final user message
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from app.services import history_service
+
+_IDENTITY_RULES = (
+    "CRITICAL RULES - NEVER BREAK THESE:\n"
+    "1. You are Alfred, an AI chatbot. NOT a butler. NEVER say 'sir', 'madam', 'master', 'household', or 'mansion'.\n"
+    "2. NEVER invent fictional people or scenarios. If you don't know someone, say 'I don't know who that is.'\n"
+    "3. NEVER mention 'knowledge cutoff', 'training data', 'limitations', or 'as of my last update'. If asked what you can do, just list features.\n"
+    "4. NEVER say 'you repeated yourself' or accuse user of repeating. Each message is fresh.\n"
+    "5. Stay calm. No exclamation marks. Minimal apologies.\n"
+)
+
+
+def system_prompt(mode: str, is_quiz: bool) -> str:
+    """The per-mode system prompt. Contains nothing that changes between turns."""
+    # Mode-specific citation rules
+    if mode == "study":
+        rules = _IDENTITY_RULES + "6. Cite sources as [1], [2] ONLY if directly relevant. Never invent citations.\n"
+    else:
+        rules = _IDENTITY_RULES + "6. NEVER use citations like [1], [2]. Just answer naturally.\n"
+
+    if is_quiz:
+        return rules + "\nQUIZ MODE: Ask ONE short question, end with '?' and STOP. When user answers: say 'Correct.' or 'Not quite, it's [answer].' then ask the next question. NEVER say 'you repeated yourself' or 'stuck in a loop' - each answer is unique. No citations."
+    if mode == "study":
+        # Study mode: concise explanations, cite only when relevant
+        return rules + "\nYou are Alfred in Study Mode. HARD LIMIT: 3-5 sentences. Stop after 5 sentences even if incomplete. Cite [1], [2] only if source directly answers - otherwise no citations."
+    # Friendly mode: short, no citations ever
+    return rules + "\nYou are Alfred. 2-3 sentences max. NEVER use [1], [2] or any citations. No formatting. Just answer like a friend."
+
+
+def turn_message(
+    user_text: str,
+    current_dt: str,
+    facts: Optional[List[str]] = None,
+    context: str = "",
+) -> Dict[str, str]:
+    """The final user message: this turn's question plus everything that changes per turn."""
+    parts = [f"Current date/time: {current_dt}"]
+    if facts:
+        parts.append("FACTS (reference, do NOT hallucinate): " + " | ".join(facts))
+    if context:
+        parts.append(f"Web sources:\n{context}")
+    parts.append(f"User: {user_text}")
+    if context:
+        parts.append("Cite with [1], [2] only if directly relevant.")
+    return {"role": "user", "content": "\n\n".join(parts)}
+
+
+def build_messages(
+    system: str,
+    recent: List[Dict],
+    turn: Dict[str, str],
+    summary: str = "",
+) -> List[Dict[str, str]]:
+    """
+    [system] + [summary of older turns] + recent turns + this turn's message.
+    `recent` holds earlier turns exactly as the client sent them, so they match the last prompt.
+    """
+    messages = [{"role": "system", "content": system}]
+    if summary:
+        messages.append(history_service.summary_message(summary))
+    messages += recent
+    messages.append(turn)
+    return messages
@@ -0,0 +1,187 @@
+# app/services/response_cache.py
+"""
+Opt-in cache of finished answers for repeated prompts ("what's the weather", "what is a mitochondrion")
+- Key: normalized query + mode + the memory facts used + freshness class (classify_query)
+  + internet toggle + the user's location
+- TTL follows freshness: live-data questions expire in minutes, plain chat in hours
+- Exact match first, then nearest neighbour by embedding (cosine >= threshold) within
+  entries that share the bucket; a near-duplicate must also name the same entities and
+  numbers ("weather in Paris" never answers "weather in London")
+- The query embedding is memory_vectors.embed_query(): chat computes it once for fact lookup
+  and the cache together
+- Follow-ups ("yes", "tell me more about that"), greetings and time/date questions depend on
+  the conversation or the clock and are never cached
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services import memory_vectors
+
+_TTL = {"requires_web": 120, "suggests_web": 900, "no_web": 6 * 3600}  # seconds per freshness class
+_MAX_ENTRIES = 500
+_SIMILARITY = 0.92          # cosine threshold for a near-duplicate query
+
+_NORMALIZE = re.compile(r"[^a-z0-9 ]+")
+_FILLER = re.compile(r"^(?:hey |hi |ok |okay )?(?:alfred[, ]*)?")
+_FOLLOW_UP = re.compile(
+    r"\b(yes|yeah|yep|no|nope|more|that|this|it|he|she|they|them|those|these|again|continue|why)\b"
+)
+_CLOCK = re.compile(
+    r"^(?:good (?:morning|afternoon|evening|night)|morning|hello|hi|hey|howdy|yo|gm)\b"
+    r"|\b(?:what time|time is it|the time|what day|which day|the date|todays date|what year|what month"
+    r"|day of the week|how long until|how many days)\b"
+)
+_NUMBER = re.compile(r"\d+(?:[.,:]\d+)*")
+_AFTER_PREPOSITION = re.compile(r"\b(?:in|at|near|for|of|from|to|about|on|vs|versus) (?:the |a |an )?(\w+)")
+_NOT_ENTITIES = {"i", "alfred"}
+
+
+def normalize(query: str) -> str:
+    q = " ".join(_NORMALIZE.sub(" ", (query or "").lower().replace("'", "")).split())
+    return _FILLER.sub("", q).strip()
+
+
+def cacheable(query: str, history: List[Dict], is_quiz: bool, has_links: bool) -> bool:
+    """Only standalone questions: no quiz, no pasted links, no follow-up mid-conversation."""
+    q = normalize(query)
+    if is_quiz or has_links or not q or _CLOCK.search(q):
+        return False
+    earlier = [m for m in history if m.get("content") != query]
+    return not (earlier and _FOLLOW_UP.search(q))
+
+
+def entities(query: str) -> frozenset:
+    """Numbers, proper nouns and the word after a preposition ("weather in paris")."""
+    raw = (query or "").replace("'", "")
+    found = set(_NUMBER.findall(raw))
+    words = raw.split()
+    found |= {
+        w.strip(".,!?;:\"()").lower() for prev, w in zip(words, words[1:])
+        if w[:1].isupper() and not prev.endswith((".", "!", "?"))
+    }
+    found |= set(_AFTER_PREPOSITION.findall(normalize(query)))
+    return frozenset(found - _NOT_ENTITIES - {""})
+
+
+class CacheKey:
+    def __init__(
+        self, query: str, mode: str, facts: List[str], query_type: str,
+        allow_internet: bool = False, location: str = "",
+    ):
+        self.query = query
+        self.text = normalize(query)
+        self.entities = entities(query)
+        facts_hash = hashlib.sha1("\n".join(sorted(facts)).encode("utf-8")).hexdigest()[:12]
+        self.bucket: Tuple = (mode, facts_hash, query_type, bool(allow_internet), normalize(location))
+        self.ttl = _TTL.get(query_type, _TTL["suggests_web"])
+        self.vector: Optional[np.ndarray] = None  # shared memory-fact query vector, or filled by lookup()
+
+
+class Hit:
+    def __init__(self, answer: str, sources: List[Dict], kind: str, similarity: float = 1.0):
+        self.answer = answer
+        self.sources = sources
+        self.kind = kind  # "exact" or "similar"
+        self.similarity = similarity
+
+
+class _Entry:
+    def __init__(self, key: CacheKey, answer: str, sources: List[Dict]):
+        self.bucket = key.bucket
+        self.text = key.text
+        self.entities = key.entities
+        self.vector = key.vector
+        self.answer = answer
+        self.sources = sources
+        self.expires = time.monotonic() + key.ttl
+
+
+class _ResponseCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self.hits = {"exact": 0, "similar": 0}
+        self.misses = 0
+
+    def exact(self, key: CacheKey) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get((key.bucket, key.text))
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                del self._entries[(key.bucket, key.text)]
+                return None
+            self._entries.move_to_end((key.bucket, key.text))
+            return entry
+
+    def nearest(self, key: CacheKey) -> Tuple[Optional[_Entry], float]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                e for e in self._entries.values()
+                if e.bucket == key.bucket and e.entities == key.entities
+                and e.vector is not None and e.expires > now
+            ]
+        if not candidates or key.vector is None:
+            return None, 0.0
+        scores = np.stack([e.vector for e in candidates]) @ key.vector
+        best = int(np.argmax(scores))
+        return candidates[best], float(scores[best])
+
+    def put(self, key: CacheKey, answer: str, sources: List[Dict]) -> None:
+        with self._lock:
+            self._entries[(key.bucket, key.text)] = _Entry(key, answer, sources)
+            self._entries.move_to_end((key.bucket, key.text))
+            while len(self._entries) > _MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def record(self, kind: Optional[str]) -> None:
+        """Count a lookup: "exact" / "similar" hit, None for a miss."""
+        with self._lock:
+            if kind is None:
+                self.misses += 1
+            else:
+                self.hits[kind] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": dict(self.hits), "misses": self.misses}
+
+
+_CACHE = _ResponseCache()
+
+
+async def lookup(key: CacheKey, base_url: Optional[str]) -> Optional[Hit]:
+    """
+    Exact match, then nearest neighbour. The query is embedded here unless key.vector is
+    already set; base_url=None means "don't embed" (exact matches only without a vector).
+    """
+    entry = _CACHE.exact(key)
+    if entry is not None:
+        _CACHE.record("exact")
+        return Hit(entry.answer, entry.sources, "exact")
+    if key.vector is None and base_url is not None:
+        key.vector = await memory_vectors.embed_query(key.query, base_url)  # same vectors as fact lookup
+    entry, score = _CACHE.nearest(key)
+    if entry is not None and score >= _SIMILARITY:
+        _CACHE.record("similar")
+        return Hit(entry.answer, entry.sources, "similar", score)
+    _CACHE.record(None)
+    return None
+
+
+def store(key: CacheKey, answer: str, sources: List[Dict]) -> None:
+    _CACHE.put(key, answer, sources)
+
+
+def stats() -> Dict:
+    return _CACHE.stats()
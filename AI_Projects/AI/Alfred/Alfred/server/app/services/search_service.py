@@ -1,19 +1,37 @@
 # server/search.py - minimal, generic web search + cleaner + JS fallback
 # - No API keys required (DuckDuckGo via duckduckgo-search)
-# - requests first; fallback to Playwright only if needed (Cloudflare/JS-heavy)
+# - requests first; fallback to Playwright only if needed (Cloudflare/JS-heavy), on a warm browser pool
 # - Lowercases & condenses text, caps per-page length, returns top 5 sources
+# - rag_search_async(...) runs the same pipeline on a shared, pooled aiohttp session
 # - Optional rag_search_stream(...) yields docs one-by-one for server-side streaming
+# - DDG results are cached (TTL + LRU) and identical concurrent queries share one call
+# - Bodies are streamed with a byte ceiling; binaries (PDF, images...) are rejected early
+# - Per-host circuit breaker + adaptive timeouts (host_health); JS-only hosts skip the plain fetch
+# - Cleaned pages are cached on disk (page_cache): reused within max-age, then revalidated with ETag/Last-Modified
+# - DDG lookups and page fetches show up as spans in the request trace (tracing)
 
 from __future__ import annotations
 
+import asyncio
+import codecs
+import concurrent.futures
+import contextvars
+import os
 import re
-from typing import List, Dict, Generator, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, List, Dict, Generator, Optional, Tuple
 from urllib.parse import urlparse
 import ipaddress
 
+import aiohttp
 import requests
 from ddgs import DDGS
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+from app.services import browser_pool, host_health, http_pool, page_cache, tracing
 
 # --- minimal query cleaner ---
 _URL_IN_TEXT = re.compile(r"https?://\S+", re.I)
@@ -65,9 +83,21 @@ def is_safe_url(url: str) -> bool:
 _CLOUDFLARE_HINT = re.compile(r"(just a moment|cloudflare|checking your browser)", re.I)
 _MIN_BODY_CHARS = 800          # if below this after requests, try JS render
 _MAX_PER_PAGE_CHARS = 6000     # cap raw text per page to avoid big prompts
-_TIMEOUT = (7, 20)             # requests (connect, read) timeouts
+_TIMEOUT = (7, 20)             # requests (connect, read) timeouts; ceiling for host_health's adaptive ones
+_RENDER_TIMEOUT = 45           # seconds; JS render incl. waiting for a free browser context
 _MAX_RESULTS = 10              # initial DDG fetch cap before trimming to top-5
 _TOP_K = 5                     # final max number of URLs to fetch
+_SEARCH_TTL = 900             # seconds to reuse DDG results for evergreen queries
+_SEARCH_TTL_FRESH = 120        # ...and for "fresh" queries (today/latest/breaking...)
+_SEARCH_CACHE_SIZE = 256       # LRU bound on cached DDG queries
+_SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "0") == "1"  # race primary + fallback DDG queries
+_STREAM_DEADLINE = 12.0        # seconds; rag_search_stream drops pages still pending after this
+_MAX_FETCH_BYTES = int(os.getenv("FETCH_MAX_BYTES", "1500000"))  # stop reading a body after this many bytes
+_CHUNK_BYTES = 16384           # streamed read size
+_TEXT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "text/xml", "application/xml")
+_BINARY_MAGIC = (b"%PDF", b"PK\x03\x04", b"\x89PNG", b"GIF8", b"\xff\xd8\xff", b"\x1f\x8b",
+                 b"RIFF", b"ID3", b"OggS", b"\x00\x00\x01\x00", b"{\\rtf")
+_UTF8_PARSER = lxml.html.HTMLParser(encoding="utf-8")
 _HEADERS = {
     "user-agent": (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -78,10 +108,175 @@ _HEADERS = {
 
 # ---------- Search ----------
 
-def web_search(query: str, max_results: int = _MAX_RESULTS) -> List[Dict]:
+_FRESH_WORDS = ("today", "latest", "breaking", "hurricane", "storm", "showtimes", "release")
+
+def _is_fresh(qtext: str) -> bool:
+    return any(k in (qtext or "").lower() for k in _FRESH_WORDS)
+
+
+class _SearchCache:
+    """
+    Thread-safe TTL + LRU cache with single-flight loading:
+    concurrent callers asking for the same key share one upstream call.
     """
-    DuckDuckGo text search (no API key).
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()   # key -> (expires_at, value)
+        self._inflight: Dict[tuple, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+
+    def get_or_load(self, key: tuple, ttl: float, loader) -> List[Dict]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._data.pop(key, None)
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = concurrent.futures.Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if value:  # empty result sets are often rate limits; don't pin them
+                self._data[key] = (time.monotonic() + ttl, value)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "coalesced": self.coalesced, "entries": len(self._data)}
+
+
+_SEARCH_CACHE = _SearchCache(_SEARCH_CACHE_SIZE)
+
+def search_cache_stats() -> Dict[str, int]:
+    return _SEARCH_CACHE.stats()
+
+
+def _ddg_text_uncached(qtext: str, n: int, timelimit: Optional[str]) -> List[Dict]:
+    out: List[Dict] = []
+    with DDGS() as ddgs:
+        # region/safesearch params are intentionally neutral; timelimit=None for breadth
+        for r in ddgs.text(qtext, max_results=n, region="wt-wt", safesearch="Off", timelimit=timelimit):
+            out.append({
+                "title": (r.get("title") or "").strip(),
+                "url": (r.get("href") or "").strip(),
+                "snippet": (r.get("body") or "").strip(),
+            })
+    # de-dupe on host+path
+    seen = set()
+    uniq: List[Dict] = []
+    for x in out:
+        u = x.get("url") or ""
+        if not u:
+            continue
+        parsed = urlparse(u)
+        key = (parsed.netloc, parsed.path)
+        if key not in seen:
+            seen.add(key)
+            uniq.append(x)
+    return uniq
+
+def _ddg_text(qtext: str, n: int) -> List[Dict]:
+    """Cached + coalesced DDG lookup; "fresh" queries get a shorter TTL."""
+    fresh = _is_fresh(qtext)
+    timelimit = "d" if fresh else None
+    ttl = _SEARCH_TTL_FRESH if fresh else _SEARCH_TTL
+    results = _SEARCH_CACHE.get_or_load(
+        (qtext, timelimit, n), ttl, lambda: _ddg_text_uncached(qtext, n, timelimit)
+    )
+    return [dict(r) for r in results]
+
+# speculative mode: primary query and its fallback variant race on this pool
+_VARIANT_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="ddg")
+_variant_lock = threading.Lock()
+_variant_stats: Dict[str, Dict] = {
+    name: {"calls": 0, "wins": 0, "empty": 0, "errors": 0, "total_ms": 0.0}
+    for name in ("primary", "fallback")
+}
+
+def _timed_ddg(variant: str, qtext: str, n: int) -> List[Dict]:
+    """_ddg_text with per-variant latency bookkeeping; each call is a span in the request trace."""
+    t0 = time.monotonic()
+    results: List[Dict] = []
+    failed = False
+    with tracing.span("ddg_variant", variant=variant) as attrs:
+        try:
+            results = _ddg_text(qtext, n)
+            return results
+        except Exception:
+            failed = True
+            raise
+        finally:
+            attrs["results"] = len(results)
+            ms = (time.monotonic() - t0) * 1000
+            with _variant_lock:
+                st = _variant_stats[variant]
+                st["calls"] += 1
+                st["total_ms"] += ms
+                if failed:
+                    st["errors"] += 1
+                elif not results:
+                    st["empty"] += 1
+
+def _speculative_search(q: str, alt_q: str, n: int) -> List[Dict]:
+    """Fire primary + fallback variant together; first non-empty result set wins."""
+    # each worker runs in a copy of the caller's context so its span lands in the request trace
+    futures = {
+        _VARIANT_POOL.submit(contextvars.copy_context().run, _timed_ddg, "primary", q, n): "primary",
+        _VARIANT_POOL.submit(contextvars.copy_context().run, _timed_ddg, "fallback", alt_q, n): "fallback",
+    }
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results = future.result()
+            except Exception:
+                continue
+            if results:
+                with _variant_lock:
+                    _variant_stats[futures[future]]["wins"] += 1
+                return results
+        return []
+    finally:
+        # the loser can't be interrupted mid-request, but its result still warms the cache
+        for future in futures:
+            future.cancel()
+
+def search_variant_stats() -> Dict[str, Dict]:
+    """Per-variant calls / wins / empty / errors and average latency (speculative mode)."""
+    with _variant_lock:
+        return {
+            name: {**{k: v for k, v in st.items() if k != "total_ms"},
+                   "avg_ms": round(st["total_ms"] / st["calls"], 1) if st["calls"] else 0.0}
+            for name, st in _variant_stats.items()
+        }
+
+def web_search(query: str, max_results: int = _MAX_RESULTS, speculative: Optional[bool] = None) -> List[Dict]:
+    """
+    DuckDuckGo text search (no API key), cached per prepared query + timelimit.
     Small robustness: retry with very light variation if the first call returns nothing.
+    With speculative=True (default: SPECULATIVE_SEARCH env), the variation is fired
+    alongside the primary query instead of after it.
     Returns a de-duplicated list of {title,url,snippet}.
     """
     q = _prep_query(query)
@@ -102,165 +297,347 @@ def web_search(query: str, max_results: int = _MAX_RESULTS) -> List[Dict]:
     elif "github" in q_lower or ("repository" in q_lower or "repo" in q_lower):
         q += " site:github.com"
 
-    def _ddg_text(qtext: str, n: int) -> List[Dict]:
-        out: List[Dict] = []
-        with DDGS() as ddgs:
-            # region/safesearch params are intentionally neutral; timelimit=None for breadth
-            fresh = any(k in (qtext or "").lower() for k in ("today","latest","breaking","hurricane","storm","showtimes","release"))
-            for r in ddgs.text(qtext, max_results=n, region="wt-wt", safesearch="Off", timelimit=("d" if fresh else None)):
-                out.append({
-                    "title": (r.get("title") or "").strip(),
-                    "url": (r.get("href") or "").strip(),
-                    "snippet": (r.get("body") or "").strip(),
-                })
-        # de-dupe on host+path
-        seen = set()
-        uniq: List[Dict] = []
-        for x in out:
-            u = x.get("url") or ""
-            if not u:
-                continue
-            parsed = urlparse(u)
-            key = (parsed.netloc, parsed.path)
-            if key not in seen:
-                seen.add(key)
-                uniq.append(x)
-        return uniq
+    # pass 2 variation: a gentle variation to shake different results loose
+    # (keeps it generic; not tied to any vertical)
+    alt_q = f"{q} latest updates"
+
+    if speculative is None:
+        speculative = _SPECULATIVE_SEARCH
+    if speculative:
+        return _speculative_search(q, alt_q, max_results)
 
     # pass 1
     results = _ddg_text(q, max_results)
     if results:
         return results
 
-    # pass 2: a gentle variation to shake different results loose
-    # (keeps it generic; not tied to any vertical)
-    alt_q = f"{q} latest updates"
+    # pass 2
     results = _ddg_text(alt_q, max_results)
     return results or []
 
 # ---------- Clean & Fetch ----------
 
-def _clean_html_to_text(html: str) -> str:
+_NOISY_TAGS = (
+    "script", "style", "noscript", "header", "footer", "nav",
+    "svg", "img", "video", "source", "iframe", "form", "aside"
+)
+
+def _parse_tree(html: str):
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str input with an <?xml encoding=...?> declaration: hand lxml bytes instead
+        return lxml.html.document_fromstring(html.encode("utf-8", "replace"), parser=_UTF8_PARSER)
+
+def _extract_page(html: str) -> Tuple[str, str]:
     """
-    Strip scripts/styles/nav/media; collapse whitespace; lowercase; cap length.
+    One lxml parse -> (title, text).
+    Strips scripts/styles/nav/media, prefers main/article, collapses whitespace,
+    lowercases, and stops collecting text once _MAX_PER_PAGE_CHARS is reached.
     """
-    soup = BeautifulSoup(html or "", "lxml")
+    if not (html or "").strip():
+        return "", ""
+    try:
+        root = _parse_tree(html)
+    except (etree.ParserError, ValueError):
+        return "", ""
 
-    # remove noisy elements
-    for tag in soup([
-        "script", "style", "noscript", "header", "footer", "nav",
-        "svg", "img", "video", "source", "iframe", "form", "aside"
-    ]):
-        tag.decompose()
+    title_el = root.find(".//title")
+    title = (title_el.text or "").strip() if title_el is not None else ""
 
-    # trim attributes that often add weight without value
-    for el in soup(True):
-        for attr in list(el.attrs.keys()):
-            if attr.startswith("data-") or attr in ("class", "id", "style", "onclick", "onload"):
-                del el.attrs[attr]
+    # remove noisy elements (and comments) but keep the text that follows them; the tail is
+    # merged into the previous text node, so give it a leading space ("hello<img>world")
+    for el in root.iter(*_NOISY_TAGS, etree.Comment, etree.ProcessingInstruction):
+        if el.tail:
+            el.tail = " " + el.tail
+    etree.strip_elements(root, *_NOISY_TAGS, etree.Comment, etree.ProcessingInstruction, with_tail=False)
 
     # prefer main/article if present
-    main = soup.find(["main", "article"]) or soup.body or soup
-    text = main.get_text(separator=" ", strip=True) if main else soup.get_text(" ", strip=True)
-    text = re.sub(r"\s+", " ", text).strip().lower()
+    main = next(root.iter("main", "article"), None)
+    if main is None:
+        main = root.find("body")
+    if main is None:
+        main = root
+
+    pieces: List[str] = []
+    size = 0
+    for chunk in main.itertext():
+        chunk = " ".join(chunk.split())
+        if not chunk:
+            continue
+        pieces.append(chunk)
+        size += len(chunk) + 1
+        if size > _MAX_PER_PAGE_CHARS:
+            break  # early exit: the rest would be cut anyway
 
+    text = " ".join(pieces).lower()
     if len(text) > _MAX_PER_PAGE_CHARS:
         text = text[:_MAX_PER_PAGE_CHARS] + " ..."
-    return text
-
-def _guess_title(html: str) -> str:
-    try:
-        soup = BeautifulSoup(html or "", "lxml")
-        if soup.title and soup.title.string:
-            return soup.title.string.strip()
-    except Exception:
-        pass
-    return ""
+    return title, text
 
-def _requests_fetch(url: str) -> Dict:
-    r = requests.get(url, headers=_HEADERS, timeout=_TIMEOUT, allow_redirects=True)
-    r.raise_for_status()
-    html = r.text or ""
+def _parse_html(url: str, html: str) -> Dict:
+    title, text = _extract_page(html)
     return {
-        "title": _guess_title(html) or url,
+        "title": title or url,
         "url": url,
-        "text": _clean_html_to_text(html),
+        "text": text,
         "raw_html": html,
     }
 
+def _not_modified(url: str, cached: Dict) -> Dict:
+    return {
+        "title": cached.get("title") or url,
+        "url": url,
+        "text": cached.get("text") or "",
+        "raw_html": "",
+        "not_modified": True,
+    }
+
+# failures that mean "host unreachable/too slow" (feed the circuit breaker, no render fallback)
+_DEAD_HOST_ERRORS = (
+    requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+    aiohttp.ClientConnectionError, asyncio.TimeoutError,
+)
+
+class UnsupportedContent(Exception):
+    """Response is not an HTML/text page (PDF, image, archive...); not worth rendering either."""
+
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w.:-]+)""", re.I)
+
+class _CappedBody:
+    """
+    Incremental decoder for a streamed response body.
+    Rejects non-text content types, sniffs the first bytes for binary signatures,
+    decodes chunk by chunk and reports when _MAX_FETCH_BYTES has been read.
+    """
+
+    def __init__(self, content_type: str, max_bytes: int = _MAX_FETCH_BYTES):
+        ctype = (content_type or "").split(";")[0].strip().lower()
+        if ctype and not ctype.startswith(_TEXT_TYPES):
+            raise UnsupportedContent(ctype)
+        self.content_type = content_type or ""
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._decoder = None
+        self._parts: List[str] = []
+
+    def _charset(self, head: bytes) -> str:
+        m = re.search(r"charset=[\"']?([\w.:-]+)", self.content_type, re.I)
+        found = m.group(1) if m else None
+        if not found:
+            meta = _META_CHARSET.search(head[:4096])
+            found = meta.group(1).decode("ascii", "ignore") if meta else None
+        try:
+            return codecs.lookup(found).name if found else "utf-8"
+        except LookupError:
+            return "utf-8"
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add a chunk; returns False once the byte ceiling is reached."""
+        if self._decoder is None:
+            if chunk.startswith(_BINARY_MAGIC) or b"\x00" in chunk[:1024]:
+                raise UnsupportedContent("binary body")
+            self._decoder = codecs.getincrementaldecoder(self._charset(chunk))(errors="replace")
+        chunk = chunk[: self.max_bytes - self.size]
+        self.size += len(chunk)
+        self._parts.append(self._decoder.decode(chunk))
+        return self.size < self.max_bytes
+
+    def text(self) -> str:
+        if self._decoder is not None:
+            self._parts.append(self._decoder.decode(b"", final=True))
+        return "".join(self._parts)
+
+
+def _requests_fetch(url: str, cached: Optional[Dict] = None, timeout: Tuple[float, float] = _TIMEOUT) -> Dict:
+    """
+    Plain HTTP fetch on the shared requests.Session. With a cached page_cache entry,
+    sends a conditional request and returns the stored text on 304 without re-parsing.
+    The body is streamed and decoded incrementally, up to _MAX_FETCH_BYTES.
+    """
+    headers = {**_HEADERS, **page_cache.conditional_headers(cached)}
+    with http_pool.get_sync_session().get(url, headers=headers, timeout=timeout,
+                                          allow_redirects=True, stream=True) as r:
+        if r.status_code == 304 and cached:
+            page_cache.touch(url, page_cache.max_age(r.headers.get("Cache-Control", "")))
+            return _not_modified(url, cached)
+        r.raise_for_status()
+        body = _CappedBody(r.headers.get("Content-Type", ""))
+        for chunk in r.iter_content(_CHUNK_BYTES):
+            if chunk and not body.feed(chunk):
+                break
+        etag = r.headers.get("ETag", "")
+        last_modified = r.headers.get("Last-Modified", "")
+        fresh_for = page_cache.max_age(r.headers.get("Cache-Control", ""))
+    doc = _parse_html(url, body.text())
+    doc.update(etag=etag, last_modified=last_modified, max_age=fresh_for, conditional=bool(cached))
+    return doc
+
+async def _aiohttp_fetch(url: str, cached: Optional[Dict] = None, timeout: Tuple[float, float] = _TIMEOUT) -> Dict:
+    """Async twin of _requests_fetch on the shared aiohttp session; parsing runs off the event loop."""
+    headers = {**_HEADERS, **page_cache.conditional_headers(cached)}
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+    async with http_pool.get_session().get(url, headers=headers, timeout=client_timeout, allow_redirects=True) as resp:
+        if resp.status == 304 and cached:
+            await asyncio.to_thread(page_cache.touch, url, page_cache.max_age(resp.headers.get("Cache-Control", "")))
+            return _not_modified(url, cached)
+        resp.raise_for_status()
+        body = _CappedBody(resp.headers.get("Content-Type", ""))
+        async for chunk in resp.content.iter_chunked(_CHUNK_BYTES):
+            if not body.feed(chunk):
+                break
+        etag = resp.headers.get("ETag", "")
+        last_modified = resp.headers.get("Last-Modified", "")
+        fresh_for = page_cache.max_age(resp.headers.get("Cache-Control", ""))
+    doc = await asyncio.to_thread(_parse_html, url, body.text())
+    doc.update(etag=etag, last_modified=last_modified, max_age=fresh_for, conditional=bool(cached))
+    return doc
+
 def _playwright_fetch(url: str) -> Dict:
     """
     Render with Playwright only when needed (Cloudflare/JS-heavy pages).
+    Uses the warm, shared browser in browser_pool instead of launching Chromium per URL.
     One-time setup on your machine:
       python -m playwright install chromium
     """
-    from playwright.sync_api import sync_playwright
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        try:
-            ctx = browser.new_context(user_agent=_HEADERS["user-agent"])
-            page = ctx.new_page()
-            page.set_default_timeout(20000)
-            page.goto(url, wait_until="domcontentloaded")
-            page.wait_for_timeout(800)  # small settle window for SPA content
-            html = page.content()
-        finally:
-            browser.close()
+    html = browser_pool.render(url, timeout=_RENDER_TIMEOUT)
+    return _parse_html(url, html)
+
+async def _playwright_fetch_async(url: str) -> Dict:
+    html = await asyncio.wait_for(browser_pool.render_async(url), timeout=_RENDER_TIMEOUT)
+    return await asyncio.to_thread(_parse_html, url, html)
+
+def _blocked_doc(url: str) -> Dict:
     return {
-        "title": _guess_title(html) or url,
+        "title": "Blocked",
         "url": url,
-        "text": _clean_html_to_text(html),
-        "raw_html": html,
+        "text": "",
+        "snippet": "URL blocked for security reasons (localhost/private IP)"
     }
 
+def _needs_render(doc: Dict) -> bool:
+    """True if a plain fetch came back as a Cloudflare wall or an empty JS shell."""
+    if doc.get("not_modified"):
+        return False
+    looks_cf = bool(_CLOUDFLARE_HINT.search(doc.get("raw_html", "")))
+    too_short = len(doc.get("text", "")) < _MIN_BODY_CHARS
+    return looks_cf or too_short
+
+def _remember(url: str, doc: Dict) -> None:
+    if not doc.get("not_modified"):
+        page_cache.put(url, doc.get("title", ""), doc.get("text", ""),
+                       etag=doc.get("etag", ""), last_modified=doc.get("last_modified", ""),
+                       fresh_for=doc.get("max_age"), conditional=doc.get("conditional", False))
+
+def _finish(url: str, doc: Dict, max_chars: int) -> Dict:
+    text = (doc.get("text") or "")[:max_chars]
+    return {
+        "title": doc.get("title") or url,
+        "url": url,
+        "text": text,
+        "snippet": text[:300],
+    }
+
+def _empty_doc(url: str) -> Dict:
+    return {"title": "", "url": url, "text": "", "snippet": ""}
+
 def fetch_url(url: str, max_chars: int = _MAX_PER_PAGE_CHARS) -> Dict:
     """
     Fetch one URL via requests, then Playwright fallback if body is empty/blocked.
     Returns {title,url,text,snippet}.
     Includes URL security check to prevent SSRF.
+    Hosts with an open circuit breaker are skipped; "needs JS" hosts render directly.
     """
     # Security check (Task 5)
     if not is_safe_url(url):
-        return {
-            "title": "Blocked",
-            "url": url,
-            "text": "",
-            "snippet": "URL blocked for security reasons (localhost/private IP)"
-        }
-    
+        return _blocked_doc(url)
+    if not host_health.allow(url):
+        return _empty_doc(url)
+
     try:
-        doc = _requests_fetch(url)
-        looks_cf = bool(_CLOUDFLARE_HINT.search(doc.get("raw_html", "")))
-        too_short = len(doc.get("text", "")) < _MIN_BODY_CHARS
-        if looks_cf or too_short:
+        cached = page_cache.get(url)
+        if cached and cached["fresh"]:
+            doc = _not_modified(url, cached)  # within max-age: no request at all
+        elif host_health.needs_js(url):
             doc = _playwright_fetch(url)
+        else:
+            t0 = time.monotonic()
+            doc = _requests_fetch(url, cached=cached, timeout=host_health.timeout_for(url, _TIMEOUT))
+            host_health.record_success(url, time.monotonic() - t0)
+            needs_render = _needs_render(doc)
+            host_health.record_render(url, needs_render)
+            if needs_render:
+                doc = _playwright_fetch(url)
+            else:
+                _remember(url, doc)
+    except UnsupportedContent:
+        return _empty_doc(url)
+    except _DEAD_HOST_ERRORS:
+        # timed out / refused: a render would just wait on the same dead host
+        host_health.record_failure(url)
+        return _empty_doc(url)
     except Exception:
         # as a last resort, attempt playwright once
         try:
             doc = _playwright_fetch(url)
         except Exception:
-            return {"title": "", "url": url, "text": "", "snippet": ""}
+            return _empty_doc(url)
 
-    text = (doc.get("text") or "")[:max_chars]
-    return {
-        "title": doc.get("title") or url,
-        "url": url,
-        "text": text,
-        "snippet": text[:300],
-    }
+    return _finish(url, doc, max_chars)
+
+async def fetch_url_async(url: str, max_chars: int = _MAX_PER_PAGE_CHARS) -> Dict:
+    """
+    Awaitable fetch_url: aiohttp on the shared session, Playwright fallback on the browser pool.
+    Same return shape, SSRF check and host health handling as fetch_url.
+    """
+    with tracing.span("fetch", host=host_health.host_of(url)):
+        if not is_safe_url(url):
+            return _blocked_doc(url)
+        if not host_health.allow(url):
+            return _empty_doc(url)
+
+        try:
+            cached = await asyncio.to_thread(page_cache.get, url)
+            if cached and cached["fresh"]:
+                doc = _not_modified(url, cached)  # within max-age: no request at all
+            elif host_health.needs_js(url):
+                doc = await _playwright_fetch_async(url)
+            else:
+                t0 = time.monotonic()
+                doc = await _aiohttp_fetch(url, cached=cached, timeout=host_health.timeout_for(url, _TIMEOUT))
+                host_health.record_success(url, time.monotonic() - t0)
+                needs_render = _needs_render(doc)
+                host_health.record_render(url, needs_render)
+                if needs_render:
+                    doc = await _playwright_fetch_async(url)
+                else:
+                    await asyncio.to_thread(_remember, url, doc)  # SQLite write + commit stays off the event loop
+        except asyncio.CancelledError:
+            raise
+        except UnsupportedContent:
+            return _empty_doc(url)
+        except _DEAD_HOST_ERRORS:
+            host_health.record_failure(url)
+            return _empty_doc(url)
+        except Exception:
+            try:
+                doc = await _playwright_fetch_async(url)
+            except Exception:
+                return _empty_doc(url)
+
+        return _finish(url, doc, max_chars)
 
 # ---------- Orchestration (non-stream + stream) ----------
 
-def rag_search(
-    query: str,
-    user_loc: str = "",
-    max_pages: int = 3,           # kept for signature compatibility with existing code
-    max_chars: int = _MAX_PER_PAGE_CHARS
-) -> List[Dict]:
+def _fetch_pool(n: int) -> concurrent.futures.ThreadPoolExecutor:
+    """Workers for one search's page fetches: a slow page only ever holds its own call's thread."""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=max(1, n), thread_name_prefix="fetch")
+
+def _pick_results(query: str, user_loc: str = "") -> List[Dict]:
     """
-    Search + fetch + clean. Keeps the API your main.py expects.
-    Returns a list of up to _TOP_K items:
-      [{ title, url, snippet, text }, ...]
+    Clean the query, add location for local queries, search, and keep up to _TOP_K
+    distinct URLs as [{title, url, snippet}, ...].
     """
     # Clean query FIRST before doing anything else
     q = _prep_query(query)
@@ -275,7 +652,8 @@ def rag_search(
     if is_local_query and user_loc and user_loc.lower() not in q.lower():
         q = f"{q} near {user_loc}"
 
-    results = web_search(q, max_results=_MAX_RESULTS)
+    with tracing.span("ddg_search"):
+        results = web_search(q, max_results=_MAX_RESULTS)
 
     # pick up to _TOP_K distinct URLs
     picked: List[Dict] = []
@@ -290,86 +668,146 @@ def rag_search(
             "url": u,
             "snippet": r.get("snippet", ""),
         })
+    return picked
+
+def _merge(item: Dict, doc: Dict) -> Optional[Dict]:
+    """Combine a search hit with its fetched page; None if nothing usable came back."""
+    if not (doc.get("text") or doc.get("snippet")):
+        return None
+    return {
+        "title": doc.get("title") or item.get("title") or "(link)",
+        "url": item["url"],
+        "snippet": doc.get("snippet") or item.get("snippet", ""),
+        "text": doc.get("text") or "",
+    }
+
+def rag_search(
+    query: str,
+    user_loc: str = "",
+    max_pages: int = 3,           # kept for signature compatibility with existing code
+    max_chars: int = _MAX_PER_PAGE_CHARS
+) -> List[Dict]:
+    """
+    Search + fetch + clean. Keeps the API your main.py expects.
+    Returns a list of up to _TOP_K items:
+      [{ title, url, snippet, text }, ...]
+    """
+    picked = _pick_results(query, user_loc)
 
-    # fetch all URLs in parallel (5x faster!)
-    import concurrent.futures
-    
     out: List[Dict] = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        # Submit all fetches at once
+    # fetch all URLs in parallel
+    with _fetch_pool(len(picked)) as pool:
         future_to_item = {
-            executor.submit(fetch_url, item["url"], max_chars): item 
+            pool.submit(fetch_url, item["url"], max_chars): item
             for item in picked
         }
-        
+
         # Collect results as they complete
         for future in concurrent.futures.as_completed(future_to_item):
             item = future_to_item[future]
             try:
-                doc = future.result()
-                if not (doc.get("text") or doc.get("snippet")):
-                    continue
-                out.append({
-                    "title": doc["title"] or item["title"] or "(link)",
-                    "url": item["url"],
-                    "snippet": doc.get("snippet") or item.get("snippet", ""),
-                    "text": doc.get("text") or "",
-                })
+                merged = _merge(item, future.result())
             except Exception:
                 continue
+            if merged:
+                out.append(merged)
     return out
 
 
-def rag_search_stream(
+async def rag_search_async(
     query: str,
     user_loc: str = "",
+    max_pages: int = 3,           # kept for signature compatibility with rag_search
     max_chars: int = _MAX_PER_PAGE_CHARS
+) -> List[Dict]:
+    """
+    Awaitable rag_search: DDG lookup in a worker thread, page fetches concurrently
+    on the shared aiohttp session. Safe to await from request handlers.
+    """
+    picked = await asyncio.to_thread(_pick_results, query, user_loc)
+    docs = await asyncio.gather(
+        *(fetch_url_async(item["url"], max_chars) for item in picked),
+        return_exceptions=True,
+    )
+
+    out: List[Dict] = []
+    for item, doc in zip(picked, docs):
+        if isinstance(doc, BaseException):
+            continue
+        merged = _merge(item, doc)
+        if merged:
+            out.append(merged)
+    return out
+
+
+def rag_search_stream(
+    query: str,
+    user_loc: str = "",
+    max_chars: int = _MAX_PER_PAGE_CHARS,
+    deadline: float = _STREAM_DEADLINE
 ) -> Generator[Dict, None, None]:
     """
-    OPTIONAL streaming version: yields each fetched document dict as soon as it's ready.
+    OPTIONAL streaming version: fetches all picked URLs at once and yields each
+    document dict in completion order, so the first source waits only on the fastest page.
+    `deadline` (seconds, counted from the call) bounds the whole search; pages still
+    pending when it passes are dropped. Each call has its own workers, so stragglers
+    left running never delay another search.
     Usage: for doc in rag_search_stream(q): yield doc
     Your FastAPI route can convert each yielded dict to SSE/NDJSON to populate UI incrementally.
     """
-    # Clean query FIRST before doing anything else
-    q = _prep_query(query)
-    
-    # Only add location for truly LOCAL queries
-    is_local_query = any(word in q.lower() for word in [
-        "near", "restaurant", "movie", "theater", "showtimes", 
-        "weather", "store", "shop", "open", "hours", "nearby"
-    ])
-    
-    if is_local_query and user_loc and user_loc.lower() not in q.lower():
-        q = f"{q} near {user_loc}"
+    stop_at = time.monotonic() + deadline
+    picked = _pick_results(query, user_loc)
+
+    pool = _fetch_pool(len(picked))
+    future_to_item = {
+        pool.submit(fetch_url, item["url"], max_chars): item
+        for item in picked
+    }
+    try:
+        for future in concurrent.futures.as_completed(future_to_item, timeout=max(0.0, stop_at - time.monotonic())):
+            try:
+                merged = _merge(future_to_item[future], future.result())
+            except Exception:
+                # skip on single-page failure; continue streaming others
+                continue
+            if merged:
+                yield merged
+    except concurrent.futures.TimeoutError:
+        pass
+    finally:
+        # stragglers (or an abandoned generator): don't wait for them; they finish on their own threads
+        pool.shutdown(wait=False, cancel_futures=True)
 
-    results = web_search(q, max_results=_MAX_RESULTS)
 
-    # select up to _TOP_K URLs
-    picked: List[str] = []
-    meta: Dict[str, Dict] = {}
-    for r in results:
-        if len(picked) >= _TOP_K:
-            break
-        u = r.get("url")
-        if not u:
-            continue
-        picked.append(u)
-        meta[u] = {
-            "title": r.get("title", ""),
-            "snippet": r.get("snippet", "")
-        }
+async def rag_search_stream_async(
+    query: str,
+    user_loc: str = "",
+    max_chars: int = _MAX_PER_PAGE_CHARS,
+    deadline: float = _STREAM_DEADLINE
+) -> AsyncGenerator[Dict, None]:
+    """
+    Async twin of rag_search_stream: yields documents in completion order and
+    cancels in-flight fetches once `deadline` passes or the consumer stops iterating.
+    """
+    stop_at = time.monotonic() + deadline
+    picked = await asyncio.to_thread(_pick_results, query, user_loc)
 
-    for u in picked:
+    async def _one(item: Dict) -> Optional[Dict]:
         try:
-            doc = fetch_url(u, max_chars=max_chars)
-            if not (doc.get("text") or doc.get("snippet")):
-                continue
-            yield {
-                "title": doc.get("title") or meta[u].get("title") or "(link)",
-                "url": u,
-                "snippet": doc.get("snippet") or meta[u].get("snippet", ""),
-                "text": doc.get("text") or "",
-            }
+            return _merge(item, await fetch_url_async(item["url"], max_chars))
+        except asyncio.CancelledError:
+            raise
         except Exception:
-            # skip on single-page failure; continue streaming others
-            continue
\ No newline at end of file
+            return None
+
+    tasks = [asyncio.create_task(_one(item)) for item in picked]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=max(0.0, stop_at - time.monotonic())):
+            merged = await next_done
+            if merged:
+                yield merged
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
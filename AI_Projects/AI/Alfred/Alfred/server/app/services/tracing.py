@@ -0,0 +1,140 @@
+# app/services/tracing.py
+"""
+Per-request span tracing for chat_stream
+- start() opens a trace with a request id; spans opened in child tasks and to_thread calls
+  attach to it through contextvars (no trace active -> spans are free no-ops)
+- span(name, **attrs) times a block; observe(name, value) records a measured value (tokens/sec)
+- finish() queues the trace as one JSONL line (logs/traces-YYYY-MM-DD.jsonl) and feeds
+  the rolling histograms behind GET /metrics (count, p50, p95, p99)
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from app.utils import log_writer
+
+_WINDOW = 1000  # samples kept per span name for percentiles
+
+
+class Trace:
+    def __init__(self, request_id: str = ""):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: list = []
+        self.values: Dict[str, float] = {}
+        self._lock = threading.Lock()  # spans may close on worker threads
+
+    def add(self, name: str, start: float, end: float, attrs: Dict) -> None:
+        entry = {
+            "name": name,
+            "start_ms": round((start - self.t0) * 1000, 1),
+            "ms": round((end - start) * 1000, 1),
+        }
+        if attrs:
+            entry.update(attrs)
+        with self._lock:
+            self.spans.append(entry)
+
+
+_CURRENT: ContextVar[Optional[Trace]] = ContextVar("alfred_trace", default=None)
+
+_hist_lock = threading.Lock()
+_hist: Dict[str, deque] = {}
+
+
+def start(request_id: str = "") -> Trace:
+    """Begin a trace for the current task (and everything it spawns)."""
+    trace = Trace(request_id)
+    _CURRENT.set(trace)
+    return trace
+
+
+def current() -> Optional[Trace]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict]:
+    """Time the enclosed block. Yields the attrs dict so the block can add to it."""
+    trace = _CURRENT.get()
+    if trace is None:
+        yield attrs
+        return
+    t = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        trace.add(name, t, time.perf_counter(), attrs)
+
+
+def mark(name: str, since: float, **attrs) -> None:
+    """Record a span that started at perf_counter() value `since` and ends now."""
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.add(name, since, time.perf_counter(), attrs)
+
+
+def observe(name: str, value: float) -> None:
+    """Attach a measured value (not a duration) to the trace, e.g. llm.tokens_per_sec."""
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.values[name] = round(value, 2)
+
+
+def _sample(name: str, value: float) -> None:
+    samples = _hist.get(name)
+    if samples is None:
+        samples = _hist[name] = deque(maxlen=_WINDOW)
+    samples.append(value)
+
+
+def finish(trace: Trace, **attrs) -> Dict:
+    """Close the trace: add the total span, queue the JSONL line, update histograms."""
+    trace.add("total", trace.t0, time.perf_counter(), {})
+    record = {
+        "request_id": trace.request_id,
+        "ts": datetime.datetime.fromtimestamp(trace.started).isoformat(timespec="seconds"),
+        **attrs,
+        "values": trace.values,
+        "spans": trace.spans,
+    }
+    with _hist_lock:
+        for s in trace.spans:
+            _sample(s["name"], s["ms"])
+        for name, value in trace.values.items():
+            _sample(name, value)
+    log_writer.write("traces", json.dumps(record))
+    return record
+
+
+def _pct(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def metrics() -> Dict[str, Dict]:
+    """Percentiles over the last _WINDOW samples per span (ms) or value (its own unit)."""
+    with _hist_lock:
+        snapshot = {name: sorted(samples) for name, samples in _hist.items()}
+    return {
+        name: {
+            "count": len(ordered),
+            "p50": _pct(ordered, 0.50),
+            "p95": _pct(ordered, 0.95),
+            "p99": _pct(ordered, 0.99),
+        }
+        for name, ordered in sorted(snapshot.items())
+        if ordered
+    }
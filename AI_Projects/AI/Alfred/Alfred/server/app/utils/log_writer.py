@@ -0,0 +1,177 @@
+# app/utils/log_writer.py
+"""
+Background log writer: log calls only enqueue, one thread does the file I/O
+- Lines are batched per stream and written through one open handle per stream
+- Daily files ({date}.log, traces-{date}.jsonl); a file over LOG_MAX_BYTES rolls to {date}.1.log, ...
+- LOG_GZIP=1 compresses finished days (on the first write of a new day and at startup)
+- Bounded queue: a burst beyond it drops lines (counted in stats()) instead of eating memory
+"""
+from __future__ import annotations
+
+import atexit
+import datetime
+import gzip
+import os
+import queue
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Optional, TextIO, Tuple
+
+LOG_DIR = Path(__file__).parent.parent.parent.parent / "logs"  # Alfred/logs
+
+_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+_GZIP = os.getenv("LOG_GZIP", "0").lower() in ("1", "true", "yes")
+_QUEUE_SIZE = 10000   # lines waiting to be written
+_BATCH = 500          # max lines per write pass
+_FLUSH_SECONDS = 0.5  # idle wait before the thread checks again
+
+# stream -> (file prefix, file suffix)
+_STREAMS = {"chat": ("", ".log"), "traces": ("traces-", ".jsonl")}
+_DATED = re.compile(r"^(?P<prefix>[a-z]*-?)(?P<day>\d{4}-\d{2}-\d{2})(?:\.\d+)?(?P<suffix>\.log|\.jsonl)$")
+
+
+class _Open:
+    def __init__(self, day: str, path: Path, fh: TextIO):
+        self.day = day
+        self.path = path
+        self.fh = fh
+        self.size = path.stat().st_size
+
+
+class LogWriter:
+    def __init__(self, directory: Path = LOG_DIR, max_bytes: int = _MAX_BYTES, gzip_old: bool = _GZIP):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.gzip_old = gzip_old
+        self._q: "queue.Queue[Optional[Tuple[str, str]]]" = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._open: Dict[str, _Open] = {}
+        self._dropped = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- producer side (any thread, never blocks) ----
+
+    def write(self, stream: str, line: str) -> None:
+        self._ensure_thread()
+        try:
+            self._q.put_nowait((stream, line))
+        except queue.Full:
+            self._dropped += 1
+
+    def flush(self) -> None:
+        """Block until everything queued so far is on disk (tests, shutdown)."""
+        if self._thread is not None:
+            self._q.join()
+
+    def close(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._q.put(None)
+            thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._q.qsize(), "written": self._written, "dropped": self._dropped}
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+
+    # ---- writer thread ----
+
+    def _run(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.gzip_old:
+            self._compress_finished()
+        stop = False
+        while not stop:
+            try:
+                batch = [self._q.get(timeout=_FLUSH_SECONDS)]
+            except queue.Empty:
+                continue
+            while len(batch) < _BATCH:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            lines: Dict[str, list] = {}
+            for item in batch:
+                if item is None:
+                    stop = True
+                else:
+                    lines.setdefault(item[0], []).append(item[1])
+            try:
+                for stream, chunk in lines.items():
+                    self._write(stream, chunk)
+            except OSError as e:
+                print(f"[WARN] Log write failed: {e}")
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+        for f in self._open.values():
+            f.fh.close()
+        self._open.clear()
+
+    def _write(self, stream: str, chunk: list) -> None:
+        f = self._file(stream)
+        data = "".join(line + "\n" for line in chunk)
+        f.fh.write(data)
+        f.fh.flush()
+        f.size += len(data.encode("utf-8"))
+        self._written += len(chunk)
+
+    def _file(self, stream: str) -> _Open:
+        prefix, suffix = _STREAMS.get(stream, (f"{stream}-", ".log"))
+        day = datetime.date.today().isoformat()
+        f = self._open.get(stream)
+        if f is not None and f.day == day and f.size < self.max_bytes:
+            return f
+        if f is not None:
+            f.fh.close()
+            if f.day == day:  # size rotation: move the full file aside, keep the plain name for the newest
+                n = 1
+                while (self.directory / f"{prefix}{day}.{n}{suffix}").exists():
+                    n += 1
+                f.path.rename(self.directory / f"{prefix}{day}.{n}{suffix}")
+            elif self.gzip_old:
+                self._compress_finished()
+        path = self.directory / f"{prefix}{day}{suffix}"
+        f = self._open[stream] = _Open(day, path, open(path, "a", encoding="utf-8"))
+        return f
+
+    def _compress_finished(self) -> None:
+        today = datetime.date.today().isoformat()
+        in_use = {f.path for f in self._open.values() if not f.fh.closed}
+        for path in self.directory.iterdir():
+            m = _DATED.match(path.name)
+            if not m or m.group("day") >= today or path in in_use:
+                continue
+            with open(path, "rb") as src, gzip.open(f"{path}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            path.unlink()
+
+
+_WRITER = LogWriter()
+atexit.register(_WRITER.close)  # drain whatever is queued when the process exits
+
+
+def write(stream: str, line: str) -> None:
+    _WRITER.write(stream, line)
+
+
+def flush() -> None:
+    _WRITER.flush()
+
+
+def close() -> None:
+    _WRITER.close()
+
+
+def stats() -> Dict[str, int]:
+    return _WRITER.stats()
@@ -1,64 +1,347 @@
 # server/indexer.py
+"""
+Builds the knowledge-base FAISS index from knowledge_base/
+- index/manifest.json maps each file to its content hash and the ids of its chunks
+- A run only loads, splits and embeds new or changed files, and deletes the chunks of
+  changed or removed ones; unchanged files are recognised by mtime + size without reading them
+- Files are loaded and split in a process pool; chunks go to Ollama in batches with a
+  bounded number of batches in flight, and each file is added to FAISS once all its chunks
+  are embedded
+- Finished files are checkpointed (index + manifest) every CHECKPOINT_SECONDS, so an
+  interrupted build resumes with the files it had not finished
+- A full build (--rebuild, changed settings, no index yet) checkpoints into index/rebuild/
+  and is swapped in only when complete, so the server keeps the old index meanwhile and an
+  interrupted rebuild resumes from the staged files
+- --watch keeps polling and applies changes to the index, which the running server reloads
+  when the manifest changes
+"""
+import argparse
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-from langchain_community.document_loaders import (
-    PyPDFLoader, TextLoader, UnstructuredMarkdownLoader, UnstructuredHTMLLoader
-)
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
-
-DOCS_DIR = Path("knowledge_base")
-INDEX_DIR = Path("index")
+
+APP_DIR = Path(__file__).parent.parent  # Alfred/ (main.py loads the index from here)
+DOCS_DIR = APP_DIR / "knowledge_base"
+INDEX_DIR = APP_DIR / "index"
+MANIFEST_FILE = INDEX_DIR / "manifest.json"
 EMBED_MODEL = "nomic-embed-text"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+SUFFIXES = {".pdf", ".md", ".markdown", ".txt", ".htm", ".html"}
+WATCH_INTERVAL = 5.0  # seconds between scans in --watch mode
+LOAD_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # processes loading/splitting files
+EMBED_BATCH = 32          # chunks per embedding request
+EMBED_IN_FLIGHT = 4       # embedding requests outstanding at once
+CHECKPOINT_SECONDS = 30   # how often finished files are saved during a long build
+STAGING_NAME = "rebuild"  # subdirectory of INDEX_DIR a full build is written to before the swap
 
-def load_documents():
-    docs = []
-    for p in DOCS_DIR.rglob("*"):
-        if p.is_dir():
-            continue
+
+def load_file(p: Path):
+    from langchain_community.document_loaders import (
+        PyPDFLoader, TextLoader, UnstructuredMarkdownLoader, UnstructuredHTMLLoader
+    )
+    suffix = p.suffix.lower()
+    if suffix == ".pdf":
+        return PyPDFLoader(str(p)).load()
+    if suffix in {".md", ".markdown"}:
+        return UnstructuredMarkdownLoader(str(p)).load()
+    if suffix == ".txt":
+        return TextLoader(str(p), encoding="utf-8").load()
+    return UnstructuredHTMLLoader(str(p)).load()
+
+
+def file_hash(p: Path) -> str:
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_ids(rel: str, digest: str, count: int):
+    """Stable ids for a file version's chunks; two files with the same content don't collide."""
+    prefix = hashlib.sha1(f"{rel}\n{digest}".encode("utf-8")).hexdigest()[:16]
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+def load_and_split(path: str):
+    """One file -> [(text, metadata)] chunks. Runs in the loader processes."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return [(d.page_content, d.metadata) for d in splitter.split_documents(load_file(Path(path)))]
+
+
+def embed_files(rels, embed, on_file, workers=LOAD_WORKERS, batch_size=EMBED_BATCH,
+                in_flight=EMBED_IN_FLIGHT, load=load_and_split) -> int:
+    """
+    Producer/consumer pipeline over knowledge_base/ files (relative paths).
+    Files are loaded and split by `workers` processes (in this process when workers=0),
+    embed(texts) is called with batches of batch_size chunks from at most in_flight threads,
+    and on_file(rel, texts, metadatas, vectors) runs in this thread once every chunk of a
+    file has its vector (with empty lists for files that failed to load).
+    Returns the number of chunks embedded.
+    """
+    files = {}      # rel -> [texts, metadatas, vectors, chunks still to embed]
+    queue = []      # (rel, chunk index) not yet sent
+    outstanding = {}  # future -> [(rel, chunk index)]
+    embedded = 0
+
+    def collect(done) -> None:
+        nonlocal embedded
+        for fut in done:
+            batch = outstanding.pop(fut)
+            for (rel, i), vector in zip(batch, fut.result()):
+                entry = files[rel]
+                entry[2][i] = vector
+                entry[3] -= 1
+                if entry[3] == 0:
+                    on_file(rel, *files.pop(rel)[:3])
+            embedded += len(batch)
+
+    def send(embedders, batch) -> None:
+        while len(outstanding) >= in_flight:
+            collect(wait(outstanding, return_when=FIRST_COMPLETED).done)
+        outstanding[embedders.submit(embed, [files[rel][0][i] for rel, i in batch])] = batch
+
+    def loaded(embedders, rel, result) -> None:
         try:
-            if p.suffix.lower() == ".pdf":
-                docs += PyPDFLoader(str(p)).load()
-            elif p.suffix.lower() in {".md", ".markdown"}:
-                docs += UnstructuredMarkdownLoader(str(p)).load()
-            elif p.suffix.lower() == ".txt":
-                docs += TextLoader(str(p), encoding="utf-8").load()
-            elif p.suffix.lower() in {".htm", ".html"}:
-                docs += UnstructuredHTMLLoader(str(p)).load()
+            pieces = result()
         except Exception as e:
-            print(f"[WARN] Skipping {p.name}: {e}")
-    return docs
+            print(f"[WARN] Skipping {rel}: {e}")  # retried when the file changes again
+            pieces = []
+        if not pieces:
+            on_file(rel, [], [], [])
+            return
+        files[rel] = [[t for t, _ in pieces], [m for _, m in pieces], [None] * len(pieces), len(pieces)]
+        queue.extend((rel, i) for i in range(len(pieces)))
+        while len(queue) >= batch_size:
+            send(embedders, queue[:batch_size])
+            del queue[:batch_size]
+
+    with ThreadPoolExecutor(max_workers=in_flight) as embedders:
+        try:
+            if workers:
+                with ProcessPoolExecutor(max_workers=workers) as loaders:
+                    futures = {loaders.submit(load, str(DOCS_DIR / rel)): rel for rel in rels}
+                    for fut in as_completed(futures):
+                        loaded(embedders, futures[fut], fut.result)
+            else:
+                for rel in rels:
+                    loaded(embedders, rel, lambda: load(str(DOCS_DIR / rel)))
+            if queue:
+                send(embedders, queue[:])
+                queue.clear()
+            while outstanding:
+                collect(wait(outstanding, return_when=FIRST_COMPLETED).done)
+        finally:
+            for fut in outstanding:
+                fut.cancel()
+    return embedded
 
-def build_index():
-    print("[INFO] Loading docs from knowledge_base/...")
-    docs = load_documents()
-    if not docs:
-        print("[ERROR] No docs found. Add files to knowledge_base/ folder.")
-        return
-    print(f"[OK] Loaded {len(docs)} documents")
 
-    print("[INFO] Splitting into chunks...")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(docs)
-    print(f"[OK] Created {len(chunks)} chunks")
+def _settings() -> dict:
+    return {"embed_model": EMBED_MODEL, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+
+def load_manifest(path: Path = None):
+    try:
+        with open(path or MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Unreadable manifest, rebuilding: {e}")
+        return None
+
+
+def save_manifest(files: dict, index_dir: Path = None) -> None:
+    index_dir = index_dir or INDEX_DIR
+    index_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=index_dir, prefix=".manifest-", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"settings": _settings(), "files": files}, f, indent=2, sort_keys=True)
+    os.replace(tmp, index_dir / MANIFEST_FILE.name)
+
+
+def scan(known: dict):
+    """
+    Compare knowledge_base/ with the manifest's file entries.
+    Returns (files, changed, removed): files is the new manifest (chunk lists copied for
+    unchanged files), changed lists new/edited paths, removed lists paths that are gone.
+    """
+    files, changed = {}, []
+    for p in sorted(DOCS_DIR.rglob("*")):
+        if not p.is_file() or p.suffix.lower() not in SUFFIXES:
+            continue
+        rel = p.relative_to(DOCS_DIR).as_posix()
+        st = p.stat()
+        old = known.get(rel)
+        if old and old["mtime_ns"] == st.st_mtime_ns and old["size"] == st.st_size:
+            files[rel] = old
+            continue
+        digest = file_hash(p)
+        if old and old["hash"] == digest:  # touched, not edited
+            files[rel] = dict(old, mtime_ns=st.st_mtime_ns, size=st.st_size)
+            continue
+        files[rel] = {"hash": digest, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "chunks": []}
+        changed.append(rel)
+    removed = sorted(known.keys() - files.keys())
+    return files, changed, removed
+
+
+def _save_index(vs, index_dir: Path = None) -> None:
+    """save_local into a temp dir, then move the files over the old ones."""
+    index_dir = index_dir or INDEX_DIR
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=index_dir, prefix=".build-"))
+    try:
+        vs.save_local(str(tmp))
+        for f in tmp.iterdir():
+            os.replace(f, index_dir / f.name)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _usable(manifest, index_dir: Path) -> bool:
+    return manifest is not None and manifest.get("settings") == _settings() and (index_dir / "index.faiss").exists()
+
+
+def _promote(staging: Path) -> None:
+    """Swap a finished full build in: index files first, the manifest last (the server reloads on it)."""
+    for f in staging.iterdir():
+        if f.is_file() and f.name != MANIFEST_FILE.name:
+            os.replace(f, INDEX_DIR / f.name)
+    os.replace(staging / MANIFEST_FILE.name, MANIFEST_FILE)
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def update_index(rebuild: bool = False, quiet: bool = False, workers: int = LOAD_WORKERS,
+                 batch_size: int = EMBED_BATCH, in_flight: int = EMBED_IN_FLIGHT) -> dict:
+    """Apply knowledge_base/ changes to the index. Returns counts of what was done."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_ollama import OllamaEmbeddings
+    import langchain_text_splitters  # noqa: F401  fail here, not once per file in the loader processes
+
+    manifest = None if rebuild else load_manifest()
+    if manifest is not None and not _usable(manifest, INDEX_DIR):
+        print("[INFO] Index settings changed or index missing, rebuilding")
+        manifest = None
+    # A full build goes to a staging dir; the live index is replaced only once it is complete
+    staging = INDEX_DIR / STAGING_NAME if manifest is None else None
+    index_dir = staging or INDEX_DIR
+    if staging is not None:
+        manifest = load_manifest(staging / MANIFEST_FILE.name)
+        if _usable(manifest, staging):
+            print(f"[INFO] Resuming the interrupted rebuild in {staging}")
+        else:
+            manifest = None
+            shutil.rmtree(staging, ignore_errors=True)
+    known = manifest["files"] if manifest else {}
+
+    files, changed, removed = scan(known)
+    summary = {"files": len(files), "changed": len(changed), "removed": len(removed), "chunks_added": 0, "chunks_removed": 0}
+    if staging is None and not changed and not removed:
+        if files != known:
+            save_manifest(files)  # only timestamps moved
+        if not quiet:
+            print("[OK] Index is up to date")
+        return summary
+    if not files and manifest is None:
+        print("[ERROR] No docs found. Add files to knowledge_base/ folder.")
+        return summary
+    print(f"[INFO] {len(changed)} new/changed, {len(removed)} removed, {len(files) - len(changed)} unchanged")
 
-    print(f"[INFO] Creating embeddings ({len(chunks)} chunks, ~1-2 min)...")
     embeddings = OllamaEmbeddings(model=EMBED_MODEL)
+    if changed:
+        print(f"[OK] Model OK (vector dim: {len(embeddings.embed_query('test'))})")
+    vs = FAISS.load_local(str(index_dir), embeddings, allow_dangerous_deserialization=True) if manifest else None
+
+    stale = [cid for rel in changed + removed for cid in known.get(rel, {}).get("chunks", [])]
+    if vs is not None and stale:
+        vs.delete(ids=stale)
+        summary["chunks_removed"] = len(stale)
+
+    pending = set(changed)  # files whose new chunks are not in the index yet
+    last_checkpoint = time.monotonic()
+
+    def checkpoint() -> None:
+        nonlocal last_checkpoint
+        if vs is not None:
+            _save_index(vs, index_dir)
+            save_manifest({rel: e for rel, e in files.items() if rel not in pending}, index_dir)  # last: the server reloads on it
+        last_checkpoint = time.monotonic()
+
+    def on_file(rel, texts, metadatas, vectors) -> None:
+        nonlocal vs
+        ids = chunk_ids(rel, files[rel]["hash"], len(texts))
+        if texts:
+            if vs is None:
+                vs = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas, ids=ids)
+            else:
+                vs.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        files[rel]["chunks"] = ids
+        summary["chunks_added"] += len(texts)
+        pending.discard(rel)
+        if time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+            checkpoint()
+            print(f"[INFO] Checkpoint: {len(changed) - len(pending)}/{len(changed)} files done")
 
-    print("Testing embedding model...")
-    test = embeddings.embed_query("test")
-    print(f"[OK] Model OK (vector dim: {len(test)})")
+    t0 = time.monotonic()
+    try:
+        embedded = embed_files(changed, embeddings.embed_documents, on_file, workers, batch_size, in_flight)
+    except BaseException:
+        checkpoint()  # keep finished files; the next run picks up the rest
+        again = "rerun with --rebuild" if rebuild else "rerun"
+        print(f"[WARN] Interrupted: {len(changed) - len(pending)}/{len(changed)} files saved, {again} to resume")
+        raise
+    elapsed = time.monotonic() - t0
+    if embedded:
+        print(f"[OK] Embedded {embedded} chunks in {elapsed:.1f}s ({embedded / elapsed:.1f} chunks/sec)")
+    if vs is None:
+        print("[ERROR] Nothing could be indexed.")
+        return summary
 
-    print("[INFO] Building FAISS index (processing chunks)...")
-    vs = FAISS.from_documents(chunks, embeddings)
-    print("[OK] Index built")
+    checkpoint()
+    if staging is not None:
+        _promote(staging)
+    print(f"[OK] Index updated: +{summary['chunks_added']} / -{summary['chunks_removed']} chunks")
+    return summary
+
+
+def watch(interval: float = WATCH_INTERVAL, **tuning) -> None:
+    print(f"[INFO] Watching {DOCS_DIR}/ every {interval:g}s (Ctrl+C to stop)")
+    update_index(**tuning)
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                update_index(quiet=True, **tuning)
+            except Exception as e:
+                print(f"[WARN] Index update failed: {e}")
+    except KeyboardInterrupt:
+        pass
+
+
+def build_index():
+    update_index()
 
-    print(f"[INFO] Saving to {INDEX_DIR}/...")
-    INDEX_DIR.mkdir(exist_ok=True)
-    vs.save_local(str(INDEX_DIR))
-    print(f"[OK] Saved! Files: {[f.name for f in INDEX_DIR.glob('*')]}")
-    print("\n[DONE] Indexing complete! Run main.py to use.")
 
 if __name__ == "__main__":
-    build_index()
+    parser = argparse.ArgumentParser(description="Build or update the knowledge-base index")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed everything from scratch")
+    parser.add_argument("--watch", action="store_true", help="keep running and apply file changes as they happen")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between scans with --watch")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS, help="processes loading and splitting files (0 = none)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH, help="chunks per embedding request")
+    parser.add_argument("--in-flight", type=int, default=EMBED_IN_FLIGHT, help="embedding requests sent at once")
+    args = parser.parse_args()
+    tuning = {"workers": args.workers, "batch_size": args.batch_size, "in_flight": args.in_flight}
+    if args.watch:
+        watch(args.interval, **tuning)
+    else:
+        update_index(rebuild=args.rebuild, **tuning)
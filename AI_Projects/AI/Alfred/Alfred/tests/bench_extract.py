@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: single-parse lxml extractor vs the old two-pass BeautifulSoup cleaner.
+Run with: python tests/bench_extract.py [folder_of_saved_pages] [--rounds N]
+
+Run from Alfred root directory.
+Save pages with your browser ("Save page as... HTML only") into one folder.
+Without a folder, a small synthetic corpus is generated so the script always runs.
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services.search_service import _extract_page, _MAX_PER_PAGE_CHARS
+
+
+# --- baseline: the previous implementation (two BeautifulSoup parses per page) ---
+
+def _legacy_clean(html: str) -> str:
+    soup = BeautifulSoup(html or "", "lxml")
+    for tag in soup([
+        "script", "style", "noscript", "header", "footer", "nav",
+        "svg", "img", "video", "source", "iframe", "form", "aside"
+    ]):
+        tag.decompose()
+    for el in soup(True):
+        for attr in list(el.attrs.keys()):
+            if attr.startswith("data-") or attr in ("class", "id", "style", "onclick", "onload"):
+                del el.attrs[attr]
+    main = soup.find(["main", "article"]) or soup.body or soup
+    text = main.get_text(separator=" ", strip=True) if main else soup.get_text(" ", strip=True)
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    if len(text) > _MAX_PER_PAGE_CHARS:
+        text = text[:_MAX_PER_PAGE_CHARS] + " ..."
+    return text
+
+
+def _legacy_title(html: str) -> str:
+    soup = BeautifulSoup(html or "", "lxml")
+    if soup.title and soup.title.string:
+        return soup.title.string.strip()
+    return ""
+
+
+def _legacy(html: str):
+    return _legacy_title(html), _legacy_clean(html)
+
+
+# --- corpus ---
+
+def _synthetic_corpus():
+    nav = "<nav>" + "".join(f'<a href="/p{i}" class="nav-link" data-id="{i}">Link {i}</a>' for i in range(200)) + "</nav>"
+    script = "<script>" + "var x = 1;" * 2000 + "</script>"
+    para = ("<p class='body' data-track='x'>Python 3.13 was released<img src='shell.png'>with a new "
+            "interactive shell<svg><path/></svg>and better errors.</p>")  # inline removed tags keep words apart
+    pages = []
+    for n in (20, 200, 2000):
+        pages.append((
+            f"synthetic-{n}",
+            f"<html><head><title>Page {n}</title>{script}</head><body>{nav}"
+            f"<main><h1>Release notes</h1>{para * n}</main><footer>footer</footer></body></html>",
+        ))
+    return pages
+
+
+def _load_corpus(folder: Path):
+    pages = []
+    for p in sorted(folder.rglob("*")):
+        if p.suffix.lower() in {".html", ".htm"}:
+            pages.append((p.name, p.read_text(encoding="utf-8", errors="replace")))
+    return pages
+
+
+def _time(fn, html: str, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn(html)
+    return (time.perf_counter() - t0) / rounds * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("folder", nargs="?", help="folder with saved .html pages")
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+
+    pages = _load_corpus(Path(args.folder)) if args.folder else _synthetic_corpus()
+    if not pages:
+        print("[ERROR] No .html files found")
+        return
+
+    total_old = total_new = 0.0
+    print(f"{'page':40} {'kB':>7} {'old ms':>9} {'new ms':>9} {'speedup':>8}  same")
+    for name, html in pages:
+        old_ms = _time(_legacy, html, args.rounds)
+        new_ms = _time(_extract_page, html, args.rounds)
+        same = _legacy(html) == _extract_page(html)
+        total_old += old_ms
+        total_new += new_ms
+        print(f"{name[:40]:40} {len(html) / 1024:7.0f} {old_ms:9.2f} {new_ms:9.2f} {old_ms / max(new_ms, 1e-9):7.1f}x  {same}")
+    print(f"\n[DONE] {len(pages)} pages: old {total_old:.1f} ms, new {total_new:.1f} ms, "
+          f"speedup {total_old / max(total_new, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# tests/test_browser_pool.py
+"""
+Tests for the warm browser pool (Playwright faked, no Chromium needed).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import browser_pool
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+
+    def set_default_timeout(self, ms):
+        pass
+
+    async def goto(self, url, wait_until=None):
+        if "broken" in url:
+            raise RuntimeError("net::ERR_ABORTED")
+        self.url = url
+
+    async def wait_for_timeout(self, ms):
+        pass
+
+    async def content(self):
+        return f"<html>{self.url} via context {self.context.n}</html>"
+
+
+class FakeContext:
+    def __init__(self, browser, n):
+        self.browser, self.n = browser, n
+        self.closed = False
+        self.routes = []
+
+    async def route(self, pattern, handler):
+        self.routes.append((pattern, handler))
+
+    async def new_page(self):
+        return FakePage(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    def is_connected(self):
+        return True
+
+    async def new_context(self, user_agent=None):
+        self.contexts.append(FakeContext(self, len(self.contexts)))
+        return self.contexts[-1]
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_playwright(monkeypatch):
+    browser = FakeBrowser()
+
+    async def launch(headless=True):
+        return browser
+
+    class Playwright:
+        chromium = types.SimpleNamespace(launch=launch)
+
+        async def start(self):
+            return self
+
+        async def stop(self):
+            pass
+
+    module = types.ModuleType("playwright.async_api")
+    module.async_playwright = Playwright
+    monkeypatch.setitem(sys.modules, "playwright", types.ModuleType("playwright"))
+    monkeypatch.setitem(sys.modules, "playwright.async_api", module)
+    return browser
+
+
+def test_context_recycled_after_max_navigations(fake_playwright):
+    """The 25th page load retires the context; the next render gets a fresh one"""
+    pool = browser_pool.BrowserPool(size=1)
+    try:
+        for i in range(browser_pool._MAX_NAVIGATIONS):
+            assert "context 0" in pool.render(f"https://example.com/{i}", timeout=5)
+        assert "context 1" in pool.render("https://example.com/next", timeout=5)
+        stats = pool.stats()
+        assert stats["recycled"] == 1 and stats["renders"] == 26 and stats["idle"] == 1
+        assert fake_playwright.contexts[0].closed
+    finally:
+        pool.shutdown()
+
+
+def test_context_returned_when_render_raises(fake_playwright):
+    """A failed render still gives its (recycled) context back, so the pool doesn't shrink"""
+    pool = browser_pool.BrowserPool(size=1)
+    try:
+        with pytest.raises(RuntimeError):
+            pool.render("https://broken.example.com/", timeout=5)
+        assert pool.stats()["idle"] == 1
+        assert fake_playwright.contexts[0].closed  # possibly wedged page is not reused
+        assert asyncio.run(pool.render_async("https://example.com/")).endswith("context 1</html>")
+    finally:
+        pool.shutdown()
+
+
+def test_heavy_resources_blocked(fake_playwright):
+    """Every context routes requests through the blocker; images/fonts/media are aborted"""
+    pool = browser_pool.BrowserPool(size=2)
+    try:
+        pool.render("https://example.com/", timeout=5)
+        assert all(c.routes == [("**/*", browser_pool._block_heavy_resources)] for c in fake_playwright.contexts)
+    finally:
+        pool.shutdown()
+
+    calls = []
+
+    class Route:
+        def __init__(self, kind):
+            self.request = types.SimpleNamespace(resource_type=kind)
+
+        async def abort(self):
+            calls.append((self.request.resource_type, "abort"))
+
+        async def continue_(self):
+            calls.append((self.request.resource_type, "continue"))
+
+    async def run():
+        for kind in ("image", "font", "media", "document", "script", "xhr"):
+            await browser_pool._block_heavy_resources(Route(kind))
+
+    asyncio.run(run())
+    assert calls == [("image", "abort"), ("font", "abort"), ("media", "abort"),
+                     ("document", "continue"), ("script", "continue"), ("xhr", "continue")]
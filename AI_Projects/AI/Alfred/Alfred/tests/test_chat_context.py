@@ -0,0 +1,166 @@
+# tests/test_chat_context.py
+"""
+Tests for the concurrent context-gathering stage of chat_stream.
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app import main
+from app.main import _gather_context, _merge_sources, _until_disconnect, _web_sources
+from app.services import search_service
+
+
+async def _after(seconds, value):
+    await asyncio.sleep(seconds)
+    return value
+
+
+def test_gather_context_runs_jobs_concurrently_under_deadline():
+    """Total wait is bounded by the deadline, not the sum of the jobs; late jobs are dropped."""
+    async def run():
+        jobs = [
+            ("url", 0, _after(0.1, {"url": "a"})),
+            ("kb", 0, _after(0.1, [{"url": ""}])),
+            ("web", 0, _after(5, [{"url": "slow"}])),
+        ]
+        t0 = time.monotonic()
+        got = [(kind, result) async for kind, _, result in _gather_context(jobs, deadline=0.3)]
+        return got, time.monotonic() - t0
+
+    got, elapsed = asyncio.run(run())
+    assert elapsed < 0.5
+    assert sorted(kind for kind, _ in got) == ["kb", "url"]
+
+
+def test_gather_context_api_answer_cancels_web():
+    """An API answer makes the web job moot, so gathering ends without waiting for it."""
+    async def run():
+        jobs = [("api", 0, _after(0.05, {"formatted": "72F"})), ("web", 0, _after(5, []))]
+        t0 = time.monotonic()
+        got = [kind async for kind, _, _ in _gather_context(jobs, deadline=3)]
+        return got, time.monotonic() - t0
+
+    got, elapsed = asyncio.run(run())
+    assert got == ["api"]
+    assert elapsed < 1
+
+
+def test_web_pages_that_landed_survive_the_deadline(monkeypatch):
+    """One hanging host no longer costs the pages that already arrived."""
+    delays = {"https://fast.example/": 0.05, "https://hang.example/": 5.0}
+    items = [{"title": u, "url": u, "snippet": ""} for u in delays]
+    monkeypatch.setattr(search_service, "_pick_results", lambda query, user_loc="": items)
+
+    async def fetch_url_async(url, max_chars=0):
+        await asyncio.sleep(delays[url])
+        return {"title": url, "url": url, "text": f"text of {url}", "snippet": "s"}
+
+    monkeypatch.setattr(search_service, "fetch_url_async", fetch_url_async)
+
+    async def run():
+        jobs = [("web", 0, _web_sources("q", "")), ("kb", 0, _after(0.1, [{"url": ""}]))]
+        t0 = time.monotonic()
+        got = [(kind, result) async for kind, _, result in _gather_context(jobs, deadline=0.3)]
+        return got, time.monotonic() - t0
+
+    got, elapsed = asyncio.run(run())
+    assert elapsed < 0.5
+    assert [(kind, r["url"]) for kind, r in got if kind == "web"] == [("web", "https://fast.example/")]
+    assert [kind for kind, _ in got] == ["web", "kb"]  # each page is its own arrival, in landing order
+
+
+def test_merge_sources_priority():
+    """Direct URLs first, API suppresses web, KB only when nothing else is there."""
+    link, web, kb = {"url": "https://a"}, {"url": "https://b"}, {"url": ""}
+    found = {"api": None, "url": {1: link}, "web": [web], "kb": [kb]}
+    assert [s for _, s in _merge_sources(found)] == [link, web]
+
+    found = {"api": {"formatted": "x"}, "url": {}, "web": [web], "kb": [kb]}
+    assert _merge_sources(found) == [("KB", kb)]
+
+
+def test_disconnect_after_done_still_runs_post_turn_work(monkeypatch):
+    """Client leaving right after done: compaction still runs, no partial/disconnect log."""
+    logged = []
+    monkeypatch.setattr(main, "log_line", logged.append)
+
+    class Request:
+        async def is_disconnected(self):
+            return True
+
+    async def run():
+        compacted = asyncio.Event()
+
+        async def events():
+            yield 'data: {"type": "token", "text": "hi"}\n\n'
+            yield 'data: {"type": "done", "request_id": "r"}\n\n'
+            await asyncio.sleep(0.05)  # post-turn work the client no longer waits for
+            compacted.set()
+
+        stream = _until_disconnect(Request(), events(), "hello")
+        got = []
+        async for event in stream:
+            got.append(event)
+            if '"done"' in event:
+                break
+        await stream.aclose()  # the browser goes away
+        await asyncio.wait_for(compacted.wait(), 1)
+        return got
+
+    assert len(asyncio.run(run())) == 2
+    assert not any("DISCONNECT" in line or "partial" in line for line in logged)
+
+
+def test_slow_reader_gets_every_token(monkeypatch):
+    """Backpressure, not eviction: a reader slower than the model still sees the whole answer."""
+    monkeypatch.setattr(main, "log_line", lambda line: None)
+
+    class Request:
+        async def is_disconnected(self):
+            return False
+
+    async def run():
+        async def events():
+            for i in range(40):
+                yield f'data: {{"type": "token", "text": "{i} "}}\n\n'
+            yield 'data: {"type": "done", "request_id": "r"}\n\n'
+
+        got = []
+        async for event in _until_disconnect(Request(), events(), "hello"):
+            got.append(event)
+            await asyncio.sleep(0.01)
+        return got
+
+    got = asyncio.run(run())
+    assert [e for e in got if '"token"' in e] == [f'data: {{"type": "token", "text": "{i} "}}\n\n' for i in range(40)]
+    assert '"done"' in got[-1]
+
+
+def test_disconnect_mid_answer_cancels_and_logs_partial(monkeypatch):
+    logged = []
+    monkeypatch.setattr(main, "log_line", logged.append)
+
+    class Request:
+        async def is_disconnected(self):
+            return True
+
+    async def run():
+        async def events():
+            yield 'data: {"type": "token", "text": "hal"}\n\n'
+            await asyncio.sleep(5)
+            yield 'data: {"type": "done", "request_id": "r"}\n\n'
+
+        t0 = time.monotonic()
+        got = [event async for event in _until_disconnect(Request(), events(), "hello")]
+        return got, time.monotonic() - t0
+
+    got, elapsed = asyncio.run(run())
+    assert len(got) == 1 and elapsed < 1
+    assert "ALFRED (partial): hal" in logged
@@ -7,12 +7,16 @@ Run from Alfred root directory.
 """
 import pytest
 import sys
+import time
 from pathlib import Path
 
-# Add server/app/services to path so we can import search_service
-sys.path.insert(0, str(Path(__file__).parent.parent / "server" / "app" / "services"))
+# Add server/ to path so we can import the app.services package
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
 
-from search_service import _prep_query, is_safe_url
+from app.services.search_service import (
+    _prep_query, is_safe_url, _extract_page, _MAX_PER_PAGE_CHARS, _CappedBody, UnsupportedContent, _SearchCache
+)
+from app.services import host_health, page_cache
 
 def test_query_cleaning_whitespace():
     """Test that query cleaning removes extra whitespace"""
@@ -56,6 +60,157 @@ def test_url_safety_invalid():
     assert is_safe_url("") == False
     assert is_safe_url("ftp://example.com") == False  # no hostname parsed
 
+def test_extract_page_single_parse():
+    """Test that title and main text come out of one parse, without noisy tags"""
+    html = (
+        "<html><head><title> Python News </title><script>var x = 1;</script></head>"
+        "<body><nav>Home About</nav><main><h1>Release</h1><p>Python   3.13 is OUT</p>"
+        "<aside>ad</aside></main><footer>footer</footer></body></html>"
+    )
+    assert _extract_page(html) == ("Python News", "release python 3.13 is out")
+    assert _extract_page("") == ("", "")
+
+def test_extract_page_keeps_words_apart_around_removed_tags():
+    """Test that text on both sides of a stripped inline tag doesn't run together"""
+    html = (
+        "<html><body><p>Hello<img src='x.png'>world</p><p>Sign<form><input></form>up "
+        "now<svg><path/></svg>today<script>x()</script>ok<!-- note -->done</p></body></html>"
+    )
+    assert _extract_page(html)[1] == "hello world sign up now today ok done"
+
+def test_extract_page_caps_length():
+    """Test that long pages are cut at _MAX_PER_PAGE_CHARS"""
+    html = "<html><body>" + "<p>word word word</p>" * 5000 + "</body></html>"
+    _, text = _extract_page(html)
+    assert len(text) == _MAX_PER_PAGE_CHARS + len(" ...")
+    assert text.endswith(" ...")
+
+def test_capped_body_decodes_up_to_limit():
+    """Test that streamed bodies are decoded incrementally and stop at the byte ceiling"""
+    body = _CappedBody("text/html; charset=utf-8", max_bytes=10)
+    assert body.feed("h\u00e9".encode("utf-8")) is True   # 3 bytes, multi-byte char intact
+    assert body.feed(b"0123456789") is False              # ceiling reached
+    assert body.text() == "h\u00e90123456"
+
+def test_capped_body_rejects_binaries():
+    """Test that binaries are rejected by content type or by sniffing"""
+    with pytest.raises(UnsupportedContent):
+        _CappedBody("application/pdf")
+    with pytest.raises(UnsupportedContent):
+        _CappedBody("").feed(b"%PDF-1.7 ...")
+
+def test_search_cache_coalesces_and_expires():
+    """Test that identical concurrent lookups share one upstream call and entries expire"""
+    import threading, time
+    cache = _SearchCache(max_entries=2)
+    calls = []
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return [{"url": "https://example.com"}]
+    threads = [threading.Thread(target=cache.get_or_load, args=(("q",), 60, loader)) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 3
+    cache.get_or_load(("short",), 0, loader)
+    cache.get_or_load(("short",), 0, loader)   # ttl 0 -> reloaded
+    assert len(calls) == 3
+
+def test_host_health_breaker_and_adaptive_timeout(monkeypatch):
+    """Test that repeated failures open the breaker and fast hosts get tighter timeouts"""
+    monkeypatch.setattr(host_health, "_hosts", {})
+    url = "https://slow.example.com/page"
+    assert host_health.allow(url)
+    for _ in range(host_health._FAILURES_TO_OPEN):
+        host_health.record_failure(url)
+    assert not host_health.allow(url)
+
+    fast = "https://www.fast.example.com/"
+    assert host_health.timeout_for(fast, (7, 20)) == (7, 20)
+    for _ in range(host_health._MIN_SAMPLES):
+        host_health.record_success(fast, 0.5)
+    assert host_health.timeout_for(fast, (7, 20)) == (2.0, 3.0)
+
+def _fake_clock(monkeypatch, module):
+    clock = [1000.0]
+    monkeypatch.setattr(module, "time", type("FakeTime", (), {"monotonic": staticmethod(lambda: clock[0])}))
+    return clock
+
+def test_host_health_half_open_single_probe(monkeypatch):
+    """Test that an expired breaker lets exactly one probe through, and its outcome decides"""
+    monkeypatch.setattr(host_health, "_hosts", {})
+    clock = _fake_clock(monkeypatch, host_health)
+    url = "https://flaky.example.com/"
+    for _ in range(host_health._FAILURES_TO_OPEN):
+        host_health.record_failure(url)
+    clock[0] += host_health._OPEN_SECONDS + 1
+    assert host_health.allow(url)          # the probe
+    assert not host_health.allow(url)      # everyone else waits for it
+    host_health.record_failure(url)        # probe failed: open again
+    assert not host_health.allow(url)
+    clock[0] += host_health._OPEN_SECONDS + 1
+    assert host_health.allow(url)
+    host_health.record_success(url, 0.3)   # probe succeeded: closed
+    assert host_health.allow(url) and host_health.allow(url)
+
+    for _ in range(host_health._FAILURES_TO_OPEN):
+        host_health.record_failure(url)
+    clock[0] += host_health._OPEN_SECONDS + 1
+    assert host_health.allow(url)          # probe that never reports back...
+    clock[0] += host_health._PROBE_SECONDS + 1
+    assert host_health.allow(url)          # ...doesn't block the host forever
+
+def test_host_health_needs_js_expires(monkeypatch):
+    """Test that a learned needs-JS flag is re-checked after _JS_TTL"""
+    monkeypatch.setattr(host_health, "_hosts", {})
+    clock = _fake_clock(monkeypatch, host_health)
+    url = "https://spa.example.com/"
+    for _ in range(host_health._JS_STRIKES):
+        host_health.record_render(url, True)
+    assert host_health.needs_js(url)
+    clock[0] += host_health._JS_TTL + 1
+    assert not host_health.needs_js(url)   # plain fetch is tried again
+    host_health.record_render(url, False)
+    assert not host_health.needs_js(url)
+    assert host_health.needs_js("https://www.fandango.com/")  # seeded hosts don't expire
+
+def test_page_cache_normalize_url():
+    """Test that equivalent URLs map to the same cache key"""
+    assert page_cache.normalize_url("HTTPS://Example.com:443/a?b=2&a=1#frag") == "https://example.com/a?a=1&b=2"
+    assert page_cache.normalize_url("https://example.com/a?utm_source=x") == "https://example.com/a"
+    assert page_cache.normalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+def test_page_cache_roundtrip(tmp_path, monkeypatch):
+    """Test that pages are stored, and only fresh returns and 304s count as hits"""
+    monkeypatch.setattr(page_cache, "CACHE_FILE", tmp_path / "pages.sqlite3")
+    monkeypatch.setattr(page_cache, "_conn", None)
+    monkeypatch.setattr(page_cache, "_stats", {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0})
+    assert page_cache.get("https://example.com/") is None
+    page_cache.put("https://example.com/", "Example", "some text", etag='"abc"')
+    page_cache.put("https://example.com/novalidators", "Example", "some text")
+    page_cache.put("https://example.com/nostore", "Example", "some text", fresh_for=page_cache.max_age("no-store"))
+    entry = page_cache.get("https://EXAMPLE.com")
+    assert entry["text"] == "some text" and not entry["fresh"]  # must be revalidated: not a hit yet
+    assert page_cache.conditional_headers(entry) == {"If-None-Match": '"abc"'}
+    assert page_cache.stats()["hits"] == 0
+    page_cache.put("https://example.com/", "Example", "new text", etag='"def"', conditional=True)  # 200
+    page_cache.touch("https://example.com/")  # 304
+    assert page_cache.get("https://example.com/novalidators")["fresh"]  # short max-age instead of skipped
+    assert page_cache.get("https://example.com/nostore") is None
+    stats = page_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 3, 2)
+
+def test_page_cache_expired_without_validators(tmp_path, monkeypatch):
+    """Test that a validator-less page is a miss once its max-age runs out"""
+    monkeypatch.setattr(page_cache, "CACHE_FILE", tmp_path / "pages.sqlite3")
+    monkeypatch.setattr(page_cache, "_conn", None)
+    page_cache.put("https://example.com/a", "A", "text", fresh_for=page_cache.max_age("public, max-age=60"))
+    assert page_cache.get("https://example.com/a")["fresh"]
+    now = time.time()
+    monkeypatch.setattr(page_cache.time, "time", lambda: now + 120)
+    assert page_cache.get("https://example.com/a") is None
+
 # Optional: Memory tests (uncomment if you want to test memory functions)
 # def test_memory_retrieval():
 #     from memory import recall_all
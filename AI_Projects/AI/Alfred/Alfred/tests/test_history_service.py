@@ -0,0 +1,84 @@
+# tests/test_history_service.py
+"""
+Tests for token-budgeted history and background summaries (stub Ollama, no model needed).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import history_service, http_pool, llm_router
+from test_ollama_stream import _start_stub
+
+
+def _turns(n, words=20):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": " ".join([f"w{i}"] * words)}
+        for i in range(n)
+    ]
+
+
+def test_count_tokens():
+    """Words and symbols count once, long words more"""
+    assert history_service.count_tokens("hello, world") == 3
+    assert history_service.count_tokens("a" * 17) == 3
+    assert history_service.count_tokens("") == 0
+
+
+def test_window_fits_budget_and_moves_in_steps():
+    """Recent turns stay under the budget; the start only moves in whole steps"""
+    per_msg = history_service.message_tokens(_turns(1)[0])
+    budget = per_msg * 10
+    starts = set()
+    for n in range(10, 30):
+        hist = _turns(n)
+        _, recent = history_service.fit(hist, "", budget)
+        assert sum(history_service.message_tokens(m) for m in recent) <= budget
+        starts.add(n - len(recent))
+    assert all(s % 4 == 0 for s in starts)
+    assert len(starts) < 10  # far fewer prefix changes than turns
+
+
+def test_compact_summarizes_dropped_turns():
+    """Turns that fell out of the window are folded into the session summary"""
+    async def run():
+        runner, url, _ = await _start_stub(tokens=3, delay=0)
+        hist = _turns(40)
+        budget = history_service.message_tokens(hist[0]) * 16
+        try:
+            await history_service.compact("s1", hist, budget, llm_router.LLMRouter([url]), "stub")
+        finally:
+            await http_pool.close_session()
+            await runner.cleanup()
+        return hist, budget
+
+    hist, budget = asyncio.run(run())
+    summary, recent = history_service.fit(hist, "s1", budget)
+    assert summary
+    used = history_service.message_tokens(history_service.summary_message(summary))
+    assert used + sum(history_service.message_tokens(m) for m in recent) <= budget
+    assert history_service.fit(hist, "other", budget)[0] == ""
+
+
+def test_window_starts_where_the_summary_ends():
+    """Turns past the summary are kept verbatim until compacted; summarized ones are not resent"""
+    hist = _turns(12)
+    per_msg = history_service.message_tokens(hist[0])
+    history_service._SUMMARIES.put("s2", "earlier stuff", 4)
+    budget = per_msg * 20
+
+    summary, recent = history_service.fit(hist, "s2", budget)
+    assert summary == "earlier stuff"
+    assert recent == hist[4:]  # fits: nothing after the summary is dropped, nothing before it repeated
+
+    # compaction still pending while the chat grows: the uncovered turns stay in the window
+    hist = _turns(20)
+    _, recent = history_service.fit(hist, "s2", budget)
+    assert recent == hist[4:]
+
+    # history shorter than what the summary covers (client restarted the chat): summary ignored
+    assert history_service.fit(hist[:2], "s2", budget) == ("", hist[:2])
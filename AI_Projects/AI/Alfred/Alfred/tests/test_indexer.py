@@ -0,0 +1,212 @@
+# tests/test_indexer.py
+"""
+Tests for the incremental indexer (LangChain/FAISS/Ollama replaced by stubs, none needed).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+import indexer
+
+
+def _point_at(tmp_path, monkeypatch):
+    docs = tmp_path / "knowledge_base"
+    docs.mkdir()
+    monkeypatch.setattr(indexer, "DOCS_DIR", docs)
+    monkeypatch.setattr(indexer, "INDEX_DIR", tmp_path / "index")
+    monkeypatch.setattr(indexer, "MANIFEST_FILE", tmp_path / "index" / "manifest.json")
+    return docs
+
+
+def test_scan_finds_new_edited_touched_and_removed(tmp_path, monkeypatch):
+    docs = _point_at(tmp_path, monkeypatch)
+    (docs / "a.txt").write_text("alpha")
+    (docs / "b.md").write_text("bravo")
+    (docs / "notes.docx").write_text("unsupported")
+
+    files, changed, removed = indexer.scan({})
+    assert changed == ["a.txt", "b.md"] and removed == []
+    for rel in changed:
+        files[rel]["chunks"] = indexer.chunk_ids(rel, files[rel]["hash"], 2)
+    indexer.save_manifest(files)
+    known = indexer.load_manifest()["files"]
+
+    assert indexer.scan(known)[1:] == ([], [])  # nothing moved
+
+    st = (docs / "a.txt").stat()
+    os.utime(docs / "a.txt", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # touched only
+    (docs / "b.md").write_text("bravo, edited")
+    (docs / "sub").mkdir()
+    (docs / "sub" / "c.txt").write_text("charlie")
+    files, changed, removed = indexer.scan(known)
+    assert changed == ["b.md", "sub/c.txt"] and removed == []
+    assert files["a.txt"]["chunks"] == known["a.txt"]["chunks"]  # kept, not re-embedded
+
+    (docs / "a.txt").unlink()
+    assert indexer.scan(files)[2] == ["a.txt"]
+
+
+def test_chunk_ids_are_stable_and_unique_per_file():
+    digest = "0" * 64
+    assert indexer.chunk_ids("a.txt", digest, 2) == indexer.chunk_ids("a.txt", digest, 2)
+    assert not set(indexer.chunk_ids("a.txt", digest, 2)) & set(indexer.chunk_ids("copy.txt", digest, 2))
+
+
+def test_embed_pipeline_batches_and_bounds_in_flight():
+    """Every file comes back whole, in chunk order, with never more than in_flight batches out"""
+    chunks = {"a.txt": ["a0", "a1", "a2"], "b.txt": ["b0"], "bad.pdf": None, "c.txt": ["c0", "c1", "c2", "c3"]}
+    lock, busy, peak, batches = threading.Lock(), [0], [0], []
+
+    def load(path):
+        texts = chunks[Path(path).name]
+        if texts is None:
+            raise ValueError("corrupt PDF")
+        return [(t, {"source": path}) for t in texts]
+
+    def embed(texts):
+        with lock:
+            busy[0] += 1
+            peak[0] = max(peak[0], busy[0])
+            batches.append(len(texts))
+        time.sleep(0.02)
+        with lock:
+            busy[0] -= 1
+        return [[float(len(t)), float(ord(t[-1]))] for t in texts]
+
+    done = {}
+    n = indexer.embed_files(list(chunks), embed, lambda rel, t, m, v: done.setdefault(rel, (t, v)),
+                            workers=0, batch_size=2, in_flight=2, load=load)
+
+    assert n == 8 and batches == [2, 2, 2, 2]
+    assert peak[0] <= 2
+    assert done["bad.pdf"] == ([], [])
+    assert done["c.txt"] == (["c0", "c1", "c2", "c3"], [[2.0, ord(c)] for c in "0123"])
+
+
+class StubFAISS:
+    """Just enough of the LangChain FAISS store: chunk id -> text, saved as JSON."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    @classmethod
+    def from_embeddings(cls, pairs, embeddings, metadatas=None, ids=None):
+        return cls(dict(zip(ids, (t for t, _ in pairs))))
+
+    @classmethod
+    def load_local(cls, path, embeddings, allow_dangerous_deserialization=False):
+        return cls(json.loads((Path(path) / "index.faiss").read_text()))
+
+    def add_embeddings(self, pairs, metadatas=None, ids=None):
+        self.docs.update(zip(ids, (t for t, _ in pairs)))
+
+    def delete(self, ids):
+        for i in ids:
+            del self.docs[i]
+
+    def save_local(self, path):
+        (Path(path) / "index.faiss").write_text(json.dumps(self.docs))
+        (Path(path) / "index.pkl").write_text("")
+
+
+@pytest.fixture
+def stub_langchain(tmp_path, monkeypatch):
+    """Fake vector store, embeddings, loader and splitter; returns (docs dir, texts embedded, fail-on set)."""
+    embedded, fail_on = [], set()
+
+    class StubEmbeddings:
+        def __init__(self, model=None):
+            pass
+
+        def embed_query(self, text):
+            return [1.0, 0.0]
+
+        def embed_documents(self, texts):
+            if fail_on & set(texts):
+                raise KeyboardInterrupt
+            embedded.extend(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+
+    class Splitter:
+        def __init__(self, **kwargs):
+            pass
+
+        def split_documents(self, docs):
+            return docs
+
+    vectorstores = types.ModuleType("langchain_community.vectorstores")
+    vectorstores.FAISS = StubFAISS
+    ollama = types.ModuleType("langchain_ollama")
+    ollama.OllamaEmbeddings = StubEmbeddings
+    splitters = types.ModuleType("langchain_text_splitters")
+    splitters.RecursiveCharacterTextSplitter = Splitter
+    monkeypatch.setitem(sys.modules, "langchain_community", types.ModuleType("langchain_community"))
+    monkeypatch.setitem(sys.modules, "langchain_community.vectorstores", vectorstores)
+    monkeypatch.setitem(sys.modules, "langchain_ollama", ollama)
+    monkeypatch.setitem(sys.modules, "langchain_text_splitters", splitters)
+    monkeypatch.setattr(indexer, "load_file", lambda p: [types.SimpleNamespace(page_content=p.read_text(), metadata={})])
+    return _point_at(tmp_path, monkeypatch), embedded, fail_on
+
+
+def _update(**kwargs):
+    return indexer.update_index(workers=0, batch_size=1, in_flight=1, **kwargs)
+
+
+def _live(tmp_path):
+    return sorted(json.loads((tmp_path / "index" / "index.faiss").read_text()).values())
+
+
+def test_update_adds_and_deletes_chunks(stub_langchain, tmp_path):
+    docs, embedded, _ = stub_langchain
+    for name in ("a", "b", "c"):
+        (docs / f"{name}.txt").write_text(f"{name} v1")
+    assert _update()["chunks_added"] == 3
+    assert _live(tmp_path) == ["a v1", "b v1", "c v1"]
+
+    (docs / "b.txt").write_text("b v2")
+    (docs / "c.txt").unlink()
+    embedded.clear()
+    summary = _update()
+    assert (summary["chunks_added"], summary["chunks_removed"]) == (1, 2)
+    assert embedded == ["b v2"]  # only the edited file is re-embedded
+    assert _live(tmp_path) == ["a v1", "b v2"]
+    assert sorted(indexer.load_manifest()["files"]) == ["a.txt", "b.txt"]
+
+
+def test_rebuild_checkpoints_to_staging_and_swaps_in_at_the_end(stub_langchain, tmp_path, monkeypatch):
+    """An interrupted --rebuild leaves the live index and manifest as they were, then resumes"""
+    docs, embedded, fail_on = stub_langchain
+    for name in ("a", "b", "c"):
+        (docs / f"{name}.txt").write_text(f"{name} v1")
+    _update()
+    live_manifest = (tmp_path / "index" / "manifest.json").read_text()
+
+    for name in ("a", "b", "c"):
+        (docs / f"{name}.txt").write_text(f"{name} v2")
+    monkeypatch.setattr(indexer, "CHECKPOINT_SECONDS", 0)  # checkpoint after every file
+    fail_on.add("b v2")
+    with pytest.raises(KeyboardInterrupt):
+        _update(rebuild=True)
+    assert _live(tmp_path) == ["a v1", "b v1", "c v1"]
+    assert (tmp_path / "index" / "manifest.json").read_text() == live_manifest
+    staged = indexer.load_manifest(tmp_path / "index" / indexer.STAGING_NAME / "manifest.json")
+    assert sorted(staged["files"]) == ["a.txt"]
+
+    fail_on.clear()
+    embedded.clear()
+    _update(rebuild=True)
+    assert embedded == ["b v2", "c v2"]  # resumed: a.txt came from the staged index
+    assert _live(tmp_path) == ["a v2", "b v2", "c v2"]
+    assert not (tmp_path / "index" / indexer.STAGING_NAME).exists()
+    assert sorted(indexer.load_manifest()["files"]) == ["a.txt", "b.txt", "c.txt"]
@@ -0,0 +1,75 @@
+# tests/test_llm_router.py
+"""
+Tests for the multi-backend LLM router against local stub Ollama servers.
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import http_pool
+from app.services.llm_router import LLMRouter
+from test_ollama_stream import _start_stub
+
+
+async def _chat(router, tag):
+    stats = {}
+    text = "".join([c async for c in router.stream_chat("stub", [{"role": "user", "content": tag}], stats=stats)])
+    return text, stats["backend"]
+
+
+def test_concurrent_chats_spread_over_backends():
+    """Four chats at once on two backends: two each, all streaming in parallel"""
+    async def run():
+        (r1, u1, s1), (r2, u2, s2) = await _start_stub(tokens=10), await _start_stub(tokens=10)
+        router = LLMRouter([u1, u2])
+        try:
+            results = await asyncio.gather(*(_chat(router, f"c{i}") for i in range(4)))
+        finally:
+            await http_pool.close_session()
+            await r1.cleanup()
+            await r2.cleanup()
+        return results, s1["chats"], s2["chats"], router.stats()
+
+    results, chats1, chats2, stats = asyncio.run(run())
+    assert all(text.startswith(f"c{i}0") for i, (text, _) in enumerate(results))
+    assert (chats1, chats2) == (2, 2)
+    assert all(b["in_flight"] == 0 and b["tokens_per_sec"] for b in stats)
+
+
+def test_fails_over_from_dead_backend():
+    """A backend that refuses connections is skipped and marked down"""
+    async def run():
+        runner, url, state = await _start_stub(tokens=3)
+        router = LLMRouter(["http://127.0.0.1:9", url])
+        router.backends[1].served = 1  # make the dead one the first pick
+        try:
+            results = [await _chat(router, "x"), await _chat(router, "y")]
+        finally:
+            await http_pool.close_session()
+            await runner.cleanup()
+        return results, router.stats()
+
+    results, stats = asyncio.run(run())
+    assert [backend for _, backend in results] == [stats[1]["url"]] * 2
+    assert stats[0]["failures"] == 1 and stats[0]["down_for_s"] > 0
+
+
+def test_all_backends_down_reports_the_cause():
+    """The error the chat shows names what went wrong, not just that everything failed"""
+    async def run():
+        router = LLMRouter(["http://127.0.0.1:9"])
+        try:
+            await _chat(router, "x")
+        except RuntimeError as e:
+            return str(e)
+        finally:
+            await http_pool.close_session()
+
+    message = asyncio.run(run())
+    assert message.startswith("All LLM backends failed (1 tried): ")
+    assert message != "All LLM backends failed (1 tried): "
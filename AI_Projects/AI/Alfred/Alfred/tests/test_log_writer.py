@@ -0,0 +1,53 @@
+# tests/test_log_writer.py
+"""
+Tests for the background log writer.
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import datetime
+import gzip
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.utils.log_writer import LogWriter
+
+
+def test_burst_lands_in_daily_file(tmp_path):
+    """Many lines from a burst end up in order in today's file"""
+    writer = LogWriter(tmp_path)
+    for i in range(2000):
+        writer.write("chat", f"line {i}")
+    writer.flush()
+    writer.close()
+    today = datetime.date.today().isoformat()
+    lines = (tmp_path / f"{today}.log").read_text().splitlines()
+    assert lines == [f"line {i}" for i in range(2000)]
+    assert writer.stats()["dropped"] == 0
+
+
+def test_size_rotation(tmp_path):
+    """A file over max_bytes is moved aside and a fresh one started"""
+    writer = LogWriter(tmp_path, max_bytes=100)
+    for i in range(3):
+        writer.write("traces", "x" * 60)
+        writer.flush()
+    writer.close()
+    today = datetime.date.today().isoformat()
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == [f"traces-{today}.1.jsonl", f"traces-{today}.jsonl"]
+
+
+def test_gzip_finished_days(tmp_path):
+    """Older days are compressed when the writer starts; today stays plain"""
+    (tmp_path / "2020-01-01.log").write_text("old\n")
+    (tmp_path / "notes.txt").write_text("keep\n")
+    writer = LogWriter(tmp_path, gzip_old=True)
+    writer.write("chat", "new")
+    writer.flush()
+    writer.close()
+    assert not (tmp_path / "2020-01-01.log").exists()
+    assert gzip.open(tmp_path / "2020-01-01.log.gz").read() == b"old\n"
+    assert (tmp_path / "notes.txt").exists()
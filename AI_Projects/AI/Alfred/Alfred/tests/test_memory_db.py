@@ -0,0 +1,75 @@
+# tests/test_memory_db.py
+"""
+Tests for the SQLite fact store (flattening, FTS lookup, incremental sync, paging).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import memory_db
+
+MEMORY = {
+    "name": "Sam",
+    "location": "Austin, TX",
+    "memory_rules": ["never share my address"],
+    "dogs": [{"name": "Rex", "type": "husky", "color": "gray", "age": 3}],
+    "interests": {
+        "favorite_tv": ["Severance", "The Bear"],
+        "food_likes": ["tacos"],
+        "hobbies": [],
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_db, "DB_FILE", tmp_path / "memory.sqlite3")
+    monkeypatch.setattr(memory_db, "_conn", None)
+    monkeypatch.setattr(memory_db, "_synced_hash", None)
+    yield
+    if memory_db._conn is not None:
+        memory_db._conn.close()
+
+
+def test_flatten_skips_rules_and_empty_values():
+    """One fact per leaf; assistant rules and empty lists are not facts"""
+    facts = memory_db.flatten(MEMORY)
+    assert set(facts) == {"name", "location", "dogs.0", "interests.favorite_tv", "interests.food_likes"}
+    assert facts["dogs.0"][:2] == ("Dogs", "Rex (husky, gray, age 3)")
+    assert facts["interests.favorite_tv"][1] == "Severance, The Bear"
+
+
+def test_relevant_facts_uses_synonyms_and_stemming():
+    """Keyword-chain synonyms live in the tags; porter stemming matches plurals"""
+    memory_db.sync_from_json(MEMORY)
+    assert memory_db.relevant_facts("what shows should I watch on netflix") == ["Favorite tv: Severance, The Bear"]
+    assert memory_db.relevant_facts("tell me about my dogs") == ["Dogs: Rex (husky, gray, age 3)"]
+    assert memory_db.relevant_facts("what is 2+2") == []
+    assert memory_db.relevant_facts("") == []
+
+
+def test_sync_is_incremental():
+    """Only changed or removed facts are touched; an unchanged document is a no-op"""
+    assert memory_db.sync_from_json(MEMORY) == 5
+    assert memory_db.sync_from_json(MEMORY) == 0
+    updated = dict(MEMORY, location="Denver, CO")
+    del updated["name"]
+    assert memory_db.sync_from_json(updated) == 2
+    assert memory_db.relevant_facts("location") == ["Location: Denver, CO"]
+    assert memory_db.page()["total"] == 4
+
+
+def test_page_filters_and_paginates():
+    memory_db.sync_from_json(MEMORY)
+    first = memory_db.page(offset=0, limit=2)
+    assert first["total"] == 5 and len(first["items"]) == 2
+    rest = memory_db.page(offset=2, limit=10)
+    assert [i["path"] for i in first["items"] + rest["items"]] == sorted(memory_db.flatten(MEMORY))
+    filtered = memory_db.page(q="tacos")
+    assert filtered["total"] == 1 and filtered["items"][0]["path"] == "interests.food_likes"
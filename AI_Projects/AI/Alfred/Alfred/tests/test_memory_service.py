@@ -0,0 +1,62 @@
+# tests/test_memory_service.py
+"""
+Tests for the cached memory store (write-behind, mtime invalidation).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services.memory_service import _MemoryStore
+
+
+def test_writes_coalesce_into_one_flush(tmp_path):
+    """Updates are visible at once and land on disk together after the delay"""
+    path = tmp_path / "memory.json"
+    store = _MemoryStore(path, flush_delay=0.1)
+    store.set("location", "Austin, TX")
+    store.set("name", "Sam")
+    assert store.get("location") == "Austin, TX"
+    assert json.loads(path.read_text()) == {}  # not written yet
+    time.sleep(0.3)
+    assert json.loads(path.read_text()) == {"location": "Austin, TX", "name": "Sam"}
+    assert not list(tmp_path.glob(".memory-*"))  # temp file was renamed into place
+
+
+def test_hand_edits_are_picked_up(tmp_path):
+    """A changed file on disk replaces the cached copy"""
+    path = tmp_path / "memory.json"
+    path.write_text(json.dumps({"name": "Sam"}))
+    store = _MemoryStore(path)
+    assert store.get("name") == "Sam"
+    path.write_text(json.dumps({"name": "Alex", "dogs": []}))
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert store.get_all() == {"name": "Alex", "dogs": []}
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    """Many threads writing different keys: every key survives the flush"""
+    path = tmp_path / "memory.json"
+    store = _MemoryStore(path, flush_delay=0.05)
+    threads = [threading.Thread(target=store.set, args=(f"k{i}", i)) for i in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.flush()
+    assert json.loads(path.read_text()) == {f"k{i}": i for i in range(50)}
+
+
+def test_callers_cannot_mutate_the_cache(tmp_path):
+    """recall_all() hands out a copy"""
+    store = _MemoryStore(tmp_path / "memory.json")
+    store.set("dogs", [{"name": "Rex"}])
+    store.get_all()["dogs"].append({"name": "Fido"})
+    assert store.get("dogs") == [{"name": "Rex"}]
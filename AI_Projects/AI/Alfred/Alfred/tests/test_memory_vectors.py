@@ -0,0 +1,140 @@
+# tests/test_memory_vectors.py
+"""
+Tests for embedding-based fact lookup (embeddings faked, no Ollama needed).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import memory_db, memory_vectors
+
+MEMORY = {
+    "location": "Austin, TX",
+    "dogs": [{"name": "Rex", "type": "husky"}],
+    "interests": {"favorite_tv": ["Severance"]},
+}
+
+# keyword in the text -> direction; anything else points at "other"
+_TOPICS = {"Severance": [1.0, 0.0, 0.0], "any good series": [1.0, 0.0, 0.0], "Rex": [0.0, 1.0, 0.0], "pupper": [0.0, 1.0, 0.0]}
+
+
+@pytest.fixture
+def embedded(tmp_path, monkeypatch):
+    """Fresh fact store + vector file; returns the list of texts sent to the fake embedder."""
+    monkeypatch.setattr(memory_db, "DB_FILE", tmp_path / "memory.sqlite3")
+    monkeypatch.setattr(memory_db, "_conn", None)
+    monkeypatch.setattr(memory_db, "_synced_hash", None)
+    monkeypatch.setattr(memory_vectors, "_INDEX", memory_vectors._FactIndex(tmp_path / "vectors.npz"))
+    sent = []
+
+    async def embed(base_url, model, texts):
+        sent.extend(texts)
+        return [next((v for k, v in _TOPICS.items() if k in t), [0.0, 0.0, 1.0]) for t in texts]
+
+    monkeypatch.setattr(memory_vectors.ollama_service, "embed", embed)
+    yield sent
+    if memory_db._conn is not None:
+        memory_db._conn.close()
+
+
+def test_paraphrase_finds_fact_without_keywords(embedded):
+    """No word overlap with the fact, the embedding still picks it (and only it)"""
+    memory_db.sync_from_json(MEMORY)
+    asyncio.run(memory_vectors.refresh("http://stub"))  # startup / background refresh
+    facts = asyncio.run(memory_vectors.relevant_facts("any good series lately?", "http://stub"))
+    assert facts == ["Favorite tv: Severance"]
+    assert memory_db.relevant_facts("any good series lately?") == []
+
+
+def test_only_changed_facts_are_reembedded(embedded, tmp_path):
+    """Vectors persist on disk by text hash; an edit embeds just the edited fact"""
+    memory_db.sync_from_json(MEMORY)
+    assert asyncio.run(memory_vectors.refresh("http://stub")) == 3
+    assert (tmp_path / "vectors.npz").exists()
+
+    # a new process: vectors come from the file, nothing is embedded
+    memory_vectors._INDEX = memory_vectors._FactIndex(tmp_path / "vectors.npz")
+    memory_db._synced_hash = None
+    memory_db.sync_from_json(MEMORY)
+    assert asyncio.run(memory_vectors.refresh("http://stub")) == 0
+
+    memory_db.sync_from_json(dict(MEMORY, location="Denver, CO"))
+    embedded.clear()
+    assert asyncio.run(memory_vectors.refresh("http://stub")) == 1
+    assert embedded == ["search_document: Location: Denver, CO"]
+    assert asyncio.run(memory_vectors.relevant_facts("my pupper", "http://stub")) == ["Dogs: Rex (husky)"]
+
+
+def test_falls_back_to_keyword_lookup(embedded, monkeypatch):
+    """Embedding model down: FTS results are still returned"""
+    async def down(base_url, model, texts):
+        raise ConnectionError("ollama not running")
+
+    monkeypatch.setattr(memory_vectors.ollama_service, "embed", down)
+    memory_db.sync_from_json(MEMORY)
+    assert asyncio.run(memory_vectors.relevant_facts("where is my location", "http://stub")) == ["Location: Austin, TX"]
+
+
+def test_request_never_waits_for_a_refresh(embedded, monkeypatch):
+    """A stale index is refreshed in the background; the turn uses the vectors it has"""
+    memory_db.sync_from_json(MEMORY)
+    asyncio.run(memory_vectors.refresh("http://stub"))
+    memory_db.sync_from_json(dict(MEMORY, location="Denver, CO"))
+    embed = memory_vectors.ollama_service.embed
+
+    async def slow_docs(base_url, model, texts):
+        if texts[0].startswith("search_document: "):
+            await asyncio.sleep(5)
+        return await embed(base_url, model, texts)
+
+    monkeypatch.setattr(memory_vectors.ollama_service, "embed", slow_docs)
+
+    async def run():
+        t0 = time.monotonic()
+        facts = await memory_vectors.relevant_facts("my pupper", "http://stub")
+        return facts, time.monotonic() - t0, len(memory_vectors._REFRESHING)
+
+    facts, elapsed, refreshing = asyncio.run(run())
+    assert facts == ["Dogs: Rex (husky)"] and elapsed < 1
+    assert refreshing == 1
+
+
+def test_shared_query_vector_is_not_embedded_again(embedded):
+    memory_db.sync_from_json(MEMORY)
+    asyncio.run(memory_vectors.refresh("http://stub"))
+    vector = asyncio.run(memory_vectors.embed_query("any good series lately?", "http://stub"))
+    embedded.clear()
+    facts = asyncio.run(memory_vectors.relevant_facts("any good series lately?", "http://stub", query_vector=vector))
+    assert facts == ["Favorite tv: Severance"] and embedded == []
+
+
+def test_failed_refresh_backs_off(embedded, monkeypatch):
+    """Embedding model down: one refresh attempt per memory version, not one per turn"""
+    attempts = []
+
+    async def down(base_url, model, texts):
+        attempts.append(texts[0])
+        raise ConnectionError("ollama not running")
+
+    monkeypatch.setattr(memory_vectors.ollama_service, "embed", down)
+    memory_db.sync_from_json(MEMORY)
+
+    async def run():
+        for _ in range(3):
+            assert await memory_vectors.relevant_facts("where is my location", "http://stub") == ["Location: Austin, TX"]
+            await asyncio.sleep(0.05)  # let the background refresh fail
+
+    asyncio.run(run())
+    assert sum(t.startswith("search_document: ") for t in attempts) == 1
+    assert not memory_vectors._INDEX.stale()
+
+    memory_db.sync_from_json(dict(MEMORY, location="Denver, CO"))
+    assert memory_vectors._INDEX.stale()  # new facts are tried again right away
@@ -0,0 +1,69 @@
+# tests/test_model_warmup.py
+"""
+Tests for model warm-up and keep-alive pings against the stub Ollama server.
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import http_pool
+from app.services.model_warmup import ModelKeeper, _ModelState
+from test_ollama_stream import _start_stub
+
+
+def test_models_warm_and_stay_pinged():
+    """Both models load at start, report ready, and get pinged again"""
+    async def run():
+        runner, url, state = await _start_stub()
+        keeper = ModelKeeper()
+        try:
+            keeper.start(url, {"chat-model": False, "embed-model": True}, ping_seconds=0.05)
+            before = keeper.status()["status"]
+            await asyncio.sleep(0.3)
+            after = keeper.status()
+        finally:
+            await keeper.stop()
+            await http_pool.close_session()
+            await runner.cleanup()
+        return before, after, state["loads"]
+
+    before, after, loads = asyncio.run(run())
+    assert before == "warming"
+    assert after["status"] == "ready"
+    assert after["models"]["embed-model"]["embedding"] is True
+    assert loads.count("chat-model") >= 3 and loads.count("embed-model") >= 3
+
+
+def test_unreachable_ollama_reports_error():
+    """A chat model that fails to load is reported as 'error' (not warming forever)"""
+    async def run():
+        keeper = ModelKeeper()
+        try:
+            keeper.start("http://127.0.0.1:9", {"chat-model": False})
+            await asyncio.sleep(0.3)
+            return keeper.status()
+        finally:
+            await keeper.stop()
+            await http_pool.close_session()
+
+    status = asyncio.run(run())
+    assert status["status"] == "error"
+    assert status["models"]["chat-model"]["state"] == "error"
+
+
+def test_missing_embedding_model_only_degrades():
+    """The chat model decides readiness; a broken embedding model is reported, not blocking"""
+    keeper = ModelKeeper()
+    keeper._models = {n: _ModelState(embedding) for n, embedding in (("chat", False), ("embed", True))}
+    assert keeper.status()["status"] == "warming"
+    keeper._models["embed"].state = "error"
+    assert keeper.status()["status"] == "warming"
+    keeper._models["chat"].state = "ready"
+    assert keeper.status()["status"] == "degraded"
+    keeper._models["embed"].state = "ready"
+    assert keeper.status()["status"] == "ready"
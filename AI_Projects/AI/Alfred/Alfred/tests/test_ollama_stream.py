@@ -0,0 +1,114 @@
+# tests/test_ollama_stream.py
+"""
+Tests for the async Ollama client against a local stub server (no Ollama needed).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import http_pool, ollama_service
+
+
+async def _start_stub(tokens: int = 5, delay: float = 0.02):
+    """Fake /api/chat that streams `tokens` NDJSON lines, then a done line (+ /api/generate, /api/embed)."""
+    state = {"aborted": 0, "chats": 0}
+
+    async def chat(request):
+        body = await request.json()
+        state["chats"] += 1
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        tag = body["messages"][-1]["content"]
+        try:
+            for i in range(tokens):
+                await asyncio.sleep(delay)
+                await resp.write((json.dumps({"message": {"content": f"{tag}{i} "}, "done": False}) + "\n").encode())
+            done = {"message": {"content": ""}, "done": True, "prompt_eval_count": len(body["messages"]), "eval_count": tokens}
+            await resp.write((json.dumps(done) + "\n").encode())
+        except (ConnectionResetError, asyncio.CancelledError):
+            state["aborted"] += 1
+            raise
+        return resp
+
+    async def load(request):
+        body = await request.json()
+        state.setdefault("loads", []).append(body["model"])
+        if request.path == "/api/embed":
+            return web.json_response({"embeddings": [[1.0, 0.0] for _ in body.get("input", [])]})
+        return web.json_response({"model": body["model"], "done": True})
+
+    app = web.Application()
+    app.router.add_post("/api/chat", chat)
+    app.router.add_post("/api/generate", load)
+    app.router.add_post("/api/embed", load)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", state
+
+
+def test_concurrent_streams_interleave():
+    """Test that two chats stream at the same time instead of one after the other"""
+    async def run():
+        runner, url, _ = await _start_stub()
+        order = []
+
+        async def chat(tag):
+            msgs = [{"role": "user", "content": tag}]
+            async for chunk in ollama_service.stream_chat(url, "stub", msgs):
+                order.append(chunk[0])
+
+        try:
+            await asyncio.gather(chat("a"), chat("b"))
+        finally:
+            await http_pool.close_session()
+            await runner.cleanup()
+        return order
+
+    order = asyncio.run(run())
+    assert sorted(order) == ["a"] * 5 + ["b"] * 5
+    assert order != sorted(order)  # tokens from both chats were interleaved
+
+
+def test_early_exit_aborts_upstream():
+    """Test that leaving the stream early drops the Ollama connection"""
+    async def run():
+        runner, url, state = await _start_stub(tokens=50)
+        try:
+            stream = ollama_service.stream_chat(url, "stub", [{"role": "user", "content": "x"}])
+            async for _ in stream:
+                break
+            await stream.aclose()
+            await asyncio.sleep(0.2)
+        finally:
+            await http_pool.close_session()
+            await runner.cleanup()
+        return state["aborted"]
+
+    assert asyncio.run(run()) == 1
+
+
+def test_stream_reports_done_stats():
+    """Test that the final prompt/eval counts are handed back through `stats`"""
+    async def run():
+        runner, url, _ = await _start_stub(tokens=3)
+        stats = {}
+        try:
+            async for _ in ollama_service.stream_chat(url, "stub", [{"role": "user", "content": "x"}], stats=stats):
+                pass
+        finally:
+            await http_pool.close_session()
+            await runner.cleanup()
+        return stats
+
+    assert asyncio.run(run()) == {"prompt_eval_count": 1, "eval_count": 3}
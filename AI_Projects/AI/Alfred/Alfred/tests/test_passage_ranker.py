@@ -0,0 +1,38 @@
+# tests/test_passage_ranker.py
+"""
+Tests for query-aware context excerpts.
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services.passage_ranker import select_passages, _CHARS_PER_TOKEN
+
+PAGE = (
+    "welcome to example news. skip to content. subscribe now. "
+    "the city council met on monday to discuss parking. "
+    "python 3.13 was released in october with a new interactive interpreter. "
+    "the release also adds an experimental free-threaded build. "
+    "weather tomorrow will be sunny. contact us. privacy policy."
+)
+
+def test_select_passages_prefers_relevant_text():
+    """Test that the excerpt comes from the matching part of the page, not the header"""
+    excerpt = select_passages("when was python 3.13 released", PAGE, budget_tokens=40)
+    assert "python 3.13 was released" in excerpt
+    assert "skip to content" not in excerpt
+
+def test_select_passages_respects_budget():
+    """Test that the excerpt stays within the token budget"""
+    long_page = PAGE * 50
+    excerpt = select_passages("python release", long_page, budget_tokens=30)
+    assert 0 < len(excerpt) <= 30 * _CHARS_PER_TOKEN
+
+def test_select_passages_falls_back_to_start():
+    """Test that unmatched queries get the beginning of the page"""
+    assert select_passages("zebra", PAGE, budget_tokens=10).startswith("welcome to example news.")
+    assert select_passages("python", "") == ""
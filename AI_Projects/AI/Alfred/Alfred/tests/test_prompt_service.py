@@ -0,0 +1,38 @@
+# tests/test_prompt_service.py
+"""
+Tests for prompt assembly (stable prefix for Ollama KV-cache reuse).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services.history_service import fit, prior_turns
+from app.services.prompt_service import build_messages, system_prompt, turn_message
+
+
+def _turns(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i}"} for i in range(n)]
+
+
+def _prompt(history, text, dt, **kw):
+    prior = prior_turns(history, text)
+    summary, recent = fit(prior, "", 1000)
+    return build_messages(system_prompt("study", False), recent, turn_message(text, dt, **kw), summary)
+
+
+def test_prefix_identical_across_turns():
+    """Everything before the previous user message is byte-identical on the next turn"""
+    hist = _turns(6) + [{"role": "user", "content": "what time is it"}]
+    first = _prompt(hist, "what time is it", "2025-01-01 10:00", facts=["Dogs: Rex"])
+
+    hist += [{"role": "assistant", "content": "ten"}, {"role": "user", "content": "thanks"}]
+    second = _prompt(hist, "thanks", "2025-01-01 10:01", context="[1] page")
+
+    assert first[:-1] == second[:len(first) - 1]
+    assert "2025-01-01 10:00" in first[-1]["content"] and "Dogs: Rex" in first[-1]["content"]
+    assert second[-1]["content"].endswith("Cite with [1], [2] only if directly relevant.")
+    assert [m["content"] for m in second].count("thanks") == 0  # current message not duplicated
@@ -0,0 +1,106 @@
+# tests/test_response_cache.py
+"""
+Tests for the opt-in response cache (embeddings faked, no Ollama needed).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import response_cache
+
+
+def _fake_embed(vectors):
+    """Vectors keyed by normalized query (embed_query sends "search_query: <raw query>")."""
+    async def embed(base_url, model, texts):
+        return [vectors[response_cache.normalize(t.removeprefix("search_query: "))] for t in texts]
+    return embed
+
+
+def test_exact_hit_and_key_separation(monkeypatch):
+    """Same normalized prompt hits; different facts, mode, internet toggle or location miss"""
+    monkeypatch.setattr(response_cache, "_CACHE", response_cache._ResponseCache())
+    monkeypatch.setattr(response_cache.memory_vectors.ollama_service, "embed", _fake_embed({}))  # KeyError -> exact only
+
+    async def run():
+        key = response_cache.CacheKey("Tell me a joke!", "friendly", [], "no_web")
+        assert await response_cache.lookup(key, "http://stub") is None
+        response_cache.store(key, "Knock knock.", [])
+        same = await response_cache.lookup(response_cache.CacheKey("hey alfred, tell me a joke", "friendly", [], "no_web"), "")
+        others = [
+            await response_cache.lookup(response_cache.CacheKey("tell me a joke", *args), "")
+            for args in (
+                ("friendly", ["Dogs: Rex"], "no_web"),
+                ("study", [], "no_web"),
+                ("friendly", [], "no_web", True),
+                ("friendly", [], "no_web", False, "Austin, TX"),
+            )
+        ]
+        return same, others
+
+    same, others = asyncio.run(run())
+    assert same.kind == "exact" and same.answer == "Knock knock."
+    assert others == [None] * 4
+    assert response_cache.stats()["hits"]["exact"] == 1 and response_cache.stats()["misses"] == 5
+
+
+def test_similar_hit_by_embedding(monkeypatch):
+    """A near-duplicate prompt above the threshold reuses the answer; a distant one does not"""
+    monkeypatch.setattr(response_cache, "_CACHE", response_cache._ResponseCache())
+    vectors = {
+        "whats the weather": [1.0, 0.0, 0.0],
+        "whats the weather like": [0.99, 0.1, 0.0],
+        "whats the news": [0.3, 0.95, 0.0],
+    }
+    monkeypatch.setattr(response_cache.memory_vectors.ollama_service, "embed", _fake_embed(vectors))
+
+    async def run():
+        first = response_cache.CacheKey("What's the weather?", "friendly", [], "requires_web")
+        await response_cache.lookup(first, "")
+        response_cache.store(first, "Sunny, 72F.", [{"i": 1, "url": "x"}])
+        near = await response_cache.lookup(response_cache.CacheKey("what's the weather like", "friendly", [], "requires_web"), "")
+        far = await response_cache.lookup(response_cache.CacheKey("what's the news", "friendly", [], "requires_web"), "")
+        return near, far
+
+    near, far = asyncio.run(run())
+    assert near.kind == "similar" and near.answer == "Sunny, 72F." and near.sources
+    assert far is None
+
+
+def test_follow_ups_are_not_cacheable():
+    """Conversation-dependent turns skip the cache"""
+    history = [{"role": "user", "content": "who is ada lovelace"}, {"role": "assistant", "content": "..."}]
+    assert response_cache.cacheable("what is a mitochondrion", [], False, False)
+    assert not response_cache.cacheable("tell me more about that", history, False, False)
+    assert response_cache.cacheable("tell me more about that", [], False, False)
+    assert not response_cache.cacheable("what is a mitochondrion", [], True, False)
+
+
+def test_greetings_and_clock_questions_are_not_cacheable():
+    """Answers that depend on the time of day would replay stale"""
+    for q in ("Good morning!", "hey alfred, good evening", "hello", "What time is it?",
+              "what's today's date", "what day is it", "how many days until christmas"):
+        assert not response_cache.cacheable(q, [], False, False), q
+
+
+def test_similar_hit_needs_the_same_entities(monkeypatch):
+    """Embeddings can't tell Paris from London; the entity check can"""
+    monkeypatch.setattr(response_cache, "_CACHE", response_cache._ResponseCache())
+    vectors = {"weather in paris": [1.0, 0.0], "weather in london": [0.99, 0.1], "whats the weather in paris": [0.98, 0.2]}
+    monkeypatch.setattr(response_cache.memory_vectors.ollama_service, "embed", _fake_embed(vectors))
+
+    async def run():
+        first = response_cache.CacheKey("Weather in Paris", "friendly", [], "requires_web")
+        await response_cache.lookup(first, "")
+        response_cache.store(first, "Rain in Paris.", [])
+        london = await response_cache.lookup(response_cache.CacheKey("weather in London", "friendly", [], "requires_web"), "")
+        reworded = await response_cache.lookup(response_cache.CacheKey("What's the weather in Paris?", "friendly", [], "requires_web"), "")
+        return london, reworded
+
+    london, reworded = asyncio.run(run())
+    assert london is None
+    assert reworded.kind == "similar" and reworded.answer == "Rain in Paris."
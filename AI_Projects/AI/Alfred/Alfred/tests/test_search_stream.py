@@ -0,0 +1,73 @@
+# tests/test_search_stream.py
+"""
+Tests for streamed web search: completion order and the deadline (fetchers faked, no network).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import search_service
+
+# url -> seconds the fake fetch takes
+DELAYS = {"https://fast.example/": 0.05, "https://medium.example/": 0.2, "https://hang.example/": 5.0}
+
+
+def _fake_search(monkeypatch, delays=DELAYS):
+    items = [{"title": u, "url": u, "snippet": ""} for u in sorted(delays, key=delays.get, reverse=True)]
+    monkeypatch.setattr(search_service, "_pick_results", lambda query, user_loc="": items)
+    release = threading.Event()
+
+    def fetch_url(url, max_chars=0):
+        release.wait(delays[url])
+        return {"title": url, "url": url, "text": f"text of {url}", "snippet": "s"}
+
+    async def fetch_url_async(url, max_chars=0):
+        await asyncio.sleep(delays[url])
+        return {"title": url, "url": url, "text": f"text of {url}", "snippet": "s"}
+
+    monkeypatch.setattr(search_service, "fetch_url", fetch_url)
+    monkeypatch.setattr(search_service, "fetch_url_async", fetch_url_async)
+    return release
+
+
+def test_stream_yields_in_completion_order_and_stops_at_deadline(monkeypatch):
+    """Fastest page first; the hanging one is dropped when the deadline passes"""
+    release = _fake_search(monkeypatch)
+    t0 = time.monotonic()
+    urls = [d["url"] for d in search_service.rag_search_stream("q", deadline=0.5)]
+    elapsed = time.monotonic() - t0
+    release.set()
+    assert urls == ["https://fast.example/", "https://medium.example/"]
+    assert elapsed < 1.0
+
+
+def test_stragglers_do_not_delay_the_next_search(monkeypatch):
+    """Pages still running after one search's deadline don't hold workers another search needs"""
+    release = _fake_search(monkeypatch, {f"https://hang{i}.example/": 5.0 for i in range(5)})
+    assert list(search_service.rag_search_stream("q", deadline=0.1)) == []
+
+    release_next = _fake_search(monkeypatch)
+    t0 = time.monotonic()
+    urls = [d["url"] for d in search_service.rag_search_stream("q", deadline=0.5)]
+    release.set()
+    release_next.set()
+    assert urls[:1] == ["https://fast.example/"]
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_async_stream_order_and_deadline(monkeypatch):
+    _fake_search(monkeypatch)
+
+    async def run():
+        return [d["url"] async for d in search_service.rag_search_stream_async("q", deadline=0.5)]
+
+    t0 = time.monotonic()
+    assert asyncio.run(run()) == ["https://fast.example/", "https://medium.example/"]
+    assert time.monotonic() - t0 < 1.0
@@ -0,0 +1,78 @@
+# tests/test_speculative_search.py
+"""
+Tests for speculative DDG search (primary + fallback variant raced; DDG stubbed).
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import contextvars
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import search_service, tracing
+
+
+@pytest.fixture
+def ddg(monkeypatch):
+    """Stub _ddg_text: {query: (delay, results)}; records which queries finished."""
+    plan, finished = {}, []
+    release = threading.Event()
+
+    def fake(qtext, n):
+        delay, results = plan[qtext]
+        release.wait(delay)
+        finished.append(qtext)
+        return results
+
+    monkeypatch.setattr(search_service, "_ddg_text", fake)
+    monkeypatch.setattr(search_service, "_variant_stats", {
+        name: {"calls": 0, "wins": 0, "empty": 0, "errors": 0, "total_ms": 0.0} for name in ("primary", "fallback")
+    })
+    yield plan, finished
+    release.set()
+
+
+def test_first_non_empty_variant_wins(ddg):
+    """The fast fallback answers; the slow primary is not waited for"""
+    plan, finished = ddg
+    plan["q"] = (2.0, [{"url": "https://slow.example/"}])
+    plan["q alt"] = (0.05, [{"url": "https://fast.example/"}])
+    t0 = time.monotonic()
+    assert search_service._speculative_search("q", "q alt", 5) == [{"url": "https://fast.example/"}]
+    assert time.monotonic() - t0 < 1.0
+    assert finished == ["q alt"]  # the loser's result is discarded
+    stats = search_service.search_variant_stats()
+    assert stats["fallback"]["wins"] == 1 and stats["primary"]["wins"] == 0
+
+
+def test_empty_variant_does_not_win(ddg):
+    """A fast empty answer is skipped in favour of the slower one with results"""
+    plan, _ = ddg
+    plan["q"] = (0.2, [{"url": "https://primary.example/"}])
+    plan["q alt"] = (0.0, [])
+    assert search_service._speculative_search("q", "q alt", 5) == [{"url": "https://primary.example/"}]
+    stats = search_service.search_variant_stats()
+    assert stats["primary"]["wins"] == 1 and stats["fallback"]["empty"] == 1
+
+
+def test_variants_are_spans_in_the_request_trace(ddg):
+    """Per-variant latency goes to the request trace (no stray debug prints)"""
+    plan, _ = ddg
+    plan["q"] = (0.0, [{"url": "https://primary.example/"}])
+    plan["q alt"] = (0.0, [])
+
+    def run():
+        trace = tracing.start("req")
+        search_service._speculative_search("q", "q alt", 5)
+        time.sleep(0.05)
+        return trace
+
+    trace = contextvars.copy_context().run(run)
+    spans = {s["variant"]: s["results"] for s in trace.spans if s["name"] == "ddg_variant"}
+    assert spans == {"primary": 1, "fallback": 0}
@@ -0,0 +1,57 @@
+# tests/test_tracing.py
+"""
+Tests for per-request span tracing.
+Run with: pytest tests/
+
+Run from Alfred root directory.
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+
+from app.services import tracing
+from app.utils import log_writer
+
+
+def test_spans_follow_tasks_and_threads(tmp_path, monkeypatch):
+    """Spans opened in child tasks and worker threads land in the request's trace"""
+    writer = log_writer.LogWriter(tmp_path)
+    monkeypatch.setattr(log_writer, "_WRITER", writer)
+
+    def blocking():
+        with tracing.span("kb"):
+            pass
+
+    async def fetch(host):
+        with tracing.span("fetch", host=host):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        trace = tracing.start("req1")
+        await asyncio.gather(fetch("a.com"), fetch("b.com"), asyncio.to_thread(blocking))
+        tracing.observe("llm.tokens_per_sec", 42.0)
+        return tracing.finish(trace, mode="study")
+
+    record = asyncio.run(run())
+    names = sorted(s["name"] for s in record["spans"])
+    assert names == ["fetch", "fetch", "kb", "total"]
+    assert record["request_id"] == "req1" and record["values"] == {"llm.tokens_per_sec": 42.0}
+
+    writer.flush()
+    writer.close()
+    lines = next(tmp_path.glob("traces-*.jsonl")).read_text().splitlines()
+    assert json.loads(lines[-1])["request_id"] == "req1"
+    assert tracing.metrics()["fetch"]["count"] >= 2
+
+
+def test_span_without_trace_is_noop():
+    """Code paths outside a request (sync tools, tests) pay nothing"""
+    async def run():
+        with tracing.span("fetch") as attrs:
+            attrs["x"] = 1
+        return tracing.current()
+
+    assert asyncio.run(run()) is None